@@ -1,37 +1,26 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
 from django.utils.html import format_html
 from django.urls import reverse
 from django.utils.safestring import mark_safe
 from django.db.models import Count, Sum,Q
 from django.utils import timezone
 from django.contrib.admin import DateFieldListFilter
-from django.http import HttpResponse
-import csv
 from django.db import models
 
 from .models import (
     Doctor, Patient, Appointment, Bill, BillItem, 
-    Report, Department, Room, MedicalRecord
+    Report, Department, Room, RoomOccupancy, MedicalRecord,
+    ArchivedPatient, ArchivedAppointment, ArchivedBill, ArchivedMedicalRecord,
 )
+from .exports import csv_response
+from .occupancy import OUT_OF_SERVICE_STATUSES, change_current_patient, open_stays, sync_room
 
 # Custom Admin Actions
 def export_to_csv(modeladmin, request, queryset):
-    """Export selected records to CSV"""
+    """Export selected records to CSV, streamed in chunks"""
     opts = modeladmin.model._meta
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = f'attachment; filename={opts.verbose_name_plural}.csv'
-    
-    writer = csv.writer(response)
-    fields = [field for field in opts.get_fields() if not field.many_to_many and not field.one_to_many]
-    
-    # Write header
-    writer.writerow([field.verbose_name for field in fields])
-    
-    # Write data
-    for obj in queryset:
-        writer.writerow([getattr(obj, field.name) for field in fields])
-    
-    return response
+    return csv_response(queryset, f'{opts.verbose_name_plural}.csv')
 
 export_to_csv.short_description = 'Export selected records to CSV'
 
@@ -65,7 +54,8 @@ class OverdueBillFilter(admin.SimpleListFilter):
     
     def queryset(self, request, queryset):
         if self.value() == 'overdue':
-            return queryset.filter(due_date__lt=timezone.now().date(), status='unpaid')
+            # sweep_statuses sets 'overdue'; bills fallen due since its last run are still 'unpaid'
+            return queryset.filter(Q(status='overdue') | Q(due_date__lt=timezone.now().date(), status='unpaid'))
         if self.value() == 'paid':
             return queryset.filter(status='paid')
         if self.value() == 'unpaid':
@@ -87,12 +77,18 @@ class AppointmentInline(admin.TabularInline):
     extra = 0
     readonly_fields = ('created_at',)
     fields = ('appointment_date', 'appointment_time', 'appointment_type', 'status', 'notes')
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('patient', 'doctor')
 
 class MedicalRecordInline(admin.StackedInline):
     model = MedicalRecord
     extra = 0
     readonly_fields = ('created_at', 'updated_at')
     fields = ('visit_date', 'doctor', 'symptoms', 'diagnosis', 'treatment', 'prescription', 'follow_up_date')
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('patient', 'doctor')
 
 class RoomInline(admin.TabularInline):
     model = Room
@@ -130,6 +126,7 @@ class DoctorAdmin(admin.ModelAdmin):
     actions = [export_to_csv]
     
     def patient_count_display(self, obj):
+        # active_patients is annotated in get_queryset
         count = obj.patient_count
         color = 'green' if count > 10 else 'orange' if count > 5 else 'red'
         return format_html(
@@ -159,6 +156,7 @@ class PatientAdmin(admin.ModelAdmin):
     readonly_fields = ('created_at', 'updated_at', 'days_admitted_display')
     list_editable = ('status',)
     list_per_page = 25
+    list_select_related = ('assigned_doctor',)
     ordering = ('-admitted_date',)
     
     fieldsets = (
@@ -220,6 +218,7 @@ class AppointmentAdmin(admin.ModelAdmin):
     readonly_fields = ('created_at', 'updated_at')
     list_editable = ('status',)
     list_per_page = 30
+    list_select_related = ('patient', 'doctor')
     ordering = ('-appointment_date', '-appointment_time')
     date_hierarchy = 'appointment_date'
     
@@ -262,6 +261,7 @@ class BillAdmin(admin.ModelAdmin):
     readonly_fields = ('bill_number', 'created_at', 'updated_at', 'balance_amount_display', 'is_overdue_display')
     list_editable = ('status',)
     list_per_page = 25
+    list_select_related = ('patient',)
     ordering = ('-bill_date',)
     date_hierarchy = 'bill_date'
     
@@ -290,7 +290,7 @@ class BillAdmin(admin.ModelAdmin):
     def balance_amount_display(self, obj):
         balance = obj.balance_amount
         if balance > 0:
-            return format_html('<span style="color: red; font-weight: bold;">${:.2f}</span>', balance)
+            return format_html('<span style="color: red; font-weight: bold;">${}</span>', f'{balance:.2f}')
         return format_html('<span style="color: green;">$0.00</span>')
     balance_amount_display.short_description = 'Balance'
     
@@ -322,6 +322,7 @@ class BillItemAdmin(admin.ModelAdmin):
     list_filter = ('item_type', 'bill__status')
     search_fields = ('description', 'bill__bill_number', 'bill__patient__name')
     readonly_fields = ('total_price',)
+    list_select_related = ('bill__patient',)
     
     def get_readonly_fields(self, request, obj=None):
         if obj:  # editing an existing object
@@ -336,6 +337,7 @@ class DepartmentAdmin(admin.ModelAdmin):
     search_fields = ('name', 'description', 'location', 'phone', 'email')
     readonly_fields = ('created_at', 'updated_at', 'room_count_display')
     list_editable = ('is_active',)
+    list_select_related = ('head_doctor',)
     
     fieldsets = (
         ('Department Information', {
@@ -360,11 +362,9 @@ class DepartmentAdmin(admin.ModelAdmin):
     actions = [export_to_csv]
     
     def room_count_display(self, obj):
-        count = obj.rooms.count()
-        available = obj.rooms.filter(status='available').count()
         return format_html(
             '{} total ({} available)',
-            count, available
+            obj.room_total, obj.rooms_available
         )
     room_count_display.short_description = 'Rooms'
     
@@ -373,15 +373,52 @@ class DepartmentAdmin(admin.ModelAdmin):
             return format_html('<span style="color: green;">✓ Active</span>')
         return format_html('<span style="color: red;">✗ Inactive</span>')
     is_active_display.short_description = 'Status'
+    
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        return queryset.annotate(
+            room_total=Count('rooms'),
+            rooms_available=Count('rooms', filter=models.Q(rooms__status='available'))
+        )
 
 # Room Admin
+class RoomAdminForm(forms.ModelForm):
+    class Meta:
+        model = Room
+        fields = '__all__'
+    
+    def validate_unique(self):
+        # A patient picked from another room is moved out of it on save
+        exclude = self._get_validation_exclusions()
+        exclude.add('current_patient')
+        try:
+            self.instance.validate_unique(exclude=exclude)
+        except forms.ValidationError as e:
+            self._update_errors(e)
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        patient = cleaned_data.get('current_patient')
+        if 'current_patient' not in self.changed_data or patient is None or not self.instance.pk:
+            return cleaned_data
+        if cleaned_data.get('status') in OUT_OF_SERVICE_STATUSES:
+            self.add_error('current_patient', 'Patients cannot be moved into a room that is out of service.')
+        previous = self.initial.get('current_patient')
+        staying = open_stays().filter(room=self.instance).exclude(patient_id__in=[previous, patient.pk]).count()
+        if staying >= (cleaned_data.get('capacity') or 0):
+            self.add_error('current_patient', 'This room has no free bed.')
+        return cleaned_data
+
+
 @admin.register(Room)
 class RoomAdmin(admin.ModelAdmin):
+    form = RoomAdminForm
     list_display = ('room_number', 'room_type', 'department', 'floor', 'status_display', 'status', 'current_patient', 'daily_rate', 'capacity')
     list_filter = ('status', 'room_type', 'department', 'floor')
     search_fields = ('room_number', 'department__name', 'current_patient__name')
     readonly_fields = ('created_at', 'updated_at')
     list_editable = ('status',)
+    list_select_related = ('department', 'current_patient')
     ordering = ('room_number',)
     
     fieldsets = (
@@ -418,6 +455,53 @@ class RoomAdmin(admin.ModelAdmin):
             color, obj.get_status_display()
         )
     status_display.short_description = 'Status'
+    
+    def save_model(self, request, obj, form, change):
+        # The stays are the record; current_patient and status follow from them
+        patient = obj.current_patient
+        if change:
+            obj.current_patient_id = form.initial.get('current_patient')
+        else:
+            obj.current_patient = None
+        super().save_model(request, obj, form, change)
+        try:
+            if 'current_patient' in form.changed_data:
+                change_current_patient(obj, patient)
+            else:
+                sync_room(obj)
+        except ValueError as e:
+            messages.error(request, str(e))
+        obj.refresh_from_db(fields=['current_patient', 'status'])
+
+# Room Occupancy Admin
+@admin.register(RoomOccupancy)
+class RoomOccupancyAdmin(admin.ModelAdmin):
+    list_display = ('room', 'bed', 'patient', 'start', 'end', 'duration')
+    list_filter = (('start', DateFieldListFilter), 'room__floor', 'room__department')
+    search_fields = ('room__room_number', 'patient__name')
+    readonly_fields = ('duration',)
+    list_select_related = ('room', 'patient')
+    raw_id_fields = ('room', 'patient')
+    ordering = ('-start',)
+    date_hierarchy = 'start'
+    
+    actions = [export_to_csv]
+    
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        sync_room(obj.room)
+        if change and 'room' in form.changed_data:
+            sync_room(Room.objects.get(pk=form.initial['room']))
+    
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        sync_room(obj.room)
+    
+    def delete_queryset(self, request, queryset):
+        rooms = list(Room.objects.filter(occupancies__in=queryset).distinct())
+        super().delete_queryset(request, queryset)
+        for room in rooms:
+            sync_room(room)
 
 # Medical Record Admin
 @admin.register(MedicalRecord)
@@ -426,6 +510,7 @@ class MedicalRecordAdmin(admin.ModelAdmin):
     list_filter = ('doctor', ('visit_date', DateFieldListFilter), ('follow_up_date', DateFieldListFilter))
     search_fields = ('patient__name', 'doctor__name', 'symptoms', 'diagnosis', 'treatment')
     readonly_fields = ('created_at', 'updated_at')
+    list_select_related = ('patient', 'doctor')
     ordering = ('-visit_date',)
     date_hierarchy = 'visit_date'
     
@@ -461,6 +546,7 @@ class ReportAdmin(admin.ModelAdmin):
     list_filter = ('report_type', 'status', ('report_date', DateFieldListFilter), 'generated_by')
     search_fields = ('title', 'summary', 'report_type')
     readonly_fields = ('created_at', 'updated_at')
+    list_select_related = ('generated_by',)
     ordering = ('-report_date',)
     date_hierarchy = 'report_date'
     
@@ -504,6 +590,36 @@ class ReportAdmin(admin.ModelAdmin):
         return "Single Date"
     period_display.short_description = 'Period'
 
+# Archive tables: filled by archive_records, read-only here. Their foreign
+# keys may name archived rows, so the lists show ids rather than objects.
+class ArchiveAdmin(admin.ModelAdmin):
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+admin.site.register(
+    ArchivedPatient, ArchiveAdmin, list_display=('id', 'name', 'phone', 'admitted_date', 'discharge_date'),
+    search_fields=('name', 'phone'), date_hierarchy='discharge_date',
+)
+admin.site.register(
+    ArchivedAppointment, ArchiveAdmin,
+    list_display=('id', 'patient_id', 'doctor_id', 'appointment_date', 'appointment_time', 'status'),
+    list_filter=('status',), date_hierarchy='appointment_date',
+)
+admin.site.register(
+    ArchivedBill, ArchiveAdmin, list_display=('bill_number', 'patient_id', 'total_amount', 'status', 'bill_date'),
+    list_filter=('status',), search_fields=('bill_number',), date_hierarchy='bill_date',
+)
+admin.site.register(
+    ArchivedMedicalRecord, ArchiveAdmin, list_display=('id', 'patient_id', 'doctor_id', 'visit_date'),
+    date_hierarchy='visit_date',
+)
+
 # Customize Admin Site
 admin.site.site_header = "Hospital Management System"
 admin.site.site_title = "HMS Admin"
@@ -0,0 +1,166 @@
+"""Hot/cold archival.
+
+Rows the operational views no longer need move, with their ids, into the
+archive tables next to their hot ones (models.archive_model):
+
+- discharged patients whose discharge is older than the cutoff and who have
+  no room, no open stay, no upcoming appointment and no unsettled bill,
+  together with all their appointments, bills, bill items, medical records
+  and room stays;
+- completed and cancelled appointments dated before the cutoff;
+- paid and cancelled bills dated before the cutoff, with their items.
+
+Each batch is one transaction of at most ``batch_size`` patients,
+appointments or bills. Parents are copied before their children and deleted
+after them, so no hot row ever refers to an archived one. The copy is an
+INSERT ... SELECT on the database, and the delete sends no signals. The
+caches the rows appear in are invalidated by hand, as for any bulk write.
+
+include_archived() reads a hot table and its archive as one.
+"""
+import time
+from datetime import date
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import Exists, OuterRef, Value
+from django.utils import timezone
+
+from . import live
+from .caching import bump_version, model_dependency, object_dependency
+from .models import Appointment, Bill, BillItem, Doctor, MedicalRecord, Patient, Room, RoomOccupancy
+
+OPEN_APPOINTMENT_STATUSES = ['scheduled', 'rescheduled']
+ARCHIVED_APPOINTMENT_STATUSES = ['completed', 'cancelled']
+SETTLED_BILL_STATUSES = ['paid', 'cancelled']
+
+
+def months_before(day, months):
+    """``day`` moved back ``months`` calendar months, clamped to the month's end"""
+    month = day.month - 1 - months
+    year, month = day.year + month // 12, month % 12 + 1
+    for last_day in (day.day, 30, 29, 28):
+        try:
+            return date(year, month, min(day.day, last_day))
+        except ValueError:
+            continue
+
+
+def default_cutoff():
+    return months_before(timezone.localdate(), getattr(settings, 'ARCHIVE_AFTER_MONTHS', 12))
+
+
+def patients_to_archive(cutoff):
+    return Patient.objects.filter(
+        status='discharged', discharge_date__lt=cutoff, current_room__isnull=True,
+    ).exclude(
+        Exists(Appointment.objects.filter(patient=OuterRef('pk'), status__in=OPEN_APPOINTMENT_STATUSES))
+    ).exclude(
+        Exists(Bill.objects.filter(patient=OuterRef('pk')).exclude(status__in=SETTLED_BILL_STATUSES))
+    ).exclude(
+        Exists(RoomOccupancy.objects.filter(patient=OuterRef('pk'), end__isnull=True))
+    )
+
+
+def appointments_to_archive(cutoff):
+    return Appointment.objects.filter(status__in=ARCHIVED_APPOINTMENT_STATUSES, appointment_date__lt=cutoff)
+
+
+def bills_to_archive(cutoff):
+    return Bill.objects.filter(status__in=SETTLED_BILL_STATUSES, bill_date__lt=cutoff)
+
+
+# kind: (rows to archive, [(model, lookup from its rows to the selected ids)])
+# with parents before children
+PLANS = {
+    'patients': (patients_to_archive, [
+        (Patient, 'pk'),
+        (Bill, 'patient'),
+        (BillItem, 'bill__patient'),
+        (Appointment, 'patient'),
+        (MedicalRecord, 'patient'),
+        (RoomOccupancy, 'patient'),
+    ]),
+    'appointments': (appointments_to_archive, [(Appointment, 'pk')]),
+    'bills': (bills_to_archive, [(Bill, 'pk'), (BillItem, 'bill')]),
+}
+
+
+def copy_to_archive(queryset, using):
+    """INSERT INTO the archive SELECT the queryset's rows; returns the row count"""
+    model = queryset.model
+    fields = model._meta.concrete_fields
+    select, params = queryset.order_by().values_list(*[field.attname for field in fields]).query.sql_with_params()
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {quote(model.archive_model._meta.db_table)} '
+            f'({", ".join(quote(field.column) for field in fields)}) {select}',
+            params,
+        )
+        return cursor.rowcount
+
+
+def archive_batch(kind, cutoff, batch_size=500, using=None):
+    """Move one batch; returns {model label: rows moved}, empty when done"""
+    rows_to_archive, steps = PLANS[kind]
+    using = using or router.db_for_write(Patient)
+    with transaction.atomic(using=using):
+        ids = list(
+            rows_to_archive(cutoff).using(using).order_by('pk').values_list('pk', flat=True)[:batch_size]
+        )
+        if not ids:
+            return {}
+        querysets = [
+            model.objects.using(using).filter(**{f'{lookup}__in': ids}) for model, lookup in steps
+        ]
+        touched = touched_dependencies(dict(zip((model for model, _ in steps), querysets)))
+        moved = {}
+        for queryset in querysets:
+            moved[queryset.model._meta.label] = copy_to_archive(queryset, using)
+        for queryset in reversed(querysets):
+            # No signals, no cascade collection: the children are already gone
+            queryset._raw_delete(using)
+        transaction.on_commit(lambda: bump_version(*touched), using=using)
+        live.refresh_stats(using)
+    return moved
+
+
+def touched_dependencies(querysets):
+    """Cache dependencies of the rows about to move (see caching and pages)"""
+    dependencies = [model_dependency(model) for model in querysets]
+    if Appointment in querysets:
+        doctors = querysets[Appointment].order_by().values_list('doctor_id', flat=True).distinct()
+        dependencies += [object_dependency(Doctor, pk) for pk in doctors]
+    if RoomOccupancy in querysets:
+        rooms = querysets[RoomOccupancy].order_by().values_list('room_id', flat=True).distinct()
+        dependencies += [object_dependency(Room, pk) for pk in rooms]
+    return dependencies
+
+
+def archive(kind, cutoff=None, batch_size=500, pause=0, using=None):
+    """Move every row of ``kind`` due for archival, one batch at a time;
+    yields each batch's counts"""
+    cutoff = cutoff or default_cutoff()
+    while True:
+        moved = archive_batch(kind, cutoff, batch_size, using)
+        if not moved:
+            return
+        yield moved
+        if pause:
+            # Lets other writers in between batches
+            time.sleep(pause)
+
+
+def include_archived(model, *args, **kwargs):
+    """Rows of ``model`` and of its archive matching the filter, as ``model``
+    instances with an ``archived`` flag, in the model's default order.
+    
+    Only ordering, slicing and counting apply to the result. Lookups across
+    relations reach hot rows only.
+    """
+    # SQLite allows no ORDER BY inside the union's parts
+    hot = model.objects.filter(*args, **kwargs).annotate(archived=Value(False)).order_by()
+    cold = model.archive_model.objects.filter(*args, **kwargs).annotate(archived=Value(True)).order_by()
+    return hot.union(cold, all=True).order_by(*model._meta.ordering)
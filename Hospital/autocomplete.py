@@ -0,0 +1,269 @@
+"""Process-local prefix index for patient autocomplete.
+
+It answers exactly as search.top_patient_ids does from the FTS5 table: the
+same fields (search.SEARCH_FIELDS), every word a prefix, ranked by FTS5's
+bm25 with ties to the lowest id, and only the newest RANK_WINDOW matches
+ranked when every word is one letter. So results do not change with
+whether this process's copy is current.
+
+Normalized tokens are kept in a sorted list; each token maps to a compact
+array of patient ids, one entry per occurrence, and each patient id to the
+(name, phone, age) the API returns plus its row's tokens. A prefix lookup
+is a bisect plus a walk over the matching tokens, so api_patient_search
+answers without touching the database.
+
+The index loads on first use; lookups made while it loads ask the database.
+Patient signals in this process apply changes incrementally; the shared
+Patient version counter (see caching.py) tells every other worker that its
+copy is stale, in which case lookups fall back to the database while a
+fresh copy loads in the background.
+"""
+import heapq
+import sys
+import threading
+import unicodedata
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+from math import log
+
+from django.db import connection
+
+from .caching import get_versions, model_dependency
+from .models import Patient
+from . import search
+from .routers import primary_reads
+from .search import SEARCH_FIELDS, TOKEN_RE
+
+DEPENDENCY = model_dependency(Patient)
+# FTS5's bm25 parameters
+K1 = 1.2
+B = 0.75
+
+
+def normalize(text):
+    """Lowercase, accent-free word tokens"""
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return TOKEN_RE.findall(text)
+
+
+def row_tokens(values):
+    """Tokens of a patient's SEARCH_FIELDS values, one per occurrence"""
+    return tuple(sys.intern(token) for value in values for token in normalize(value or ''))
+
+
+class PatientAutocompleteIndex:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.tokens = []
+        self.postings = {}
+        self.patients = {}
+        self.token_count = 0
+        self.version = None
+        self.loaded = False
+        self.loading = False
+    
+    # Building and maintenance
+    
+    def clear(self):
+        """Forget the loaded copy; the next lookup loads it again"""
+        with self.lock:
+            self.tokens, self.postings, self.patients = [], {}, {}
+            self.token_count = 0
+            self.version = None
+            self.loaded = False
+    
+    def load(self, chunk_size=10000):
+        """(Re)build from the database; the version is read first, so a change
+        that lands during the load marks the new copy stale again"""
+        version = get_versions([DEPENDENCY])[DEPENDENCY]
+        postings = {}
+        patients = {}
+        token_count = 0
+        rows = Patient.objects.order_by().values_list('id', 'age', *SEARCH_FIELDS)
+        with primary_reads():
+            for patient_id, age, *values in rows.iterator(chunk_size=chunk_size):
+                tokens = row_tokens(values)
+                patients[patient_id] = (values[0], values[1], age, tokens)
+                token_count += len(tokens)
+                for token in tokens:
+                    postings.setdefault(token, array('q')).append(patient_id)
+        with self.lock:
+            self.postings = postings
+            self.patients = patients
+            self.token_count = token_count
+            self.tokens = sorted(postings)
+            self.version = version
+            self.loaded = True
+    
+    def _remove(self, patient_id):
+        record = self.patients.pop(patient_id, None)
+        if record is None:
+            return
+        tokens = record[3]
+        self.token_count -= len(tokens)
+        for token in set(tokens):
+            ids = self.postings.get(token)
+            if ids is None:
+                continue
+            ids = array('q', (other for other in ids if other != patient_id))
+            if ids:
+                self.postings[token] = ids
+            else:
+                del self.postings[token]
+                del self.tokens[bisect_left(self.tokens, token)]
+    
+    def _add(self, patient_id, age, values):
+        tokens = row_tokens(values)
+        self.patients[patient_id] = (values[0], values[1], age, tokens)
+        self.token_count += len(tokens)
+        for token in tokens:
+            if token not in self.postings:
+                self.postings[token] = array('q')
+                insort(self.tokens, token)
+            self.postings[token].append(patient_id)
+    
+    def apply(self, patient_id, record, version):
+        """Apply one committed change made by this process.
+        
+        ``record`` is the new (age, *SEARCH_FIELDS values), or None for a
+        delete.
+        ``version`` is the counter value after this change's bump; anything
+        but our version + 1 means another worker changed patients too.
+        """
+        with self.lock:
+            if self.version is None:
+                return
+            if version != self.version + 1:
+                self.version = None
+                return
+            self._remove(patient_id)
+            if record is not None:
+                self._add(patient_id, record[0], record[1:])
+            self.version = version
+    
+    # Lookups
+    
+    def is_current(self):
+        return self.version is not None and get_versions([DEPENDENCY])[DEPENDENCY] == self.version
+    
+    def refresh_in_background(self):
+        with self.lock:
+            if self.loading:
+                return
+            self.loading = True
+        
+        def run():
+            try:
+                self.load()
+            finally:
+                self.loading = False
+                connection.close()
+        
+        threading.Thread(target=run, name='patient-autocomplete-load', daemon=True).start()
+    
+    def _occurrences(self, prefix):
+        """{patient id: tokens starting with ``prefix``} over the whole index"""
+        counts = Counter()
+        position = bisect_left(self.tokens, prefix)
+        while position < len(self.tokens) and self.tokens[position].startswith(prefix):
+            counts.update(self.postings[self.tokens[position]])
+            position += 1
+        return counts
+    
+    def search(self, query, limit=10):
+        """Up to ``limit`` (id, name, phone, age) matches, or None when this
+        process has no current copy and the caller should ask the database"""
+        words = normalize(query)
+        if not words:
+            return []
+        if not self.loaded:
+            # First use in this process: one caller loads, any other asks the
+            # database meanwhile
+            with self.lock:
+                if self.loading:
+                    return None
+                self.loading = True
+            try:
+                self.load()
+            finally:
+                self.loading = False
+        elif not self.is_current():
+            self.refresh_in_background()
+            return None
+        with self.lock:
+            occurrences = [self._occurrences(word) for word in words]
+            candidates = set(min(occurrences, key=len))
+            for counts in occurrences:
+                candidates.intersection_update(counts)
+            if not candidates:
+                return []
+            if max(len(word) for word in words) == 1:
+                candidates = sorted(candidates)[-search.RANK_WINDOW:]
+            # A row's bm25 depends only on its per-word frequencies and its
+            # length, which few rows differ in: score each bucket once
+            buckets = defaultdict(list)
+            patients = self.patients
+            if len(occurrences) == 1:
+                # The usual case, without a tuple built per row
+                counts = occurrences[0]
+                for patient_id in candidates:
+                    buckets[(counts[patient_id],), len(patients[patient_id][3])].append(patient_id)
+            else:
+                for patient_id in candidates:
+                    key = tuple([counts[patient_id] for counts in occurrences]), len(patients[patient_id][3])
+                    buckets[key].append(patient_id)
+            rows = len(self.patients)
+            average_length = self.token_count / rows
+            weights = []
+            for counts in occurrences:
+                idf = log((rows - len(counts) + 0.5) / (len(counts) + 0.5))
+                weights.append(idf if idf > 0 else 1e-6)
+            by_rank = defaultdict(list)
+            for (frequencies, length), ids in buckets.items():
+                by_rank[self._rank(frequencies, length, weights, average_length)] += ids
+            results = []
+            for rank in sorted(by_rank):
+                # Ties go to the lowest id
+                for patient_id in heapq.nsmallest(limit - len(results), by_rank[rank]):
+                    results.append((patient_id, *self.patients[patient_id][:3]))
+                if len(results) >= limit:
+                    break
+            return results
+    
+    @staticmethod
+    def _rank(frequencies, length, weights, average_length):
+        """bm25 as FTS5 computes it, in the same order of operations"""
+        score = 0.0
+        for weight, frequency in zip(weights, frequencies):
+            frequency = float(frequency)
+            score += weight * ((frequency * (K1 + 1.0)) / (frequency + K1 * (1 - B + B * length / average_length)))
+        return -1.0 * score
+    
+    # Reporting
+    
+    def memory_usage(self):
+        """Approximate bytes held by the index structures"""
+        with self.lock:
+            size = sys.getsizeof(self.tokens) + sys.getsizeof(self.postings) + sys.getsizeof(self.patients)
+            size += sum(sys.getsizeof(token) + sys.getsizeof(ids) for token, ids in self.postings.items())
+            for patient_id, record in self.patients.items():
+                size += sys.getsizeof(patient_id) + sys.getsizeof(record)
+                size += sum(sys.getsizeof(value) for value in record)
+            return size
+    
+    def stats(self):
+        patients = len(self.patients)
+        size = self.memory_usage()
+        return {
+            'loaded': self.loaded,
+            'current': self.is_current(),
+            'patients': patients,
+            'tokens': len(self.tokens),
+            'memory_bytes': size,
+            'bytes_per_100k_patients': round(size / patients * 100000) if patients else None,
+        }
+
+
+index = PatientAutocompleteIndex()
@@ -0,0 +1,221 @@
+"""Interval based doctor availability.
+
+Booked appointments of any number of doctors over a date range are read in
+one query, ordered by doctor, date and time, and merged into busy intervals
+in a single pass. Free slots are then found by sweeping each working day
+against those intervals, so a 60 minute appointment blocks 60 minutes, not
+one 30 minute step.
+
+Times are minutes since midnight internally; the working day and the slot
+step come from CLINIC_HOURS and AVAILABILITY_STEP_MINUTES in settings. The
+a-prefixed functions read the appointments through the async ORM and share
+the sweep with their sync twins.
+
+Only scheduled appointments block their duration, but an appointment of any
+status still holds the unique (doctor, date, time), so its exact start is
+never offered either; Hospital.booking treats it the same way.
+"""
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+
+from .models import Appointment, Doctor
+
+BUSY_STATUSES = ['scheduled']
+MAX_RANGE_DAYS = 31
+
+
+def _minutes(value):
+    return value.hour * 60 + value.minute
+
+
+def _time(minutes):
+    return time(minutes // 60, minutes % 60)
+
+
+def clinic_hours():
+    """(opening, closing) minutes, CLINIC_HOURS in settings (default 09:00-17:00)"""
+    opening, closing = getattr(settings, 'CLINIC_HOURS', ('09:00', '17:00'))
+    return (
+        _minutes(datetime.strptime(opening, '%H:%M')),
+        _minutes(datetime.strptime(closing, '%H:%M')),
+    )
+
+
+def step_minutes():
+    return int(getattr(settings, 'AVAILABILITY_STEP_MINUTES', 30))
+
+
+def _busy_rows(doctor_ids, start_date, end_date):
+    return (
+        Appointment.objects
+        .filter(
+            doctor_id__in=doctor_ids,
+            appointment_date__range=(start_date, end_date),
+        )
+        .order_by('doctor_id', 'appointment_date', 'appointment_time')
+        .values_list('doctor_id', 'appointment_date', 'appointment_time', 'duration_minutes', 'status')
+    )
+
+
+def _merge(rows):
+    busy, taken = {}, {}
+    for doctor_id, day, start_time, duration, status in rows:
+        start = _minutes(start_time)
+        taken.setdefault((doctor_id, day), set()).add(start)
+        if status not in BUSY_STATUSES:
+            continue
+        end = start + max(duration, 1)
+        intervals = busy.setdefault((doctor_id, day), [])
+        if intervals and start <= intervals[-1][1]:
+            if end > intervals[-1][1]:
+                intervals[-1] = (intervals[-1][0], end)
+        else:
+            intervals.append((start, end))
+    return busy, taken
+
+
+def busy_intervals(doctor_ids, start_date, end_date):
+    """(busy, taken), both keyed by (doctor_id, date): the merged (start, end)
+    minute intervals of scheduled appointments, and the set of start minutes
+    of appointments of any status.
+    
+    Overlapping and touching appointments collapse into one interval.
+    """
+    return _merge(_busy_rows(doctor_ids, start_date, end_date).iterator())
+
+
+async def abusy_intervals(doctor_ids, start_date, end_date):
+    """busy_intervals() through the async ORM"""
+    return _merge([row async for row in _busy_rows(doctor_ids, start_date, end_date)])
+
+
+def free_slots(intervals, duration, opening, closing, step, earliest=None, taken=()):
+    """Start minutes of every ``duration`` long slot that fits between
+    ``intervals`` (sorted and merged) inside opening-closing and does not
+    start at a ``taken`` minute"""
+    slots = []
+    position = 0
+    start = opening
+    if earliest is not None and earliest > start:
+        # Keep the grid aligned to the opening time
+        start += -(-(earliest - start) // step) * step
+    while start + duration <= closing:
+        end = start + duration
+        # Intervals that ended by this slot's start can never block a later slot
+        while position < len(intervals) and intervals[position][1] <= start:
+            position += 1
+        if position < len(intervals) and intervals[position][0] < end:
+            # Jump to the first grid point at or after the blocking interval's end
+            start += -(-(intervals[position][1] - start) // step) * step
+            continue
+        if start not in taken:
+            slots.append(start)
+        start += step
+    return slots
+
+
+def _days(start_date, end_date):
+    if end_date < start_date:
+        raise ValidationError('end date is before start date')
+    if (end_date - start_date).days >= MAX_RANGE_DAYS:
+        raise ValidationError(f'date range is limited to {MAX_RANGE_DAYS} days')
+    return [start_date + timedelta(days=offset) for offset in range((end_date - start_date).days + 1)]
+
+
+def _earliest(day, now):
+    """First bookable minute of ``day``; nothing in the past is offered"""
+    if now is None or day > now.date():
+        return None
+    if day < now.date():
+        return 24 * 60
+    return _minutes(now) + 1 if now.second or now.microsecond else _minutes(now)
+
+
+def _availability(doctor_ids, days, schedule, duration, now):
+    busy, taken = schedule
+    step = step_minutes()
+    duration = duration or step
+    opening, closing = clinic_hours()
+    availability = {}
+    for doctor_id in doctor_ids:
+        availability[doctor_id] = {
+            day: [
+                _time(minutes)
+                for minutes in free_slots(
+                    busy.get((doctor_id, day), []), duration, opening, closing, step, _earliest(day, now),
+                    taken.get((doctor_id, day), ()),
+                )
+            ]
+            for day in days
+        }
+    return availability
+
+
+def _first_free(doctor_ids, days, schedule, duration, now):
+    busy, taken = schedule
+    step = step_minutes()
+    duration = duration or step
+    opening, closing = clinic_hours()
+    for day in days:
+        best = None
+        for doctor_id in doctor_ids:
+            slots = free_slots(
+                busy.get((doctor_id, day), []), duration, opening, closing, step, _earliest(day, now),
+                taken.get((doctor_id, day), ()),
+            )
+            if slots and (best is None or slots[0] < best[0]):
+                best = (slots[0], doctor_id)
+        if best is not None:
+            return day, _time(best[0]), best[1]
+    return None
+
+
+def _ids(doctors):
+    return [getattr(doctor, 'pk', doctor) for doctor in doctors]
+
+
+def doctor_availability(doctors, start_date, end_date, duration=None, now=None):
+    """Free slots of each doctor per day: {doctor_id: {date: [time, ...]}}.
+    
+    ``doctors`` is a Doctor queryset or a list of ids; one query reads every
+    appointment in the range. ``now`` (a naive local datetime) hides slots
+    that have already started.
+    """
+    days = _days(start_date, end_date)
+    doctor_ids = _ids(doctors)
+    return _availability(doctor_ids, days, busy_intervals(doctor_ids, start_date, end_date), duration, now)
+
+
+async def adoctor_availability(doctors, start_date, end_date, duration=None, now=None):
+    """doctor_availability() for async views; ``doctors`` is a list of ids"""
+    days = _days(start_date, end_date)
+    doctor_ids = _ids(doctors)
+    return _availability(doctor_ids, days, await abusy_intervals(doctor_ids, start_date, end_date), duration, now)
+
+
+def first_free_slot(doctors, start_date, end_date, duration=None, now=None):
+    """Earliest (date, time, doctor_id) any of ``doctors`` is free, or None.
+    
+    Ties on the same minute go to the doctor listed first.
+    """
+    days = _days(start_date, end_date)
+    doctor_ids = _ids(doctors)
+    return _first_free(doctor_ids, days, busy_intervals(doctor_ids, start_date, end_date), duration, now)
+
+
+async def afirst_free_slot(doctors, start_date, end_date, duration=None, now=None):
+    """first_free_slot() for async views; ``doctors`` is a list of ids"""
+    days = _days(start_date, end_date)
+    doctor_ids = _ids(doctors)
+    return _first_free(doctor_ids, days, await abusy_intervals(doctor_ids, start_date, end_date), duration, now)
+
+
+def active_doctors(specialty=None, doctor_ids=None):
+    doctors = Doctor.objects.filter(is_active=True)
+    if specialty:
+        doctors = doctors.filter(specialty=specialty)
+    if doctor_ids:
+        doctors = doctors.filter(id__in=doctor_ids)
+    return doctors
@@ -0,0 +1,130 @@
+"""Helpers shared by the bench_* management commands"""
+import asyncio
+import io
+import statistics
+import sys
+import time
+from contextlib import contextmanager
+
+from django.test.utils import setup_databases, teardown_databases
+
+# Any 32 character secret; sent as both the CSRF cookie and the header
+CSRF_SECRET = 'benchmarkbenchmarkbenchmarkbench'
+
+
+@contextmanager
+def throwaway_database(aliases=('default',)):
+    """Run the block against freshly migrated test databases, never the real data"""
+    old_config = setup_databases(verbosity=0, interactive=False, aliases=set(aliases))
+    try:
+        yield
+    finally:
+        teardown_databases(old_config, verbosity=0)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(timings_ms):
+    """p50/p95/p99 and mean of a list of latencies in milliseconds"""
+    return {
+        'count': len(timings_ms),
+        'mean_ms': statistics.fmean(timings_ms) if timings_ms else None,
+        'p50_ms': percentile(timings_ms, 0.50),
+        'p95_ms': percentile(timings_ms, 0.95),
+        'p99_ms': percentile(timings_ms, 0.99),
+    }
+
+
+def time_calls(function, repeat):
+    """Call ``function`` ``repeat`` times and return each latency in milliseconds"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def call_wsgi(app, method, path, query='', body=b''):
+    """Send one request straight to a WSGI application; returns (status, body).
+    
+    Of a streamed response only the first chunk is read, so an endless
+    event stream does not hang the caller.
+    """
+    environ = {
+        'REQUEST_METHOD': method,
+        'PATH_INFO': path,
+        'QUERY_STRING': query,
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'REMOTE_ADDR': '127.0.0.1',
+        'HTTP_HOST': 'localhost',
+        'HTTP_COOKIE': f'csrftoken={CSRF_SECRET}',
+        'HTTP_X_CSRFTOKEN': CSRF_SECRET,
+        'CONTENT_TYPE': 'application/x-www-form-urlencoded',
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.url_scheme': 'http',
+        'wsgi.version': (1, 0),
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    status = []
+    response = app(environ, lambda code, headers, exc_info=None: status.append(code))
+    try:
+        content = next(iter(response), b'') if response.streaming else b''.join(response)
+    finally:
+        response.close()
+    return int(status[0].split()[0]), content
+
+
+async def call_asgi(app, method, path, query='', body=b''):
+    """Send one request straight to an ASGI application; returns (status, body)"""
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': method,
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': query.encode(),
+        'root_path': '',
+        'headers': [
+            (b'host', b'localhost'),
+            (b'cookie', f'csrftoken={CSRF_SECRET}'.encode()),
+            (b'x-csrftoken', CSRF_SECRET.encode()),
+            (b'content-type', b'application/x-www-form-urlencoded'),
+            (b'content-length', str(len(body)).encode()),
+        ],
+        'client': ('127.0.0.1', 0),
+        'server': ('localhost', 80),
+    }
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    disconnected = asyncio.Event()
+    status = []
+    chunks = []
+    
+    async def receive():
+        if messages:
+            return messages.pop()
+        # The client never hangs up mid-request
+        await disconnected.wait()
+    
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            status.append(message['status'])
+        elif message['type'] == 'http.response.body':
+            chunks.append(message.get('body', b''))
+    
+    await app(scope, receive, send)
+    return status[0], b''.join(chunks)
@@ -0,0 +1,210 @@
+"""Atomic bill creation with itemized, server-side totals"""
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import connections, router, transaction
+
+from .caching import bump_version, model_dependency
+from .models import Bill, BillItem, Patient, bill_numbers, format_bill_number
+from .revenue import refresh_days
+
+CENTS = Decimal('0.01')
+
+
+def _field_limit(model, name):
+    """Largest value a DecimalField column holds"""
+    field = model._meta.get_field(name)
+    return Decimal(10) ** (field.max_digits - field.decimal_places) - Decimal(1).scaleb(-field.decimal_places)
+
+
+# Bill amounts are DecimalField(max_digits=10), item prices max_digits=8
+MAX_AMOUNT = _field_limit(Bill, 'total_amount')
+MAX_ITEM_AMOUNT = _field_limit(BillItem, 'unit_price')
+ITEM_TYPES = {choice[0] for choice in BillItem.ITEM_TYPE_CHOICES}
+PAYMENT_METHODS = {choice[0] for choice in Bill.PAYMENT_METHOD_CHOICES}
+
+
+def _decimal(value, field, limit=MAX_AMOUNT):
+    try:
+        number = Decimal(str(value))
+        # NaN and Infinity parse, but are no amounts
+        if not number.is_finite():
+            raise ValueError(value)
+        number = number.quantize(CENTS)
+    except (InvalidOperation, TypeError, ValueError):
+        raise ValidationError(f'{field} must be a number, got {value!r}')
+    if number < 0:
+        raise ValidationError(f'{field} cannot be negative')
+    if number > limit:
+        raise ValidationError(f'{field} cannot exceed {limit}')
+    return number
+
+
+def _quantity(value, field):
+    # int() would truncate 1.9 and take true for 1
+    if isinstance(value, bool):
+        raise ValidationError(f'{field} must be a whole number, got {value!r}')
+    try:
+        number = Decimal(str(value))
+        if not number.is_finite() or number != number.to_integral_value():
+            raise ValueError(value)
+    except (InvalidOperation, ValueError):
+        raise ValidationError(f'{field} must be a whole number, got {value!r}')
+    return int(number)
+
+
+def _date(value, field):
+    if isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(str(value))
+    except ValueError:
+        raise ValidationError(f'{field} must be a date in YYYY-MM-DD format, got {value!r}')
+
+
+def tax_rate():
+    """Tax applied to the discounted subtotal, BILL_TAX_RATE in settings (e.g. '0.13')"""
+    return Decimal(str(getattr(settings, 'BILL_TAX_RATE', '0')))
+
+
+def build_items(items):
+    """Validate ``items_json`` style dicts and price them; nothing is saved"""
+    if not isinstance(items, list):
+        raise ValidationError(f'items must be a list, got {items!r}')
+    bill_items = []
+    for position, item in enumerate(items, start=1):
+        label = f'Item {position}'
+        if not isinstance(item, dict):
+            raise ValidationError(f'{label} must be an object, got {item!r}')
+        try:
+            item_type = item['type']
+            description = str(item['description'])
+            quantity = _quantity(item['quantity'], f'{label} quantity')
+            unit_price = _decimal(item['unit_price'], f'{label} unit_price', MAX_ITEM_AMOUNT)
+        except KeyError as e:
+            raise ValidationError(f'{label} is missing {e.args[0]!r}')
+        if not isinstance(item_type, str) or item_type not in ITEM_TYPES:
+            raise ValidationError(f'{label} has unknown type {item_type!r}')
+        if quantity < 1:
+            raise ValidationError(f'{label} quantity must be at least 1')
+        if len(description) > 200:
+            raise ValidationError(f'{label} description is longer than 200 characters')
+        # priced here because bulk_create skips BillItem.save
+        total_price = (quantity * unit_price).quantize(CENTS)
+        if total_price > MAX_ITEM_AMOUNT:
+            raise ValidationError(f'{label} total_price cannot exceed {MAX_ITEM_AMOUNT}')
+        bill_items.append(BillItem(
+            item_type=item_type,
+            description=description,
+            quantity=quantity,
+            unit_price=unit_price,
+            total_price=total_price,
+        ))
+    return bill_items
+
+
+def build_bill(data, rate=None):
+    """Validate one bill dict and return the unsaved (Bill, [BillItem]) pair.
+    
+    With items, total_amount and tax_amount are derived from them:
+    subtotal - discount_amount + tax on the discounted subtotal. A bill
+    without items keeps the posted total_amount, as before.
+    """
+    rate = tax_rate() if rate is None else rate
+    if not isinstance(data, dict):
+        raise ValidationError(f'A bill must be an object, got {data!r}')
+    if 'patient' not in data:
+        raise ValidationError('patient is required')
+    try:
+        patient_id = int(data['patient'])
+    except (TypeError, ValueError):
+        raise ValidationError(f"patient must be an id, got {data['patient']!r}")
+    if 'due_date' not in data:
+        raise ValidationError('due_date is required')
+    payment_method = data.get('payment_method') or ''
+    if payment_method and (not isinstance(payment_method, str) or payment_method not in PAYMENT_METHODS):
+        raise ValidationError(f'Unknown payment_method {payment_method!r}')
+    
+    items = build_items(data.get('items') or [])
+    discount = _decimal(data.get('discount_amount') or 0, 'discount_amount')
+    if items:
+        subtotal = sum((item.total_price for item in items), Decimal('0.00'))
+        if subtotal > MAX_AMOUNT:
+            raise ValidationError(f'The item subtotal cannot exceed {MAX_AMOUNT}')
+        if discount > subtotal:
+            raise ValidationError('discount_amount cannot exceed the item subtotal')
+        tax = ((subtotal - discount) * rate).quantize(CENTS)
+        total = subtotal - discount + tax
+        if total > MAX_AMOUNT:
+            raise ValidationError(f'total_amount cannot exceed {MAX_AMOUNT}')
+    elif data.get('total_amount') not in (None, ''):
+        tax = _decimal(data.get('tax_amount') or 0, 'tax_amount')
+        total = _decimal(data['total_amount'], 'total_amount')
+    else:
+        raise ValidationError('A bill needs items or a total_amount')
+    
+    bill = Bill(
+        patient_id=patient_id,
+        total_amount=total,
+        discount_amount=discount,
+        tax_amount=tax,
+        payment_method=payment_method,
+        due_date=_date(data['due_date'], 'due_date'),
+        description=str(data.get('description') or ''),
+    )
+    return bill, items
+
+
+def create_bills(bills_data):
+    """Create many bills and all their items in one transaction.
+    
+    Each bill dict takes patient, due_date, items (list of type,
+    description, quantity, unit_price), and optionally discount_amount,
+    payment_method and description. Everything is validated before the
+    first write; bills and items are then inserted with one bulk_create
+    each, so a batch costs a constant number of queries.
+    """
+    rate = tax_rate()
+    built = []
+    for position, data in enumerate(bills_data, start=1):
+        try:
+            built.append(build_bill(data, rate))
+        except ValidationError as e:
+            raise ValidationError(f"Bill {position}: {' '.join(e.messages)}")
+    
+    patient_ids = {bill.patient_id for bill, items in built}
+    known = set(Patient.objects.filter(id__in=patient_ids).order_by().values_list('id', flat=True))
+    if patient_ids - known:
+        raise ValidationError(f'Unknown patient ids: {sorted(patient_ids - known)}')
+    
+    using = router.db_for_write(Bill)
+    with transaction.atomic(using=using):
+        for (bill, items), number in zip(built, bill_numbers.allocate(len(built))):
+            bill.bill_number = format_bill_number(number)
+        bills = Bill.objects.using(using).bulk_create([bill for bill, items in built])
+        if not connections[using].features.can_return_rows_from_bulk_insert:
+            ids = dict(
+                Bill.objects.using(using)
+                .filter(bill_number__in=[bill.bill_number for bill in bills])
+                .values_list('bill_number', 'id')
+            )
+            for bill in bills:
+                bill.pk = ids[bill.bill_number]
+        bill_items = []
+        for bill, (_, items) in zip(bills, built):
+            for item in items:
+                item.bill = bill
+                bill_items.append(item)
+        BillItem.objects.using(using).bulk_create(bill_items)
+        # bulk_create sends no post_save, so invalidate the cached pages and
+        # refresh the revenue rollup here
+        transaction.on_commit(lambda: bump_version(model_dependency(Bill)), using=using)
+        refresh_days({bill.bill_date for bill in bills}, using)
+    return bills
+
+
+def create_bill(data):
+    """Create a single bill with its items atomically"""
+    return create_bills([data])[0]
@@ -0,0 +1,146 @@
+"""Recurring appointment series.
+
+Every candidate slot of a series (weekly physiotherapy for 12 weeks, say) is
+checked in one query: the appointments of the doctor or the patient on any
+of the candidate dates. A slot conflicts when a scheduled appointment of
+either overlaps it for its duration_minutes, or when the doctor has any
+appointment, even a cancelled one, at exactly that date and time, which the
+unique constraint would reject. The free slots are then inserted with one
+bulk_create, and the conflicts are returned rather than raised.
+"""
+from datetime import date, datetime, timedelta
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, connections, router, transaction
+from django.db.models import Q
+
+from . import live
+from .availability import BUSY_STATUSES, clinic_hours
+from .caching import bump_version, model_dependency, object_dependency
+from .models import Appointment, Doctor, Patient
+from .signals import appointment_event
+
+FREQUENCIES = {'daily': 1, 'weekly': 7, 'fortnightly': 14}
+MAX_OCCURRENCES = 52
+APPOINTMENT_TYPES = {choice[0] for choice in Appointment.APPOINTMENT_TYPE_CHOICES}
+
+
+def _minutes(value):
+    return value.hour * 60 + value.minute
+
+
+def series_dates(start_date, occurrences, frequency='weekly'):
+    if frequency not in FREQUENCIES:
+        raise ValidationError(f"frequency must be one of {', '.join(FREQUENCIES)}, got {frequency!r}")
+    if not 1 <= occurrences <= MAX_OCCURRENCES:
+        raise ValidationError(f'occurrences must be between 1 and {MAX_OCCURRENCES}')
+    step = timedelta(days=FREQUENCIES[frequency])
+    return [start_date + step * number for number in range(occurrences)]
+
+
+def find_conflicts(doctor_id, patient_id, dates, start_time, duration):
+    """{date: conflict dict} for the dates whose slot cannot be booked; one query"""
+    start = _minutes(start_time)
+    end = start + max(duration, 1)
+    opening, closing = clinic_hours()
+    conflicts = {}
+    if start < opening or end > closing:
+        for day in dates:
+            conflicts[day] = {'reason': 'outside_clinic_hours', 'appointment_id': None}
+        return conflicts
+    
+    rows = (
+        Appointment.objects
+        .filter(appointment_date__in=dates)
+        .filter(Q(doctor_id=doctor_id) | Q(patient_id=patient_id, status__in=BUSY_STATUSES))
+        .order_by('appointment_date', 'appointment_time')
+        .values_list('id', 'doctor_id', 'appointment_date', 'appointment_time', 'duration_minutes', 'status')
+    )
+    for pk, row_doctor_id, day, row_time, row_duration, status in rows:
+        if day in conflicts:
+            continue
+        row_start = _minutes(row_time)
+        overlaps = status in BUSY_STATUSES and row_start < end and start < row_start + max(row_duration, 1)
+        if row_doctor_id == doctor_id and (overlaps or row_time == start_time):
+            conflicts[day] = {'reason': 'doctor_busy', 'appointment_id': pk}
+        elif overlaps:
+            conflicts[day] = {'reason': 'patient_busy', 'appointment_id': pk}
+    return conflicts
+
+
+def book_series(data, all_or_nothing=False):
+    """Book a recurring series of appointments.
+    
+    ``data`` takes patient, doctor, start_date, time, occurrences, and
+    optionally frequency (daily, weekly or fortnightly; weekly by default),
+    duration_minutes, appointment_type, reason and notes. Returns (booked
+    appointments, conflicts), conflicts being [{date, time, reason,
+    appointment_id}, ...]. With ``all_or_nothing`` a single conflict books
+    nothing.
+    """
+    try:
+        patient_id = int(data['patient'])
+        doctor_id = int(data['doctor'])
+        start_date = date.fromisoformat(str(data['start_date']))
+        start_time = datetime.strptime(str(data['time']), '%H:%M').time()
+        occurrences = int(data['occurrences'])
+        duration = int(data.get('duration_minutes') or 30)
+    except KeyError as e:
+        raise ValidationError(f'Missing {e.args[0]!r}')
+    except (TypeError, ValueError):
+        raise ValidationError(
+            'patient, doctor, occurrences and duration_minutes must be numbers, '
+            'start_date YYYY-MM-DD and time HH:MM'
+        )
+    appointment_type = data.get('appointment_type') or 'consultation'
+    if appointment_type not in APPOINTMENT_TYPES:
+        raise ValidationError(f'Unknown appointment_type {appointment_type!r}')
+    if duration < 1:
+        raise ValidationError('duration_minutes must be at least 1')
+    dates = series_dates(start_date, occurrences, data.get('frequency') or 'weekly')
+    if not Patient.objects.filter(pk=patient_id).exists():
+        raise ValidationError(f'Unknown patient id {patient_id}')
+    if not Doctor.objects.filter(pk=doctor_id, is_active=True).exists():
+        raise ValidationError(f'Unknown or inactive doctor id {doctor_id}')
+    
+    using = router.db_for_write(Appointment)
+    try:
+        with transaction.atomic(using=using):
+            conflicts = find_conflicts(doctor_id, patient_id, dates, start_time, duration)
+            booked = [] if conflicts and all_or_nothing else [
+                Appointment(
+                    patient_id=patient_id,
+                    doctor_id=doctor_id,
+                    appointment_date=day,
+                    appointment_time=start_time,
+                    appointment_type=appointment_type,
+                    duration_minutes=duration,
+                    reason=data.get('reason') or 'Recurring appointment',
+                    notes=data.get('notes') or '',
+                )
+                for day in dates if day not in conflicts
+            ]
+            if booked:
+                booked = Appointment.objects.using(using).bulk_create(booked)
+                if not connections[using].features.can_return_rows_from_bulk_insert:
+                    ids = dict(
+                        Appointment.objects.using(using)
+                        .filter(doctor_id=doctor_id, appointment_time=start_time, appointment_date__in=dates)
+                        .values_list('appointment_date', 'id')
+                    )
+                    for appointment in booked:
+                        appointment.pk = ids[appointment.appointment_date]
+                # bulk_create sends no post_save: invalidate and publish here
+                dependencies = [model_dependency(Appointment), object_dependency(Doctor, doctor_id)]
+                transaction.on_commit(lambda: bump_version(*dependencies), using=using)
+                for appointment in booked:
+                    live.publish('appointment', appointment_event(appointment, 'created'), using)
+                live.refresh_stats(using)
+    except IntegrityError:
+        # Booked by someone else between the check and the insert
+        raise ValidationError('Another booking took one of the slots; please try again')
+    
+    return booked, [
+        {'date': day, 'time': start_time, **conflict}
+        for day, conflict in sorted(conflicts.items())
+    ]
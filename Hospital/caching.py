@@ -0,0 +1,137 @@
+"""Versioned caching.
+
+Every cached value is stored under a key that embeds the current version
+counter of each thing it depends on. Model signals bump those counters, so a
+change makes the old entries unreachable immediately; no TTL guessing and no
+key scanning. Counters live in the configured cache, which must be shared
+between workers (see CACHES in settings) for invalidation to reach all of them.
+"""
+import threading
+import time
+
+from django.core.cache import cache
+
+from .routers import primary_reads
+
+VERSION_PREFIX = 'hms:v:'
+VALUE_PREFIX = 'hms:c:'
+DEFAULT_TIMEOUT = 60 * 60
+
+
+def model_dependency(model):
+    """Dependency name for every row of a model, e.g. 'Hospital.patient'"""
+    return model._meta.label_lower
+
+
+def object_dependency(model, pk):
+    """Dependency name for a single row, e.g. 'Hospital.doctor:12'"""
+    return f'{model._meta.label_lower}:{pk}'
+
+
+def _initial_version():
+    # A time based start value keeps an evicted counter from coming back at a
+    # number that an old, still cached entry was stored under.
+    return time.time_ns()
+
+
+def get_versions(dependencies):
+    """Current version of each dependency, fetched in one cache round trip"""
+    keys = {VERSION_PREFIX + name: name for name in dependencies}
+    found = cache.get_many(keys)
+    missing = {key: _initial_version() for key in keys if key not in found}
+    for key, version in missing.items():
+        # add() so that a concurrent bump is not overwritten
+        if not cache.add(key, version, timeout=None):
+            version = cache.get(key, version)
+        found[key] = version
+    return {keys[key]: version for key, version in found.items()}
+
+
+def bump_version(*dependencies):
+    """Invalidate every cached value that depends on ``dependencies``.
+    
+    Returns the new version of each dependency.
+    """
+    versions = {}
+    for name in dependencies:
+        key = VERSION_PREFIX + name
+        try:
+            versions[name] = cache.incr(key)
+        except ValueError:
+            versions[name] = _initial_version()
+            cache.set(key, versions[name], timeout=None)
+    return versions
+
+
+def versioned_key(name, dependencies, *parts):
+    versions = get_versions(dependencies)
+    stamp = '.'.join(str(versions[dependency]) for dependency in dependencies)
+    return ':'.join([VALUE_PREFIX + name, *map(str, parts), stamp])
+
+
+class CacheStats:
+    """Hit/miss counters and rebuild timings for one cached value"""
+    
+    def __init__(self, name):
+        self.name = name
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.rebuild_seconds = 0.0
+        self.last_rebuild_seconds = None
+    
+    def record_hit(self):
+        with self.lock:
+            self.hits += 1
+    
+    def record_rebuild(self, seconds):
+        with self.lock:
+            self.misses += 1
+            self.rebuild_seconds += seconds
+            self.last_rebuild_seconds = seconds
+    
+    def as_dict(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else None,
+                'avg_rebuild_ms': self.rebuild_seconds / self.misses * 1000 if self.misses else None,
+                'last_rebuild_ms': self.last_rebuild_seconds * 1000 if self.last_rebuild_seconds is not None else None,
+            }
+
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def get_stats(name):
+    with _stats_lock:
+        if name not in _stats:
+            _stats[name] = CacheStats(name)
+        return _stats[name]
+
+
+def all_stats():
+    """Per-process counters of every cached value, for monitoring"""
+    with _stats_lock:
+        names = sorted(_stats)
+    return {name: get_stats(name).as_dict() for name in names}
+
+
+def get_or_build(name, dependencies, build, *parts, timeout=DEFAULT_TIMEOUT):
+    """Return the cached value for ``name``/``parts`` or build and store it"""
+    stats = get_stats(name)
+    key = versioned_key(name, dependencies, *parts)
+    value = cache.get(key)
+    if value is not None:
+        stats.record_hit()
+        return value
+    started = time.perf_counter()
+    # Never from a lagging replica: the value is stored under the current version
+    with primary_reads():
+        value = build()
+    stats.record_rebuild(time.perf_counter() - started)
+    cache.set(key, value, timeout)
+    return value
@@ -0,0 +1,72 @@
+"""Dashboard statistics, aggregated in one query and served from the versioned cache"""
+from django.db.models import CharField, Count, IntegerField, Q, Value
+from django.utils import timezone
+
+from .caching import get_or_build, model_dependency
+from .models import Doctor, Patient, Appointment, Bill, Room
+
+DASHBOARD_MODELS = [Patient, Doctor, Appointment, Bill, Room]
+DASHBOARD_DEPENDENCIES = [model_dependency(model) for model in DASHBOARD_MODELS]
+# sweep_statuses moves unpaid bills past their due date to 'overdue'
+PENDING_BILL_STATUSES = ['unpaid', 'overdue']
+COUNTER_KEYS = [
+    'total_patients', 'active_patients', 'total_doctors', 'today_appointments', 'pending_bills', 'available_rooms',
+]
+
+
+def _counts(queryset, label, first, second=None):
+    """One (label, first, second) row of conditional counts for a table"""
+    return (
+        queryset.order_by()
+        .annotate(label=Value(label, output_field=CharField()))
+        .values('label')
+        .annotate(first=first, second=second if second is not None else Value(0, output_field=IntegerField()))
+        .values_list('label', 'first', 'second')
+    )
+
+
+def count_statistics(today):
+    """All dashboard counters in a single UNION ALL round trip"""
+    rows = _counts(
+        Patient.objects.all(), 'patients', Count('pk'), Count('pk', filter=Q(status='active'))
+    ).union(
+        _counts(Doctor.objects.filter(is_active=True), 'doctors', Count('pk')),
+        _counts(Appointment.objects.filter(appointment_date=today, status='scheduled'), 'appointments', Count('pk')),
+        _counts(Bill.objects.filter(status__in=PENDING_BILL_STATUSES), 'bills', Count('pk')),
+        _counts(Room.objects.filter(status='available'), 'rooms', Count('pk')),
+        all=True,
+    )
+    counts = {label: (first, second) for label, first, second in rows}
+    return {
+        'total_patients': counts['patients'][0],
+        'active_patients': counts['patients'][1],
+        'total_doctors': counts['doctors'][0],
+        'today_appointments': counts['appointments'][0],
+        'pending_bills': counts['bills'][0],
+        'available_rooms': counts['rooms'][0],
+    }
+
+
+def build_dashboard_context(today):
+    context = count_statistics(today)
+    context['recent_patients'] = list(Patient.objects.all()[:5])
+    context['todays_appointments'] = list(
+        Appointment.objects.filter(appointment_date=today)
+        .select_related('patient', 'doctor')
+        .order_by('appointment_time')[:10]
+    )
+    return context
+
+
+def get_dashboard_context():
+    """Dashboard context; costs no database queries until a dashboard model changes"""
+    today = timezone.now().date()
+    return get_or_build(
+        'dashboard', DASHBOARD_DEPENDENCIES, lambda: build_dashboard_context(today), today.isoformat()
+    )
+
+
+def dashboard_counters():
+    """Just the counters of the cached dashboard context, for the live feed"""
+    context = get_dashboard_context()
+    return {key: context[key] for key in COUNTER_KEYS}
@@ -0,0 +1,135 @@
+"""Attachment downloads with conditional GET and single byte ranges.
+
+The file is never read into memory. A whole-file response is a FileResponse,
+which the WSGI server sends with sendfile where it offers wsgi.file_wrapper.
+A range is streamed in CHUNK_SIZE blocks. With ATTACHMENT_ACCEL_REDIRECT set,
+nginx is handed the file instead and does both itself.
+
+Content-addressed names get their digest as a strong ETag. Other files get
+one made from their modification time and size, as nginx makes it.
+"""
+import os
+import re
+import stat as file_mode
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe
+
+from .storage import CHUNK_SIZE, attachment_storage, digest_of
+
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class FileRange:
+    """Reads ``length`` bytes of ``file`` from ``start``"""
+    
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+    
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+    
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """(start, end) inclusive of a single-range header; None to send the whole
+    file (no header, one we do not handle, or several ranges), and ``False``
+    when the range lies outside the file"""
+    match = RANGE.match(header.replace(' ', '')) if header else None
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first:
+        if not last:
+            return None
+        # The last N bytes
+        suffix = int(last)
+        if suffix == 0 or size == 0:
+            return False
+        return max(size - suffix, 0), size - 1
+    start = int(first)
+    if start >= size:
+        return False
+    end = min(int(last), size - 1) if last else size - 1
+    if end < start:
+        return None
+    return start, end
+
+
+def if_range_matches(request, etag, last_modified):
+    """Whether If-Range (if sent) still names this version of the file"""
+    value = request.headers.get('If-Range')
+    if not value:
+        return True
+    if value.startswith('"'):
+        return value == etag
+    return parse_http_date_safe(value) == last_modified
+
+
+def serve_file(request, name, filename=None, as_attachment=True, storage=None):
+    """Response for the stored file ``name``, honouring the request's
+    conditional and Range headers"""
+    storage = storage or attachment_storage()
+    path = storage.path(name)
+    try:
+        stat = os.stat(path)
+    except (FileNotFoundError, NotADirectoryError):
+        raise Http404('The file is not stored')
+    if not file_mode.S_ISREG(stat.st_mode):
+        raise Http404('The file is not stored')
+    digest = digest_of(name)
+    etag = f'"{digest}"' if digest else f'"{int(stat.st_mtime):x}-{stat.st_size:x}"'
+    last_modified = int(stat.st_mtime)
+    
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        return response
+    
+    filename = filename or os.path.basename(name)
+    if settings.ATTACHMENT_ACCEL_REDIRECT:
+        response = HttpResponse()
+        # nginx sets it from the file's extension
+        del response['Content-Type']
+        response['X-Accel-Redirect'] = settings.ATTACHMENT_ACCEL_REDIRECT + quote(
+            os.path.relpath(path, storage.location).replace(os.sep, '/')
+        )
+        response['Content-Disposition'] = content_disposition_header(as_attachment, filename)
+    else:
+        byte_range = parse_range(request.headers.get('Range'), stat.st_size)
+        if byte_range is not None and not if_range_matches(request, etag, last_modified):
+            byte_range = None
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{stat.st_size}'
+            return response
+        file = open(path, 'rb')
+        if byte_range is None:
+            response = FileResponse(file, as_attachment=as_attachment, filename=filename)
+        else:
+            start, end = byte_range
+            response = FileResponse(
+                FileRange(file, start, end - start + 1), as_attachment=as_attachment, filename=filename, status=206,
+            )
+            response['Content-Length'] = end - start + 1
+            response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+        response.block_size = CHUNK_SIZE
+        response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+def media(request, path):
+    """Everything under MEDIA_URL, for the development server"""
+    return serve_file(request, path, as_attachment=False)
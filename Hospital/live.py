@@ -0,0 +1,236 @@
+"""Live feed of dashboard changes, pushed to screens over Server-Sent Events.
+
+Model signals publish small events after commit (an appointment booked or
+moved to another status, a room changing status, the dashboard counters
+including the unpaid bill count) and every open screen receives them from
+the broadcaster of its process. A screen that connects gets the counters
+once, from the versioned dashboard cache, and then only deltas, so the
+database sees one query per committed change rather than one per screen per
+refresh, and none at all while nobody is watching.
+
+With LIVE_FEED_SHARED the events go through the shared cache (the one that
+holds the version counters) and each process relays them to its own
+subscribers with a single poll; otherwise delivery stays local to the
+process that made the change.
+"""
+import asyncio
+import itertools
+import json
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .dashboard import count_statistics
+
+HEARTBEAT_SECONDS = 15
+# Events a slow screen may fall behind before it is dropped and reconnects
+QUEUE_SIZE = 100
+SEQUENCE_KEY = 'hms:live:seq'
+EVENT_PREFIX = 'hms:live:e:'
+EVENT_TIMEOUT = 60
+# using -> whether this thread's transaction changed the dashboard counters
+_stats_pending = threading.local()
+
+
+def format_event(sequence, kind, data):
+    """One text/event-stream message"""
+    return f'id: {sequence}\nevent: {kind}\ndata: {json.dumps(data, default=str)}\n\n'
+
+
+class Closed(Exception):
+    """The subscriber fell too far behind; the screen reconnects for a fresh snapshot"""
+
+
+class ThreadSubscription:
+    """Subscriber read from a sync (WSGI) response iterator"""
+    
+    def __init__(self):
+        self.queue = queue.Queue(QUEUE_SIZE)
+        self.closed = False
+    
+    def deliver(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            self.closed = True
+            return False
+        return True
+    
+    def get(self, timeout):
+        """Next event, or None if nothing arrived within ``timeout`` seconds"""
+        if self.closed:
+            raise Closed()
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class AsyncSubscription:
+    """Subscriber read from an async (ASGI) response iterator; deliver() may
+    be called from any thread"""
+    
+    def __init__(self):
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(QUEUE_SIZE)
+        self.closed = False
+    
+    def _put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.closed = True
+    
+    def deliver(self, event):
+        if self.closed:
+            return False
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # The loop has gone away with its connection
+            return False
+        return True
+    
+    async def get(self, timeout):
+        if self.closed:
+            raise Closed()
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class Broadcaster:
+    """Fan events out to this process's subscribers"""
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = set()
+        self.sequence = itertools.count(1)
+        self.relaying = False
+    
+    def __len__(self):
+        return len(self.subscribers)
+    
+    def subscribe(self, subscription):
+        with self.lock:
+            self.subscribers.add(subscription)
+            start_relay = shared() and not self.relaying
+            self.relaying = self.relaying or start_relay
+        if start_relay:
+            threading.Thread(target=self._relay, name='live-feed-relay', daemon=True).start()
+        return subscription
+    
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscribers.discard(subscription)
+    
+    def deliver(self, event):
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for subscription in subscribers:
+            if not subscription.deliver(event):
+                self.unsubscribe(subscription)
+    
+    def publish(self, kind, data):
+        """Send an event to every screen"""
+        if shared():
+            cache.add(SEQUENCE_KEY, 0, timeout=None)
+            sequence = cache.incr(SEQUENCE_KEY)
+            cache.set(f'{EVENT_PREFIX}{sequence}', (kind, data), timeout=EVENT_TIMEOUT)
+        elif self.subscribers:
+            self.deliver((next(self.sequence), kind, data))
+    
+    def _relay(self):
+        """Poll the shared cache for new events while anyone here is subscribed"""
+        last = cache.get(SEQUENCE_KEY, 0)
+        interval = getattr(settings, 'LIVE_FEED_POLL_SECONDS', 0.5)
+        while True:
+            with self.lock:
+                if not self.subscribers:
+                    self.relaying = False
+                    return
+            time.sleep(interval)
+            current = cache.get(SEQUENCE_KEY, 0)
+            if current <= last:
+                continue
+            sequences = range(last + 1, current + 1)
+            found = cache.get_many([f'{EVENT_PREFIX}{sequence}' for sequence in sequences])
+            for sequence in sequences:
+                if f'{EVENT_PREFIX}{sequence}' in found:
+                    self.deliver((sequence, *found[f'{EVENT_PREFIX}{sequence}']))
+            last = current
+
+
+def shared():
+    return getattr(settings, 'LIVE_FEED_SHARED', False)
+
+
+broadcaster = Broadcaster()
+
+
+def watching():
+    """Whether an event could reach any screen, so it is worth building"""
+    return shared() or len(broadcaster) > 0
+
+
+def publish(kind, data, using):
+    """Publish once the current transaction commits, if anyone is watching"""
+    if watching():
+        transaction.on_commit(lambda: broadcaster.publish(kind, data), using=using)
+
+
+def publish_stats():
+    broadcaster.publish('stats', count_statistics(timezone.now().date()))
+
+
+def refresh_stats(using):
+    """Publish the dashboard counters after commit; one query per
+    transaction however many rows it changed"""
+    if not watching():
+        return
+    vars(_stats_pending)[using] = True
+    
+    def run():
+        # The first callback to run publishes; the others find nothing
+        # pending. One per call, because a callback registered in a
+        # savepoint that rolls back is dropped.
+        if vars(_stats_pending).pop(using, False):
+            publish_stats()
+    
+    transaction.on_commit(run, using=using)
+
+
+def stream(snapshot, heartbeat=HEARTBEAT_SECONDS):
+    """text/event-stream chunks for a WSGI response: the snapshot, then events"""
+    subscription = broadcaster.subscribe(ThreadSubscription())
+    try:
+        yield 'retry: 3000\n' + format_event(0, 'snapshot', snapshot)
+        while True:
+            try:
+                event = subscription.get(heartbeat)
+            except Closed:
+                return
+            yield format_event(*event) if event else ': keep-alive\n\n'
+    finally:
+        broadcaster.unsubscribe(subscription)
+
+
+async def astream(snapshot, heartbeat=HEARTBEAT_SECONDS):
+    """stream() for an ASGI response; holds no thread between events"""
+    subscription = broadcaster.subscribe(AsyncSubscription())
+    try:
+        yield 'retry: 3000\n' + format_event(0, 'snapshot', snapshot)
+        while True:
+            try:
+                event = await subscription.get(heartbeat)
+            except Closed:
+                return
+            yield format_event(*event) if event else ': keep-alive\n\n'
+    finally:
+        broadcaster.unsubscribe(subscription)
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from Hospital.archive import PLANS, archive, default_cutoff, months_before
+
+
+class Command(BaseCommand):
+    help = (
+        'Move discharged patients, finished appointments and settled bills older than the '
+        'cutoff into the archive tables, one transaction per batch'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--only', action='append', choices=list(PLANS),
+            help='Archive only these (repeatable; default: patients, appointments and bills)',
+        )
+        parser.add_argument('--months', type=int, help='Archive what is older than this (default: ARCHIVE_AFTER_MONTHS)')
+        parser.add_argument('--before', help='Archive what is dated before this day (YYYY-MM-DD) instead')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--pause', type=float, default=0, help='Seconds to wait between batches')
+        parser.add_argument('--dry-run', action='store_true', help='Only count what is due for archival')
+    
+    def handle(self, *args, **options):
+        if options['before']:
+            cutoff = parse_date(options['before'])
+            if cutoff is None:
+                raise CommandError(f"--before {options['before']!r} is not a YYYY-MM-DD date")
+        elif options['months'] is not None:
+            cutoff = months_before(timezone.localdate(), options['months'])
+        else:
+            cutoff = default_cutoff()
+        
+        # Patients first: their appointments and bills go with them
+        for kind in options['only'] or list(PLANS):
+            rows_to_archive, _ = PLANS[kind]
+            if options['dry_run']:
+                self.stdout.write(f'{kind}: {rows_to_archive(cutoff).count()} due for archival before {cutoff}')
+                continue
+            totals = {}
+            for batch in archive(kind, cutoff, options['batch_size'], options['pause']):
+                for label, count in batch.items():
+                    totals[label] = totals.get(label, 0) + count
+                self.stdout.write(f'{kind}: ' + ', '.join(f'{count} {label}' for label, count in batch.items()))
+            summary = ', '.join(f'{count} {label}' for label, count in totals.items()) or 'nothing'
+            self.stdout.write(self.style.SUCCESS(f'{kind}: archived {summary} dated before {cutoff}'))
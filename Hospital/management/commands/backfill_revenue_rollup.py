@@ -0,0 +1,40 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Max, Min
+
+from Hospital.models import ArchivedBill, Bill
+from Hospital.revenue import date_chunks, rebuild
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the DailyRevenue rollup from the bills, for all history or a date range'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=date.fromisoformat, help='First bill date (YYYY-MM-DD)')
+        parser.add_argument('--end', type=date.fromisoformat, help='Last bill date (YYYY-MM-DD)')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+    
+    def handle(self, *args, **options):
+        using = options['database']
+        # Archived bills count towards revenue too
+        bounds = [
+            model.objects.using(using).aggregate(first=Min('bill_date'), last=Max('bill_date'))
+            for model in (Bill, ArchivedBill)
+        ]
+        firsts = [bound['first'] for bound in bounds if bound['first'] is not None]
+        lasts = [bound['last'] for bound in bounds if bound['last'] is not None]
+        start = options['start'] or min(firsts, default=None)
+        end = options['end'] or max(lasts, default=None)
+        if start is None or end is None:
+            self.stdout.write('No bills to roll up')
+            return
+        if end < start:
+            raise CommandError('--end is before --start')
+        rows = 0
+        # One transaction per year of bills
+        for first, last in date_chunks(start, end):
+            rows += rebuild(first, last, using)
+            self.stdout.write(f'{first} to {last}: {rows} rollup rows so far')
+        self.stdout.write(self.style.SUCCESS(f'Rolled up {start} to {end} into {rows} rows'))
@@ -0,0 +1,151 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand
+from django.core.wsgi import get_wsgi_application
+from django.urls import reverse
+from django.utils import timezone
+
+from Hospital.benchmarking import call_asgi, call_wsgi, summarize, throwaway_database
+from Hospital.models import Appointment
+from Hospital.synthetic import SyntheticDataGenerator
+
+SEARCH_PREFIXES = ['jo', 'mar', 'smi', 'pri', 'sha', 'da', 'wil', 'tha', 'aa', 'kar']
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare requests/sec and tail latency of the async JSON endpoints served '
+        'by the WSGI handler on a thread pool and by the ASGI handler on one event loop'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--patients', type=int, default=20000)
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per endpoint and deployment')
+        parser.add_argument('--concurrency', type=int, default=200, help='Clients with a request in flight')
+        parser.add_argument('--threads', type=int, default=16, help='WSGI worker threads')
+    
+    def handle(self, *args, **options):
+        with throwaway_database():
+            generator = SyntheticDataGenerator(stdout=self.stdout)
+            generator.generate_departments(10)
+            generator.generate_doctors(50)
+            generator.generate_patients(options['patients'])
+            # Half in the past, half booked over the coming months
+            generator.generate_appointments(options['patients'], days_back=60)
+            endpoints = self.endpoints(generator)
+            
+            wsgi, asgi = get_wsgi_application(), get_asgi_application()
+            # Failed requests are counted below, not logged one traceback each
+            logging.getLogger('django.request').setLevel(logging.CRITICAL)
+            self.stdout.write(
+                f"\n{options['requests']} requests per run, {options['concurrency']} concurrent clients, "
+                f"{options['threads']} WSGI threads"
+            )
+            self.stdout.write(f"{'endpoint':<26}{'server':<8}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+            for name, make_request in endpoints.items():
+                for server, run in [('wsgi', self.run_wsgi), ('asgi', self.run_asgi)]:
+                    app = wsgi if server == 'wsgi' else asgi
+                    # Warm up: URL resolver, autocomplete index, connections
+                    run(app, make_request, 50, 10, options['threads'])
+                    elapsed, timings, errors = run(
+                        app, make_request, options['requests'], options['concurrency'], options['threads']
+                    )
+                    stats = summarize(timings)
+                    self.stdout.write(
+                        f"{name:<26}{server:<8}{len(timings) / elapsed:>10.0f}"
+                        f"{stats['p50_ms']:>10.2f}{stats['p99_ms']:>10.2f}{errors:>8}"
+                    )
+    
+    def endpoints(self, generator):
+        """{name: function returning (method, path, query, body)} with random arguments"""
+        rng = random.Random(0)
+        today = timezone.localdate().isoformat()
+        appointment_ids = list(Appointment.objects.values_list('id', flat=True)[:1000])
+        search = reverse('hospital:api_patient_search')
+        availability = reverse('hospital:api_doctor_availability')
+        return {
+            'api_patient_search': lambda: ('GET', search, urlencode({'q': rng.choice(SEARCH_PREFIXES)}), b''),
+            'api_doctor_availability': lambda: (
+                'GET', availability, urlencode({'doctor_id': rng.choice(generator.doctor_ids), 'date': today}), b''
+            ),
+            'update_status': lambda: (
+                'POST',
+                reverse('hospital:appointment_update_status', args=[rng.choice(appointment_ids)]),
+                '',
+                urlencode({'status': rng.choice(['scheduled', 'completed'])}).encode(),
+            ),
+        }
+    
+    # WSGI: a fixed pool of threads, each request holds one until it is done
+    
+    def run_wsgi(self, app, make_request, total, concurrency, threads):
+        """Closed loop: ``concurrency`` clients, each sending its next request
+        when the previous one is answered; latency includes the wait for a thread"""
+        timings = []
+        errors = 0
+        lock = threading.Lock()
+        done = threading.Semaphore(0)
+        remaining = [total]
+        
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            def submit():
+                with lock:
+                    if remaining[0] == 0:
+                        return False
+                    remaining[0] -= 1
+                started = time.perf_counter()
+                pool.submit(call_wsgi, app, *make_request()).add_done_callback(
+                    lambda future: finished(future, started)
+                )
+                return True
+            
+            def finished(future, started):
+                nonlocal errors
+                latency = (time.perf_counter() - started) * 1000
+                failed = future.exception() is not None or future.result()[0] >= 400
+                with lock:
+                    timings.append(latency)
+                    errors += failed
+                done.release()
+                submit()
+            
+            started = time.perf_counter()
+            for _ in range(min(concurrency, total)):
+                submit()
+            for _ in range(total):
+                done.acquire()
+            elapsed = time.perf_counter() - started
+        return elapsed, timings, errors
+    
+    # ASGI: one event loop; the async views hold no thread while they wait
+    
+    def run_asgi(self, app, make_request, total, concurrency, threads):
+        async def run():
+            timings = []
+            errors = 0
+            remaining = total
+            
+            async def client():
+                nonlocal errors, remaining
+                while remaining > 0:
+                    remaining -= 1
+                    started = time.perf_counter()
+                    try:
+                        failed = (await call_asgi(app, *make_request()))[0] >= 400
+                    except Exception:
+                        failed = True
+                    timings.append((time.perf_counter() - started) * 1000)
+                    errors += failed
+            
+            started = time.perf_counter()
+            await asyncio.gather(*[client() for _ in range(min(concurrency, total))])
+            return time.perf_counter() - started, timings, errors
+        
+        return asyncio.run(run())
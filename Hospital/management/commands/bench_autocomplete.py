@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from Hospital.autocomplete import PatientAutocompleteIndex
+from Hospital.benchmarking import summarize, throwaway_database, time_calls
+from Hospital.search import top_patient_ids
+from Hospital.synthetic import SyntheticDataGenerator
+
+QUERIES = ['s', 'jo', 'smi', 'priya sh', 'thapa', 'zz']
+
+
+class Command(BaseCommand):
+    help = 'Compare the in-memory autocomplete index with the FTS5 lookup on a throwaway database'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--patients', type=int, default=100_000)
+        parser.add_argument('--repeat', type=int, default=200)
+    
+    def handle(self, *args, **options):
+        with throwaway_database():
+            generator = SyntheticDataGenerator(stdout=self.stdout)
+            generator.generate_patients(options['patients'])
+            
+            index = PatientAutocompleteIndex()
+            started = time.perf_counter()
+            index.load()
+            stats = index.stats()
+            self.stdout.write(
+                f"Loaded {stats['patients']} patients, {stats['tokens']} tokens in "
+                f'{time.perf_counter() - started:.2f}s; '
+                f"{stats['bytes_per_100k_patients'] / 1024 / 1024:.1f} MiB per 100k patients"
+            )
+            
+            self.stdout.write(f"{'query':<12}{'memory p50':>14}{'memory p99':>14}{'fts p50':>14}")
+            for query in QUERIES:
+                memory = summarize([ms * 1000 for ms in time_calls(lambda: index.search(query), options['repeat'])])
+                fts = summarize([ms * 1000 for ms in time_calls(lambda: top_patient_ids(query), options['repeat'])])
+                self.stdout.write(
+                    f"{query:<12}{memory['p50_ms']:>12.1f}us{memory['p99_ms']:>12.1f}us{fts['p50_ms']:>12.1f}us"
+                )
@@ -0,0 +1,141 @@
+import statistics
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Q, Sum
+from django.utils import timezone
+
+from Hospital.benchmarking import throwaway_database, time_calls
+from Hospital.models import Patient, Appointment, Bill, Room, RoomOccupancy, MedicalRecord
+from Hospital.occupancy import bed_board, occupancy_at, utilization
+from Hospital.synthetic import SyntheticDataGenerator
+
+INDEXED_MODELS = [Patient, Appointment, Bill, MedicalRecord, Room, RoomOccupancy]
+
+
+class Command(BaseCommand):
+    help = 'Seed a throwaway database and compare query plans and latency of the hot filters with and without Meta.indexes'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000, help='Approximate number of rows to seed')
+        parser.add_argument('--repeat', type=int, default=20, help='Timed runs per query')
+        parser.add_argument('--batch-size', type=int, default=5000)
+    
+    def handle(self, *args, **options):
+        with throwaway_database():
+            self.seed(options['rows'], options['batch_size'])
+            queries = self.hot_queries()
+            self.drop_indexes()
+            before = self.measure(queries, options['repeat'], 'without indexes')
+            self.create_indexes()
+            after = self.measure(queries, options['repeat'], 'with indexes')
+        
+        self.stdout.write('\nSummary (median ms)')
+        self.stdout.write(f"{'query':<40}{'before':>10}{'after':>10}{'speedup':>10}")
+        for label in before:
+            speedup = before[label] / after[label] if after[label] else float('inf')
+            self.stdout.write(f'{label:<40}{before[label]:>10.3f}{after[label]:>10.3f}{speedup:>9.1f}x')
+    
+    def seed(self, rows, batch_size):
+        self.stdout.write(f'Seeding ~{rows} rows...')
+        generator = SyntheticDataGenerator(batch_size=batch_size, stdout=self.stdout)
+        # Roughly the proportions of a real hospital database
+        generator.generate(
+            departments=15,
+            doctors=max(10, rows // 1000),
+            patients=rows // 4,
+            appointments=rows // 2,
+            bills=rows // 10,
+            medical_records=rows // 20,
+            rooms=max(20, rows // 500),
+            room_stays=rows // 10,
+        )
+        self.generator = generator
+    
+    def hot_queries(self):
+        """The filters the views and admin run on every request"""
+        today = timezone.now().date()
+        doctor_id = self.generator.doctor_ids[len(self.generator.doctor_ids) // 2]
+        patient_id = self.generator.patient_ids[len(self.generator.patient_ids) // 2]
+        day = Appointment.objects.filter(doctor_id=doctor_id).values_list('appointment_date', flat=True)[0]
+        year_ago = timezone.now() - timedelta(days=365)
+        return {
+            'appointment_list (doctor, date, status)': lambda: list(
+                Appointment.objects.filter(doctor_id=doctor_id, appointment_date=day, status='completed')[:20]),
+            'api_doctor_availability': lambda: list(
+                Appointment.objects.filter(doctor_id=doctor_id, appointment_date=today, status='scheduled')
+                .values_list('appointment_time', flat=True)),
+            'dashboard today_appointments': lambda: Appointment.objects.filter(
+                appointment_date=today, status='scheduled').count(),
+            'dashboard todays_appointments list': lambda: list(
+                Appointment.objects.filter(appointment_date=today).order_by('appointment_time')[:10]),
+            'dashboard active_patients': lambda: Patient.objects.filter(status='active').count(),
+            'dashboard pending_bills': lambda: Bill.objects.filter(status__in=['unpaid', 'overdue']).count(),
+            'dashboard available_rooms': lambda: Room.objects.filter(status='available').count(),
+            'patient_list status filter': lambda: list(Patient.objects.filter(status='admitted')[:15]),
+            'Doctor.patient_count': lambda: Patient.objects.filter(
+                assigned_doctor_id=doctor_id, status='active').count(),
+            'OverdueBillFilter': lambda: list(
+                Bill.objects.filter(Q(status='overdue') | Q(due_date__lt=today, status='unpaid'))[:25]),
+            'generate_revenue_report (90 days)': lambda: Bill.objects.filter(
+                bill_date__range=[today - timedelta(days=90), today], status='paid'
+            ).aggregate(Sum('total_amount')),
+            'medical_record_list': lambda: list(MedicalRecord.objects.filter(patient_id=patient_id)[:10]),
+            'bed board': bed_board,
+            'occupancy a year ago': lambda: occupancy_at(year_ago).count(),
+            'utilization (week, a year ago)': lambda: utilization(year_ago, year_ago + timedelta(days=7)),
+        }
+    
+    def drop_indexes(self):
+        with connection.schema_editor() as editor:
+            for model in INDEXED_MODELS:
+                for index in model._meta.indexes:
+                    editor.remove_index(model, index)
+        self.analyze()
+    
+    def create_indexes(self):
+        with connection.schema_editor() as editor:
+            for model in INDEXED_MODELS:
+                for index in model._meta.indexes:
+                    editor.add_index(model, index)
+        self.analyze()
+    
+    def analyze(self):
+        if connection.vendor in ('sqlite', 'postgresql'):
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+    
+    def measure(self, queries, repeat, label):
+        self.stdout.write(self.style.MIGRATE_HEADING(f'\n=== {label} ==='))
+        results = {}
+        for name, run in queries.items():
+            with CapturedPlan() as plan:
+                run()
+            results[name] = statistics.median(time_calls(run, repeat))
+            self.stdout.write(f'{name}: {results[name]:.3f} ms')
+            for line in plan.lines:
+                self.stdout.write(f'    {line}')
+        return results
+
+
+class CapturedPlan:
+    """Run EXPLAIN for every SELECT executed inside the block"""
+    
+    def __enter__(self):
+        self.lines = []
+        self.wrapper = connection.execute_wrapper(self)
+        self.wrapper.__enter__()
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.wrapper.__exit__(*exc_info)
+    
+    def __call__(self, execute, sql, params, many, context):
+        if sql.lstrip().upper().startswith('SELECT'):
+            prefix = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+            with connection.cursor() as cursor:
+                cursor.execute(prefix + sql, params)
+                for row in cursor.fetchall():
+                    self.lines.append(str(row[-1]))
+        return execute(sql, params, many, context)
@@ -0,0 +1,57 @@
+import logging
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from Hospital.benchmarking import call_wsgi, summarize, throwaway_database, time_calls
+from Hospital.synthetic import SyntheticDataGenerator
+
+MIDDLEWARE = 'Hospital.metrics.MetricsMiddleware'
+
+
+class Command(BaseCommand):
+    help = 'Compare request latency with and without MetricsMiddleware on a throwaway database'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--patients', type=int, default=5000)
+        parser.add_argument('--repeat', type=int, default=500, help='Requests per route and handler')
+    
+    def handle(self, *args, **options):
+        with throwaway_database():
+            generator = SyntheticDataGenerator(stdout=self.stdout)
+            generator.generate_departments(10)
+            generator.generate_doctors(50)
+            generator.generate_patients(options['patients'])
+            generator.generate_appointments(options['patients'], days_back=60)
+            generator.generate_rooms(100)
+            
+            with override_settings(MIDDLEWARE=[name for name in settings.MIDDLEWARE if name != MIDDLEWARE]):
+                without = WSGIHandler()
+            with_metrics = WSGIHandler()
+            
+            routes = {
+                'api_bed_board': ('GET', reverse('hospital:api_bed_board'), ''),
+                'api_patient_search': ('GET', reverse('hospital:api_patient_search'), 'q=jo'),
+                'patient_list': ('GET', reverse('hospital:patient_list'), ''),
+                'not_found': ('GET', '/no-such-page/', ''),
+            }
+            logging.getLogger('django.request').setLevel(logging.CRITICAL)
+            repeat = options['repeat']
+            self.stdout.write(f'\n{repeat} sequential requests per route and handler')
+            self.stdout.write(f"{'route':<22}{'without p50':>14}{'with p50':>12}{'overhead':>12}")
+            for name, request in routes.items():
+                # Warm up both, then alternate halves so drift hits both alike
+                for app in (without, with_metrics):
+                    time_calls(lambda: call_wsgi(app, *request), 20)
+                timings = {without: [], with_metrics: []}
+                for _ in range(2):
+                    for app in (without, with_metrics):
+                        timings[app] += time_calls(lambda: call_wsgi(app, *request), repeat // 2)
+                before = summarize(timings[without])['p50_ms']
+                after = summarize(timings[with_metrics])['p50_ms']
+                self.stdout.write(
+                    f"{name:<22}{before:>12.3f}ms{after:>10.3f}ms{(after - before) * 1000:>10.1f}us"
+                )
@@ -0,0 +1,117 @@
+import logging
+from copy import deepcopy
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from django.urls import resolve, reverse
+
+from Hospital.benchmarking import call_wsgi, summarize, throwaway_database, time_calls
+from Hospital.caching import bump_version, get_stats
+from Hospital.models import Department, Doctor, Room
+from Hospital.synthetic import SyntheticDataGenerator
+
+# Stand-ins for the page templates, which are not part of this tree: each
+# shows every row and relation the view puts in its context
+STAND_IN_TEMPLATES = {
+    'hospital/doctor_list.html': (
+        '{% for doctor in doctors %}<tr><td>{{ doctor.name }}</td><td>{{ doctor.get_specialty_display }}</td>'
+        '<td>{{ doctor.patient_count }}</td></tr>{% endfor %}'
+        '{% for specialty in specialties %}<option>{{ specialty }}</option>{% endfor %}'
+    ),
+    'hospital/doctor_detail.html': (
+        '<h1>{{ doctor.name }}</h1><p>{{ doctor.email }} {{ patient_count }} patients</p>'
+        '{% for appointment in recent_appointments %}<tr><td>{{ appointment.patient.name }}</td>'
+        '<td>{{ appointment.appointment_date }} {{ appointment.appointment_time }}</td>'
+        '<td>{{ appointment.get_status_display }}</td></tr>{% endfor %}'
+    ),
+    'hospital/department_list.html': (
+        '{% for department in departments %}<tr><td>{{ department.name }}</td>'
+        '<td>{{ department.head_doctor.name|default:"-" }}</td></tr>{% endfor %}'
+    ),
+    'hospital/department_detail.html': (
+        '<h1>{{ department.name }}</h1><p>{{ department.head_doctor.name }}</p>'
+        '{% for room in rooms %}<tr><td>{{ room.room_number }}</td><td>{{ room.get_status_display }}</td>'
+        '<td>{{ room.current_patient.name|default:"-" }}</td></tr>{% endfor %}'
+    ),
+    'hospital/room_detail.html': (
+        '<h1>{{ room.room_number }} {{ room.department.name }}</h1>'
+        '{% for stay in current_stays %}<tr><td>{{ stay.bed }}</td><td>{{ stay.patient.name }}</td></tr>{% endfor %}'
+        '{% for stay in recent_stays %}<tr><td>{{ stay.patient.name }}</td><td>{{ stay.start }} {{ stay.end }}</td>'
+        '</tr>{% endfor %}'
+    ),
+}
+
+
+def stand_in_templates():
+    templates = deepcopy(settings.TEMPLATES)
+    templates[0]['APP_DIRS'] = False
+    templates[0]['OPTIONS']['loaders'] = [('django.template.loaders.locmem.Loader', STAND_IN_TEMPLATES)]
+    return templates
+
+
+class Command(BaseCommand):
+    help = (
+        'Time the cached doctor, department and room pages against rendering them '
+        'from the database, on a throwaway database'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--patients', type=int, default=20000)
+        parser.add_argument('--repeat', type=int, default=200, help='Requests per page and mode')
+    
+    def handle(self, *args, **options):
+        with throwaway_database():
+            generator = SyntheticDataGenerator(stdout=self.stdout)
+            generator.generate_departments(15)
+            generator.generate_doctors(100)
+            generator.generate_patients(options['patients'])
+            generator.generate_appointments(options['patients'] * 5, days_back=365)
+            generator.generate_rooms(300)
+            generator.generate_room_stays(options['patients'] // 2)
+            
+            logging.getLogger('django.request').setLevel(logging.CRITICAL)
+            with override_settings(DEBUG=False, ALLOWED_HOSTS=['localhost'], TEMPLATES=stand_in_templates()):
+                self.run(WSGIHandler(), options['repeat'])
+    
+    def run(self, app, repeat):
+        doctor = Doctor.objects.order_by('pk').values_list('pk', flat=True)[50]
+        department = Department.objects.order_by('pk').values_list('pk', flat=True).first()
+        room = Room.objects.order_by('pk').values_list('pk', flat=True)[150]
+        pages = [
+            ('doctor_list', reverse('hospital:doctor_list'), ''),
+            ('doctor_list', reverse('hospital:doctor_list'), 'specialty=cardiology&page=2'),
+            ('doctor_detail', reverse('hospital:doctor_detail', args=[doctor]), ''),
+            ('department_list', reverse('hospital:department_list'), ''),
+            ('department_detail', reverse('hospital:department_detail', args=[department]), ''),
+            ('room_detail', reverse('hospital:room_detail', args=[room]), ''),
+        ]
+        self.stdout.write(f'\n{repeat} requests per page: rendered (every dependency bumped first) and cached')
+        self.stdout.write(f"{'page':<40}{'rendered p50':>14}{'cached p50':>12}{'saved':>10}{'speedup':>9}")
+        for name, path, query in pages:
+            match = resolve(path)
+            dependencies = match.func.page_dependencies(**match.kwargs)
+            
+            def rendered():
+                bump_version(*dependencies)
+                call_wsgi(app, 'GET', path, query)
+            
+            def cached():
+                call_wsgi(app, 'GET', path, query)
+            
+            status, _ = call_wsgi(app, 'GET', path, query)
+            misses = summarize(time_calls(rendered, repeat))['p50_ms']
+            hits = summarize(time_calls(cached, repeat))['p50_ms']
+            label = f'{name}?{query}' if query else name
+            self.stdout.write(
+                f'{label:<40}{misses:>12.3f}ms{hits:>10.3f}ms{misses - hits:>8.3f}ms{misses / hits:>8.1f}x'
+                + ('' if status == 200 else f'  (status {status})')
+            )
+        
+        self.stdout.write(f"\n{'cache':<24}{'hits':>8}{'misses':>8}{'avg rebuild':>14}")
+        for name in ['doctor_list', 'doctor_detail', 'department_list', 'department_detail', 'room_detail']:
+            stats = get_stats(f'page:{name}').as_dict()
+            self.stdout.write(
+                f"{'page:' + name:<24}{stats['hits']:>8}{stats['misses']:>8}{stats['avg_rebuild_ms'] or 0:>12.3f}ms"
+            )
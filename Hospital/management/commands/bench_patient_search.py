@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from Hospital.benchmarking import summarize, throwaway_database, time_calls
+from Hospital.models import Patient
+from Hospital.search import search_patients, top_patient_ids
+from Hospital.synthetic import SyntheticDataGenerator
+
+QUERIES = ['smith', 'j', 'jo', 'priya sharma', 'hypert', '+1555', 'asthma thapa']
+
+
+class Command(BaseCommand):
+    help = 'Compare icontains scans with the FTS5 patient index on a throwaway database'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--patients', type=int, default=1_000_000)
+        parser.add_argument('--repeat', type=int, default=20)
+    
+    def handle(self, *args, **options):
+        with throwaway_database():
+            generator = SyntheticDataGenerator(stdout=self.stdout)
+            generator.generate_doctors(50)
+            generator.generate_patients(options['patients'])
+            
+            self.stdout.write(f"{'query':<16}{'icontains page':>16}{'fts page p50':>16}{'fts top10 p50':>16}")
+            for query in QUERIES:
+                scanned = Patient.objects.filter(
+                    Q(name__icontains=query) | Q(phone__icontains=query) | Q(diagnosis__icontains=query)
+                )
+                matched = search_patients(query)
+                # What patient_list's Paginator runs: a COUNT and the first page
+                scan = time_calls(lambda: (scanned.count(), list(scanned[:15])), options['repeat'])
+                ranked = time_calls(lambda: (matched.count(), list(matched[:15])), options['repeat'])
+                top = time_calls(lambda: top_patient_ids(query, limit=10), options['repeat'])
+                self.stdout.write(
+                    f"{query:<16}{summarize(scan)['p50_ms']:>14.2f}ms"
+                    f"{summarize(ranked)['p50_ms']:>14.2f}ms{summarize(top)['p50_ms']:>14.2f}ms"
+                )
@@ -0,0 +1,169 @@
+import random
+import threading
+import time
+from contextlib import contextmanager
+from datetime import time as clock, timedelta
+
+from django.conf import settings
+from django.core.signals import request_finished, request_started
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, OperationalError, connections
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from Hospital.availability import doctor_availability
+from Hospital.benchmarking import summarize, throwaway_database
+from Hospital.billing import create_bill
+from Hospital.models import Appointment, BillItem, Patient
+from Hospital.occupancy import bed_board
+from Hospital.search import top_patient_ids
+from Hospital.sqlite_profile import set_journal_mode
+from Hospital.synthetic import SyntheticDataGenerator
+
+# (name, journal_mode, SQLITE_PRAGMAS, CONN_MAX_AGE, transaction_mode)
+PROFILES = [
+    ('sqlite defaults', 'delete', {'synchronous': 'full'}, 0, None),
+    ('tuned', 'wal', settings.SQLITE_PRAGMAS, 600, None),
+    ('tuned, immediate', 'wal', settings.SQLITE_PRAGMAS, 600, 'IMMEDIATE'),
+]
+SEARCH_PREFIXES = ['jo', 'mar', 'smi', 'pri', 'sha', 'da', 'wil', 'tha', 'aa', 'kar']
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare read and write throughput of concurrent requests under SQLite\'s '
+        'defaults and under the SQLITE_PRAGMAS / CONN_MAX_AGE / IMMEDIATE profile'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--patients', type=int, default=20000)
+        parser.add_argument('--readers', type=int, default=8, help='Threads sending read requests')
+        parser.add_argument('--writers', type=int, default=4, help='Threads creating bills and appointments')
+        parser.add_argument('--seconds', type=float, default=5.0, help='Duration of each run')
+    
+    def handle(self, *args, **options):
+        with throwaway_database():
+            generator = SyntheticDataGenerator(stdout=self.stdout)
+            generator.generate_departments(10)
+            generator.generate_doctors(50)
+            generator.generate_patients(options['patients'])
+            generator.generate_appointments(options['patients'], days_back=30)
+            generator.generate_rooms(200)
+            generator.generate_room_stays(5000)
+            self.generator = generator
+            
+            self.stdout.write(
+                f"\n{options['readers']} readers and {options['writers']} writers, {options['seconds']:.0f}s per run"
+            )
+            self.stdout.write(
+                f"{'profile':<20}{'reads/s':>9}{'writes/s':>10}{'read p99':>10}{'write p99':>11}{'locked':>8}"
+            )
+            for name, journal_mode, pragmas, max_age, transaction_mode in PROFILES:
+                with self.profile(journal_mode, pragmas, max_age, transaction_mode):
+                    reads, writes, locked, elapsed = self.run(options)
+                read_stats, write_stats = summarize(reads), summarize(writes)
+                self.stdout.write(
+                    f"{name:<20}{len(reads) / elapsed:>9.0f}{len(writes) / elapsed:>10.0f}"
+                    f"{read_stats['p99_ms'] or 0:>8.1f}ms{write_stats['p99_ms'] or 0:>9.1f}ms{locked:>8}"
+                )
+    
+    @contextmanager
+    def profile(self, journal_mode, pragmas, max_age, transaction_mode):
+        """Switch the file to ``journal_mode``; new connections get the other
+        settings"""
+        database = connections.settings[DEFAULT_DB_ALIAS]
+        saved = database['CONN_MAX_AGE'], database['OPTIONS'].get('transaction_mode')
+        database['CONN_MAX_AGE'] = max_age
+        database['OPTIONS']['transaction_mode'] = transaction_mode
+        connections.close_all()
+        set_journal_mode(connections[DEFAULT_DB_ALIAS], journal_mode)
+        connections.close_all()
+        try:
+            with override_settings(SQLITE_PRAGMAS=pragmas, DEBUG=False):
+                yield
+        finally:
+            database['CONN_MAX_AGE'], database['OPTIONS']['transaction_mode'] = saved
+            connections.close_all()
+    
+    def run(self, options):
+        deadline = time.perf_counter() + options['seconds']
+        reads, writes = [], []
+        locked = [0]
+        lock = threading.Lock()
+        
+        def worker(seed, operations, timings):
+            rng = random.Random(seed)
+            try:
+                while time.perf_counter() < deadline:
+                    operation = rng.choice(operations)
+                    started = time.perf_counter()
+                    # As a request would: connections are closed or kept per CONN_MAX_AGE
+                    request_started.send(sender=self.__class__)
+                    try:
+                        operation(rng)
+                    except OperationalError as e:
+                        if 'locked' not in str(e):
+                            raise
+                        with lock:
+                            locked[0] += 1
+                        continue
+                    finally:
+                        request_finished.send(sender=self.__class__)
+                    with lock:
+                        timings.append((time.perf_counter() - started) * 1000)
+            finally:
+                connections.close_all()
+        
+        threads = [
+            threading.Thread(target=worker, args=(index, [self.bed_board, self.availability, self.search], reads))
+            for index in range(options['readers'])
+        ] + [
+            threading.Thread(target=worker, args=(1000 + index, [self.create_bill, self.create_appointment], writes))
+            for index in range(options['writers'])
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return reads, writes, locked[0], time.perf_counter() - started
+    
+    # Reads
+    
+    def bed_board(self, rng):
+        bed_board()
+    
+    def availability(self, rng):
+        today = timezone.localdate()
+        doctor_availability([rng.choice(self.generator.doctor_ids)], today, today + timedelta(days=6))
+    
+    def search(self, rng):
+        ids = top_patient_ids(rng.choice(SEARCH_PREFIXES))
+        list(Patient.objects.filter(id__in=ids).values('id', 'name', 'phone', 'age'))
+    
+    # Writes: the work of bill_create and appointment_create
+    
+    def create_bill(self, rng):
+        item_types = [choice[0] for choice in BillItem.ITEM_TYPE_CHOICES]
+        create_bill({
+            'patient': rng.choice(self.generator.patient_ids),
+            'due_date': timezone.localdate() + timedelta(days=30),
+            'items': [
+                {'type': rng.choice(item_types), 'description': 'Charge', 'quantity': rng.randint(1, 3),
+                 'unit_price': f'{rng.randint(10, 500)}.00'}
+                for _ in range(rng.randint(1, 4))
+            ],
+        })
+    
+    def create_appointment(self, rng):
+        try:
+            Appointment.objects.create(
+                patient_id=rng.choice(self.generator.patient_ids),
+                doctor_id=rng.choice(self.generator.doctor_ids),
+                appointment_date=timezone.localdate() + timedelta(days=rng.randint(60, 3650)),
+                appointment_time=clock(rng.randint(9, 16), rng.choice([0, 30])),
+                reason='Checkup',
+            )
+        except IntegrityError:
+            # The slot was taken; the view reports that to the user
+            pass
@@ -0,0 +1,240 @@
+import json
+import logging
+import subprocess
+import time
+from contextlib import ExitStack
+from datetime import timedelta
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core import signals
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connections, transaction
+from django.db.models import Max, Min
+from django.urls import URLPattern, reverse
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from Hospital import urls as hospital_urls
+from Hospital.benchmarking import call_wsgi, percentile, summarize, throwaway_database
+from Hospital.models import Appointment, Bill, BillItem, Department, Doctor, MedicalRecord, Patient, Report, Room
+from Hospital.synthetic import FULL_VOLUMES, GENERATED_MODELS, SyntheticDataGenerator
+
+# The model whose id fills each URL argument
+ID_MODELS = {
+    'doctor_id': Doctor,
+    'patient_id': Patient,
+    'appointment_id': Appointment,
+    'bill_id': Bill,
+    'room_id': Room,
+    'department_id': Department,
+    'record_id': MedicalRecord,
+    'report_id': Report,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Request every route in Hospital/urls.py and write p50/p95/p99 latency and '
+        'queries per request to a JSON file; writes are rolled back'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=30, help='Timed requests per route')
+        parser.add_argument('--warmup', type=int, default=3, help='Untimed requests per route first')
+        parser.add_argument('--output', default='bench_urls.json')
+        parser.add_argument('--compare', metavar='JSON', help='An earlier output to compare against')
+        parser.add_argument(
+            '--threshold', type=float, default=1.25,
+            help='p95 ratio over the earlier run that counts as a regression',
+        )
+        parser.add_argument('--fail-on-regression', action='store_true')
+        parser.add_argument(
+            '--throwaway-scale', type=float,
+            help='Seed a throwaway database at this fraction of seed_synthetic\'s volumes '
+                 'instead of using the configured one',
+        )
+        parser.add_argument('--route', action='append', help='Only these URL names (repeatable)')
+    
+    def handle(self, *args, **options):
+        # Failed requests are reported by status, not logged one traceback each
+        logging.getLogger('django.request').setLevel(logging.CRITICAL)
+        if options['throwaway_scale']:
+            with throwaway_database():
+                SyntheticDataGenerator(stdout=self.stdout).generate(
+                    **{
+                        name: max(1, round(count * options['throwaway_scale']))
+                        for name, count in FULL_VOLUMES.items()
+                    },
+                    appointment_days_back=None,
+                )
+                results = self.run(options)
+        else:
+            if not Patient.objects.exists():
+                raise CommandError('The database has no patients; run seed_synthetic first')
+            results = self.run(options)
+        
+        with open(options['output'], 'w') as output:
+            json.dump(results, output, indent=2)
+        self.stdout.write(f"Wrote {options['output']}")
+        if options['compare']:
+            with open(options['compare']) as earlier:
+                regressions = self.compare(json.load(earlier), results, options['threshold'])
+            if regressions and options['fail_on_regression']:
+                raise CommandError(f'{regressions} routes regressed')
+    
+    def run(self, options):
+        # As deployed: no debug query log, no debug error pages
+        with override_settings(DEBUG=False, ALLOWED_HOSTS=['localhost']):
+            return self.run_routes(WSGIHandler(), options)
+    
+    def run_routes(self, app, options):
+        results = {
+            'created': timezone.now().isoformat(),
+            'commit': git_commit(),
+            'database': connections['default'].vendor,
+            'rows': {model._meta.label: model.objects.count() for model in GENERATED_MODELS},
+            'repeat': options['repeat'],
+            'routes': {},
+        }
+        self.stdout.write(f"{'route':<30}{'status':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>9}")
+        for name, (method, path, query, body) in self.route_requests().items():
+            if options['route'] and name not in options['route']:
+                continue
+            for _ in range(options['warmup']):
+                self.call(app, method, path, query, body)
+            timings, queries, statuses = [], [], set()
+            for _ in range(options['repeat']):
+                status, milliseconds, count = self.call(app, method, path, query, body)
+                timings.append(milliseconds)
+                queries.append(count)
+                statuses.add(status)
+            stats = summarize(timings)
+            status = max(statuses)
+            results['routes'][name] = {
+                'method': method, 'path': path, 'query': query, 'status': status, **stats,
+                'queries': percentile(queries, 0.5), 'queries_max': max(queries),
+            }
+            self.stdout.write(
+                f"{name:<30}{status:>7}{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}"
+                f"{stats['p99_ms']:>10.2f}{percentile(queries, 0.5):>9}"
+            )
+        return results
+    
+    def call(self, app, method, path, query, body):
+        """(status, milliseconds, queries) of one request"""
+        executed = []
+        
+        def count(execute, sql, params, many, context):
+            executed.append(sql)
+            return execute(sql, params, many, context)
+        
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(count))
+            if method != 'GET':
+                # Every run starts from the same data. As in the test client,
+                # the connection must outlive the request for the rollback.
+                signals.request_started.disconnect(close_old_connections)
+                signals.request_finished.disconnect(close_old_connections)
+                stack.callback(signals.request_finished.connect, close_old_connections)
+                stack.callback(signals.request_started.connect, close_old_connections)
+                stack.enter_context(transaction.atomic())
+            started = time.perf_counter()
+            status, _ = call_wsgi(app, method, path, query, body)
+            elapsed = (time.perf_counter() - started) * 1000
+            if method != 'GET':
+                transaction.set_rollback(True)
+        return status, elapsed, len(executed)
+    
+    def route_requests(self):
+        """{url name: (method, path, query, body)} for every route, with ids
+        of typical rows and realistic parameters"""
+        today = timezone.localdate()
+        ids = {argument: middle_id(model) for argument, model in ID_MODELS.items()}
+        item_types = [choice[0] for choice in BillItem.ITEM_TYPE_CHOICES]
+        bill = {
+            'patient': ids['patient_id'],
+            'due_date': (today + timedelta(days=30)).isoformat(),
+            'items': [
+                {'type': item_types[0], 'description': 'Consultation', 'quantity': 1, 'unit_price': '50.00'},
+                {'type': item_types[-1], 'description': 'Medication', 'quantity': 3, 'unit_price': '12.50'},
+            ],
+        }
+        special = {
+            'appointment_update_status': ('POST', '', urlencode({'status': 'completed'}).encode()),
+            'api_appointment_series': ('POST', '', json.dumps({
+                'patient': ids['patient_id'], 'doctor': ids['doctor_id'], 'start_date': today.isoformat(),
+                'time': '10:00', 'occurrences': 12, 'frequency': 'weekly', 'reason': 'Physiotherapy',
+            }).encode()),
+            'api_bill_bulk_create': ('POST', '', json.dumps({'bills': [bill] * 10}).encode()),
+            'generate_revenue_report': ('POST', '', urlencode({
+                'start_date': (today - timedelta(days=30)).isoformat(), 'end_date': today.isoformat(),
+            }).encode()),
+            'api_patient_search': ('GET', urlencode({'q': 'jo'}), b''),
+            'api_doctor_availability': ('GET', urlencode({'doctor_id': ids['doctor_id'], 'date': today}), b''),
+            'api_room_occupancy': ('GET', urlencode({'date': today - timedelta(days=7)}), b''),
+        }
+        requests = {}
+        for pattern in hospital_urls.urlpatterns:
+            if not isinstance(pattern, URLPattern):
+                continue
+            arguments = list(pattern.pattern.converters)
+            missing = [argument for argument in arguments if argument not in ids]
+            if missing:
+                raise CommandError(f'No id for {missing} of route {pattern.name}: add the argument to ID_MODELS')
+            empty = [argument for argument in arguments if ids[argument] is None]
+            if empty:
+                # Still timed, as the 404 it answers
+                self.stdout.write(f'{pattern.name}: no rows for {empty}; requested with id 0')
+            path = reverse(
+                f'hospital:{pattern.name}', kwargs={argument: ids[argument] or 0 for argument in arguments}
+            )
+            method, query, body = special.get(pattern.name, ('GET', '', b''))
+            requests[pattern.name] = (method, path, query, body)
+        return requests
+    
+    def compare(self, earlier, current, threshold):
+        """Print each route against an earlier run; returns the number of regressions"""
+        self.stdout.write(
+            f"\nAgainst {earlier.get('commit') or 'the earlier run'} ({earlier.get('created')})\n"
+            f"{'route':<30}{'p50 ms':>18}{'p95 ms':>18}{'queries':>12}"
+        )
+        regressions = 0
+        for name, now in current['routes'].items():
+            before = earlier['routes'].get(name)
+            if before is None:
+                self.stdout.write(f'{name:<30}{"new route":>18}')
+                continue
+            regressed = (
+                now['p95_ms'] > before['p95_ms'] * threshold
+                or now['queries'] > before['queries']
+                or now['status'] != before['status']
+            )
+            regressions += regressed
+            self.stdout.write(
+                f"{name:<30}{before['p50_ms']:>8.2f} -> {now['p50_ms']:<6.2f}{before['p95_ms']:>8.2f} -> "
+                f"{now['p95_ms']:<6.2f}{before['queries']:>5} -> {now['queries']:<4}"
+                + ('  REGRESSION' if regressed else '')
+            )
+        return regressions
+
+
+def middle_id(model):
+    """Id of a row from the middle of the table; None when it is empty"""
+    bounds = model.objects.aggregate(low=Min('pk'), high=Max('pk'))
+    if bounds['low'] is None:
+        return None
+    middle = (bounds['low'] + bounds['high']) // 2
+    return model.objects.filter(pk__gte=middle).order_by('pk').values_list('pk', flat=True).first()
+
+
+def git_commit():
+    try:
+        result = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True, text=True,
+        )
+    except OSError:
+        return None
+    return result.stdout.strip() or None
@@ -0,0 +1,50 @@
+from django.apps import apps
+from django.core.exceptions import FieldError, ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from Hospital.exports import DEFAULT_CHUNK_SIZE, csv_rows
+
+
+class Command(BaseCommand):
+    help = 'Stream a whole table (optionally filtered) to CSV in constant memory'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('model', help='Model name, e.g. Appointment or Hospital.Appointment')
+        parser.add_argument('--output', '-o', help='File to write; standard output by default')
+        parser.add_argument(
+            '--filter', action='append', default=[], metavar='LOOKUP=VALUE',
+            help='Queryset filter, e.g. --filter appointment_date__year=2025; may be repeated',
+        )
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+    
+    def handle(self, *args, **options):
+        label = options['model']
+        try:
+            model = apps.get_model(label if '.' in label else f'Hospital.{label}')
+        except (LookupError, ValueError) as e:
+            raise CommandError(str(e))
+        
+        filters = {}
+        for condition in options['filter']:
+            lookup, separator, value = condition.partition('=')
+            if not separator:
+                raise CommandError(f'--filter expects LOOKUP=VALUE, got {condition!r}')
+            filters[lookup] = value
+        try:
+            # Primary key order walks the table instead of sorting it
+            queryset = model._default_manager.using(options['database']).filter(**filters).order_by('pk')
+        except (FieldError, ValidationError, ValueError) as e:
+            raise CommandError(f'Invalid --filter: {e}')
+        
+        if not options['output']:
+            for line in csv_rows(queryset, options['chunk_size']):
+                self.stdout.write(line, ending='')
+            return
+        rows = 0
+        with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+            for line in csv_rows(queryset, options['chunk_size']):
+                output.write(line)
+                rows += 1
+        self.stderr.write(f"Wrote {rows - 1} {model._meta.verbose_name_plural} to {options['output']}")
@@ -0,0 +1,31 @@
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+
+from Hospital.reports import DEFAULT_CHUNK_SIZE, REPORT_TYPES, generate_report
+
+
+def previous_month(today):
+    end = today.replace(day=1) - timedelta(days=1)
+    return end.replace(day=1), end
+
+
+class Command(BaseCommand):
+    help = 'Generate doctor performance, department, patient summary and monthly reports for a period'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=date.fromisoformat, help='First day (default: start of last month)')
+        parser.add_argument('--end', type=date.fromisoformat, help='Last day (default: end of last month)')
+        parser.add_argument('--type', action='append', choices=REPORT_TYPES, dest='types', help='May be repeated; default all')
+        parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='Doctors or departments per task')
+    
+    def handle(self, *args, **options):
+        start, end = previous_month(date.today())
+        start = options['start'] or start
+        end = options['end'] or end
+        for kind in options['types'] or REPORT_TYPES:
+            started = time.perf_counter()
+            report = generate_report(kind, start, end, options['workers'], options['chunk_size'])
+            self.stdout.write(f'{report.title}: {report.summary} ({time.perf_counter() - started:.2f}s)')
@@ -0,0 +1,86 @@
+import csv
+import json
+import os
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from Hospital.imports import (
+    COLUMNS, DEFAULT_CHUNK_SIZE, cleaned_chunks, detect_format, doctor_map, insert_patients, read_rows,
+)
+
+PROGRESS_EVERY = 100_000
+
+
+class Command(BaseCommand):
+    help = (
+        'Import patients from a CSV or NDJSON file, validated in worker processes and '
+        'inserted in bulk; rows that fail validation are written to a rejects report'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('path', help=f"File to import, or - for standard input. Columns: {', '.join(COLUMNS)}")
+        parser.add_argument('--format', choices=['csv', 'ndjson'], help='Default: from the extension (.ndjson, .jsonl)')
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Validating processes; 0 validates in this one (default: one per CPU)',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+            help='Rows per worker task and per transaction',
+        )
+        parser.add_argument('--rejects', help='Rejected rows report (default: <path>.rejects.csv)')
+        parser.add_argument('--dry-run', action='store_true', help='Validate only')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+    
+    def handle(self, *args, **options):
+        path = options['path']
+        format = options['format'] or ('csv' if path == '-' else detect_format(path))
+        rejects_path = options['rejects'] or ('rejected_patients.csv' if path == '-' else f'{path}.rejects.csv')
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be positive')
+        
+        doctors = doctor_map(options['database'])
+        try:
+            file = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8-sig')
+        except OSError as e:
+            raise CommandError(str(e))
+        imported = rejected = 0
+        rejects = writer = None
+        started = time.perf_counter()
+        try:
+            rows = read_rows(file, format)
+            for valid, invalid in cleaned_chunks(
+                rows, doctors, options['chunk_size'], options['workers'], options['database'],
+            ):
+                if valid and not options['dry_run']:
+                    insert_patients(valid, options['database'])
+                imported += len(valid)
+                if invalid and writer is None:
+                    rejects = open(rejects_path, 'w', newline='', encoding='utf-8')
+                    writer = csv.writer(rejects)
+                    writer.writerow(['line', 'errors', 'row'])
+                for number, row, errors in invalid:
+                    writer.writerow([number, '; '.join(errors), json.dumps(row, ensure_ascii=False)])
+                rejected += len(invalid)
+                done = imported + rejected
+                if done // PROGRESS_EVERY != (done - len(valid) - len(invalid)) // PROGRESS_EVERY:
+                    self.stdout.write(f'{done} rows, {done / (time.perf_counter() - started):.0f} rows/s')
+        except ValueError as e:
+            raise CommandError(str(e))
+        finally:
+            if file is not sys.stdin:
+                file.close()
+            if rejects is not None:
+                rejects.close()
+        
+        elapsed = time.perf_counter() - started
+        rate = (imported + rejected) / elapsed if elapsed else 0
+        verb = 'Validated' if options['dry_run'] else 'Imported'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {imported} patients in {elapsed:.1f}s ({rate:.0f} rows/s); {rejected} rejected'
+        ))
+        if rejected:
+            self.stdout.write(f'Rejected rows: {rejects_path}')
@@ -0,0 +1,60 @@
+import os
+import time
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db.models import FileField
+
+from Hospital.storage import ContentAddressedStorage, digest_of
+
+
+def attachment_fields():
+    """Every file field of every model that stores into a content-addressed storage"""
+    return [
+        (model, field)
+        for model in apps.get_models()
+        for field in model._meta.get_fields()
+        if isinstance(field, FileField) and isinstance(field.storage, ContentAddressedStorage)
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete attachment blobs that no row refers to any more, and uploads '
+        'abandoned half-way; blobs are shared, so deleting a row leaves its file'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace', type=float, default=24.0, metavar='HOURS',
+            help='Keep files written more recently than this: their rows may not be committed yet',
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be deleted')
+    
+    def handle(self, *args, **options):
+        # Digests in use, per storage location
+        referenced = {}
+        for model, field in attachment_fields():
+            digests = referenced.setdefault(field.storage.location, (field.storage, set()))[1]
+            names = model._default_manager.exclude(**{field.name: ''}).exclude(**{f'{field.name}__isnull': True})
+            for name in names.values_list(field.name, flat=True).iterator():
+                digests.add(digest_of(name))
+        
+        cutoff = time.time() - options['grace'] * 3600
+        unreferenced, abandoned, in_use = [], [], 0
+        for storage, digests in referenced.values():
+            unreferenced += [
+                path for digest, path in storage.blobs()
+                if digest not in digests and os.path.getmtime(path) < cutoff
+            ]
+            abandoned += [path for path in storage.temporary_files() if os.path.getmtime(path) < cutoff]
+            in_use += len(digests - {None})
+        freed = sum(os.path.getsize(path) for path in unreferenced + abandoned)
+        if not options['dry_run']:
+            for path in unreferenced + abandoned:
+                os.remove(path)
+        self.stdout.write(
+            f"{'Would delete' if options['dry_run'] else 'Deleted'} {len(unreferenced)} unreferenced blobs "
+            f'and {len(abandoned)} abandoned uploads ({freed / 1024 / 1024:.1f} MiB); '
+            f'{in_use} blobs are in use'
+        )
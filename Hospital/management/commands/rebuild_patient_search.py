@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from Hospital.search import fts_available, rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the FTS5 patient search index from the Patient table'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+    
+    def handle(self, *args, **options):
+        using = options['database']
+        if not fts_available(using):
+            raise CommandError(
+                'No FTS5 patient index on this database; searches use the icontains fallback. '
+                'Run migrate on an SQLite build with FTS5 to create it.'
+            )
+        rebuild_index(using)
+        self.stdout.write(self.style.SUCCESS('Patient search index rebuilt'))
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from Hospital.synthetic import DEFAULT_BATCH_SIZE, FULL_VOLUMES, SyntheticDataGenerator
+
+
+class Command(BaseCommand):
+    help = (
+        'Add synthetic, referentially consistent data to the database: by default '
+        '10k doctors, 1M patients, 10M appointments and proportionate bills, '
+        'medical records, rooms and room stays'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scale', type=float, default=1.0,
+            help='Multiply every default count, e.g. 0.01 for a quick 100k appointment database',
+        )
+        for name, count in FULL_VOLUMES.items():
+            parser.add_argument(f"--{name.replace('_', '-')}", type=int, dest=name, help=f'Default {count} x scale')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument('--seed', type=int, default=0, help='Random seed; the same seed gives the same data')
+        parser.add_argument('--noinput', '--no-input', action='store_false', dest='interactive')
+    
+    def handle(self, *args, **options):
+        if options['scale'] <= 0:
+            raise CommandError('--scale must be positive')
+        counts = {
+            name: options[name] if options[name] is not None else max(1, round(count * options['scale']))
+            for name, count in FULL_VOLUMES.items()
+        }
+        summary = ', '.join(f"{count} {name.replace('_', ' ')}" for name, count in counts.items())
+        if options['interactive']:
+            answer = input(
+                f"This adds {summary} to the '{connection.settings_dict['NAME']}' database.\n"
+                "Type 'yes' to continue, or 'no' to cancel: "
+            )
+            if answer != 'yes':
+                raise CommandError('Seeding cancelled.')
+        
+        if connection.vendor == 'sqlite' and not connection.in_atomic_block:
+            # Generated rows can be generated again, so skip the fsync per batch
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA synchronous = OFF')
+        generator = SyntheticDataGenerator(batch_size=options['batch_size'], seed=options['seed'], stdout=self.stdout)
+        self.stdout.write(f'Seeding {summary}')
+        generator.generate(**counts, appointment_days_back=None)
+        self.stdout.write(self.style.SUCCESS('Synthetic data generated'))
@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from Hospital.sweeper import DEFAULT_CHUNK_SIZE, SWEEPS, sweep
+
+
+class Command(BaseCommand):
+    help = (
+        "Mark unpaid bills past their due date 'overdue' and past scheduled appointments "
+        "'no_show', with one UPDATE per primary key range; run it from cron, or keep it "
+        'running with --every'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--only', action='append', choices=list(SWEEPS),
+            help='Sweep only these (repeatable; default: bills and appointments)',
+        )
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='Ids per UPDATE')
+        parser.add_argument('--every', type=float, metavar='SECONDS', help='Sweep again every SECONDS until stopped')
+        parser.add_argument('--dry-run', action='store_true', help='Only count what is due')
+    
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be positive')
+        while True:
+            self.sweep(options)
+            if not options['every']:
+                return
+            time.sleep(options['every'])
+    
+    def sweep(self, options):
+        now = timezone.now()
+        for kind in options['only'] or list(SWEEPS):
+            rows_to_sweep, status = SWEEPS[kind]
+            if options['dry_run']:
+                self.stdout.write(f'{kind}: {rows_to_sweep(now).count()} due to become {status}')
+                continue
+            started = time.perf_counter()
+            updates = list(sweep(kind, now, options['chunk_size']))
+            self.stdout.write(
+                f'{kind}: {sum(updates)} marked {status} with {len(updates)} updates '
+                f'in {(time.perf_counter() - started) * 1000:.0f} ms'
+            )
@@ -0,0 +1,56 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = (
+        'Copy the primary SQLite database to the SQLite replicas in REPLICA_DATABASES '
+        '(or to --output) with the online backup API; a local stand-in for replication'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--output', '-o', help='File to copy to instead of the configured replicas')
+        parser.add_argument(
+            '--every', type=float, metavar='SECONDS',
+            help='Keep copying at this interval; the replication lag is at most this long',
+        )
+    
+    def handle(self, *args, **options):
+        primary = connections[DEFAULT_DB_ALIAS]
+        if primary.vendor != 'sqlite':
+            raise CommandError('sync_replica copies SQLite databases; use the database\'s own replication')
+        if options['output']:
+            targets = [options['output']]
+        else:
+            targets = [connections[alias].settings_dict['NAME'] for alias in settings.REPLICA_DATABASES]
+            if not targets:
+                raise CommandError('No REPLICA_DATABASES configured; set HOSPITAL_REPLICA_DB or pass --output')
+        
+        while True:
+            started = time.perf_counter()
+            for target in targets:
+                self.copy(primary, target)
+            self.stdout.write(
+                f"Copied {primary.settings_dict['NAME']} to {', '.join(map(str, targets))} "
+                f'in {time.perf_counter() - started:.2f}s'
+            )
+            if not options['every']:
+                return
+            time.sleep(options['every'])
+    
+    def copy(self, primary, target):
+        """A consistent snapshot of the committed primary, written over
+        ``target`` page by page"""
+        # A connection of its own: the backup must not run inside an open
+        # transaction, and under WAL it does not block the primary's writers
+        source = sqlite3.connect(primary.settings_dict['NAME'])
+        destination = sqlite3.connect(target)
+        try:
+            source.backup(destination)
+        finally:
+            destination.close()
+            source.close()
@@ -0,0 +1,219 @@
+"""Per-view request metrics in the Prometheus text format.
+
+MetricsMiddleware times every request and labels it with the resolved URL
+name (e.g. hospital:patient_list), so the label set is bounded by urls.py
+rather than by the paths clients send. Database queries are counted and
+timed by one execute wrapper that every connection gets when it opens; the
+wrapper reads the current request's tally from a context variable, which
+follows the request into the threads that sync_to_async runs its ORM calls
+in. Everything is kept in fixed-bucket histograms in process memory and
+rendered on demand at /metrics.
+
+Each worker process reports its own figures; scrape every worker (or sum
+them per instance label) when running more than one.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+UNRESOLVED = '<unresolved>'
+
+_tally = ContextVar('hospital_metrics_tally', default=None)
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum')
+    
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+    
+    def observe(self, value):
+        # Bucket i counts values <= buckets[i]; the last one is +Inf
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class ViewMetrics:
+    __slots__ = ('duration', 'queries', 'size', 'db_seconds', 'statuses')
+    
+    def __init__(self):
+        self.duration = Histogram(DURATION_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.size = Histogram(SIZE_BUCKETS)
+        self.db_seconds = 0.0
+        self.statuses = {}
+
+
+class MetricsStore:
+    """Histograms per (view, method), guarded by one short lock"""
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = {}
+    
+    def record(self, view, method, status, seconds, queries, db_seconds, size):
+        with self.lock:
+            metrics = self.views.get((view, method))
+            if metrics is None:
+                metrics = self.views[(view, method)] = ViewMetrics()
+            metrics.duration.observe(seconds)
+            metrics.queries.observe(queries)
+            if size is not None:
+                metrics.size.observe(size)
+            metrics.db_seconds += db_seconds
+            metrics.statuses[status] = metrics.statuses.get(status, 0) + 1
+    
+    def clear(self):
+        with self.lock:
+            self.views = {}
+    
+    def render(self):
+        """The store in the Prometheus text exposition format"""
+        with self.lock:
+            views = sorted(self.views.items())
+            lines = []
+            _family(lines, 'hospital_http_requests_total', 'counter', 'Requests by view, method and status code', [
+                ((('view', view), ('method', method), ('status', str(status))), count)
+                for (view, method), metrics in views
+                for status, count in sorted(metrics.statuses.items())
+            ])
+            _histogram(lines, 'hospital_http_request_duration_seconds', 'Time from request to response',
+                       views, 'duration')
+            _histogram(lines, 'hospital_http_request_db_queries', 'Database queries per request', views, 'queries')
+            _family(lines, 'hospital_http_request_db_seconds_total', 'counter', 'Time spent in database queries', [
+                ((('view', view), ('method', method)), round(metrics.db_seconds, 6))
+                for (view, method), metrics in views
+            ])
+            _histogram(lines, 'hospital_http_response_size_bytes', 'Response body size; streamed bodies are not counted',
+                       views, 'size')
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return value.replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _labels(pairs):
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _family(lines, name, kind, help_text, samples):
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} {kind}')
+    for labels, value in samples:
+        lines.append(f'{name}{_labels(labels)} {value}')
+
+
+def _histogram(lines, name, help_text, views, attribute):
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} histogram')
+    for (view, method), metrics in views:
+        histogram = getattr(metrics, attribute)
+        labels = (('view', view), ('method', method))
+        cumulative = 0
+        for bound, count in zip((*histogram.buckets, '+Inf'), histogram.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{_labels((*labels, ("le", str(bound))))} {cumulative}')
+        lines.append(f'{name}_sum{_labels(labels)} {round(histogram.sum, 6)}')
+        lines.append(f'{name}_count{_labels(labels)} {cumulative}')
+
+
+store = MetricsStore()
+
+
+class QueryTally:
+    __slots__ = ('count', 'seconds')
+    
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+
+def count_queries(execute, sql, params, many, context):
+    tally = _tally.get()
+    if tally is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        tally.seconds += time.perf_counter() - started
+        tally.count += 1
+
+
+def install_wrapper(sender, connection, **kwargs):
+    # Fires on every (re)connect of the same wrapper object
+    if count_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_queries)
+
+
+def install_on_open_connections():
+    """Cover connections this thread opened before the signal was connected"""
+    for connection in connections.all(initialized_only=True):
+        install_wrapper(None, connection)
+
+
+connection_created.connect(install_wrapper, dispatch_uid='metrics-execute-wrapper')
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match is not None else UNRESOLVED
+
+
+def response_size(response):
+    if response.streaming:
+        return None
+    return len(response.content)
+
+
+class MetricsMiddleware:
+    """Record latency, queries, database time, size and status per view"""
+    sync_capable = True
+    async_capable = True
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+    
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        install_on_open_connections()
+        tally = QueryTally()
+        token = _tally.set(tally)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _tally.reset(token)
+        self._record(request, response, time.perf_counter() - started, tally)
+        return response
+    
+    async def __acall__(self, request):
+        tally = QueryTally()
+        token = _tally.set(tally)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _tally.reset(token)
+        self._record(request, response, time.perf_counter() - started, tally)
+        return response
+    
+    def _record(self, request, response, seconds, tally):
+        store.record(
+            view_name(request), request.method, response.status_code,
+            seconds, tally.count, tally.seconds, response_size(response),
+        )
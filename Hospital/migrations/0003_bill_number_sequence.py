@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:20
+
+from django.db import migrations, models
+
+
+def seed_bill_number_sequence(apps, schema_editor):
+    """Continue numbering after the highest existing BILL-nnnnnn"""
+    Bill = apps.get_model('Hospital', 'Bill')
+    Sequence = apps.get_model('Hospital', 'Sequence')
+    last_value = 0
+    numbers = Bill.objects.filter(bill_number__regex=r'^BILL-[0-9]+$').values_list('bill_number', flat=True)
+    for bill_number in numbers.iterator():
+        last_value = max(last_value, int(bill_number.split('-')[-1]))
+    Sequence.objects.update_or_create(name='bill_number', defaults={'last_value': last_value})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Hospital', '0002_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Sequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('last_value', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Sequence',
+                'verbose_name_plural': 'Sequences',
+            },
+        ),
+        migrations.RunPython(seed_bill_number_sequence, migrations.RunPython.noop),
+    ]
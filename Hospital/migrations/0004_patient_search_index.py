@@ -0,0 +1,67 @@
+from django.db import migrations
+from django.db.utils import OperationalError
+
+FTS_TABLE = 'Hospital_patient_fts'
+COLUMNS = 'name, phone, diagnosis, emergency_contact'
+
+CREATE_SQL = [
+    f"""CREATE VIRTUAL TABLE "{FTS_TABLE}" USING fts5(
+        {COLUMNS},
+        content='Hospital_patient', content_rowid='id',
+        tokenize='unicode61', prefix='1 2 3'
+    )""",
+    f"""CREATE TRIGGER "{FTS_TABLE}_ai" AFTER INSERT ON "Hospital_patient" BEGIN
+        INSERT INTO "{FTS_TABLE}"(rowid, {COLUMNS})
+        VALUES (new.id, new.name, new.phone, new.diagnosis, new.emergency_contact);
+    END""",
+    f"""CREATE TRIGGER "{FTS_TABLE}_ad" AFTER DELETE ON "Hospital_patient" BEGIN
+        INSERT INTO "{FTS_TABLE}"("{FTS_TABLE}", rowid, {COLUMNS})
+        VALUES ('delete', old.id, old.name, old.phone, old.diagnosis, old.emergency_contact);
+    END""",
+    f"""CREATE TRIGGER "{FTS_TABLE}_au" AFTER UPDATE OF {COLUMNS} ON "Hospital_patient" BEGIN
+        INSERT INTO "{FTS_TABLE}"("{FTS_TABLE}", rowid, {COLUMNS})
+        VALUES ('delete', old.id, old.name, old.phone, old.diagnosis, old.emergency_contact);
+        INSERT INTO "{FTS_TABLE}"(rowid, {COLUMNS})
+        VALUES (new.id, new.name, new.phone, new.diagnosis, new.emergency_contact);
+    END""",
+    f"""INSERT INTO "{FTS_TABLE}"("{FTS_TABLE}") VALUES ('rebuild')""",
+]
+
+DROP_SQL = [
+    f'DROP TRIGGER IF EXISTS "{FTS_TABLE}_ai"',
+    f'DROP TRIGGER IF EXISTS "{FTS_TABLE}_ad"',
+    f'DROP TRIGGER IF EXISTS "{FTS_TABLE}_au"',
+    f'DROP TABLE IF EXISTS "{FTS_TABLE}"',
+]
+
+
+def create_search_index(apps, schema_editor):
+    """SQLite only; other backends and builds without FTS5 use the LIKE fallback"""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        try:
+            cursor.execute(CREATE_SQL[0])
+        except OperationalError:
+            return
+        for sql in CREATE_SQL[1:]:
+            cursor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for sql in DROP_SQL:
+            cursor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Hospital', '0003_bill_number_sequence'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:45
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_daily_revenue(apps, schema_editor):
+    """Roll up the paid bills that already exist"""
+    Bill = apps.get_model('Hospital', 'Bill')
+    BillItem = apps.get_model('Hospital', 'BillItem')
+    DailyRevenue = apps.get_model('Hospital', 'DailyRevenue')
+    using = schema_editor.connection.alias
+    bills = Bill.objects.using(using).filter(status='paid').order_by()
+    rows = [
+        DailyRevenue(
+            day=row['bill_date'], payment_method=row['payment_method'], item_type='',
+            bill_count=row['bills'], amount=row['amount'],
+        )
+        for row in bills.values('bill_date', 'payment_method').annotate(bills=Count('id'), amount=Sum('total_amount'))
+    ]
+    items = BillItem.objects.using(using).filter(bill__status='paid').order_by()
+    rows += [
+        DailyRevenue(
+            day=row['bill__bill_date'], payment_method=row['bill__payment_method'], item_type=row['item_type'],
+            bill_count=row['bills'], quantity=row['quantity'], amount=row['amount'],
+        )
+        for row in items.values('bill__bill_date', 'bill__payment_method', 'item_type').annotate(
+            bills=Count('bill_id', distinct=True), quantity=Sum('quantity'), amount=Sum('total_price')
+        )
+    ]
+    DailyRevenue.objects.using(using).bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Hospital', '0004_patient_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRevenue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('payment_method', models.CharField(blank=True, max_length=20)),
+                ('item_type', models.CharField(blank=True, max_length=20)),
+                ('bill_count', models.PositiveIntegerField(default=0)),
+                ('quantity', models.PositiveIntegerField(default=0)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'verbose_name': 'Daily Revenue',
+                'verbose_name_plural': 'Daily Revenue',
+                'ordering': ['day', 'payment_method', 'item_type'],
+                'constraints': [models.UniqueConstraint(fields=('day', 'payment_method', 'item_type'), name='daily_revenue_key')],
+            },
+        ),
+        migrations.RunPython(backfill_daily_revenue, migrations.RunPython.noop),
+    ]
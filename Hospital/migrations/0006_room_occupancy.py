@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:50
+
+from datetime import datetime, time, timezone
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_open_stays(apps, schema_editor):
+    """Open a stay in bed 1 for every room that has a current patient"""
+    Room = apps.get_model('Hospital', 'Room')
+    RoomOccupancy = apps.get_model('Hospital', 'RoomOccupancy')
+    using = schema_editor.connection.alias
+    rooms = Room.objects.using(using).filter(current_patient__isnull=False).values_list(
+        'id', 'current_patient_id', 'current_patient__admitted_date'
+    )
+    RoomOccupancy.objects.using(using).bulk_create([
+        RoomOccupancy(
+            room_id=room_id, bed=1, patient_id=patient_id,
+            start=datetime.combine(admitted, time.min, tzinfo=timezone.utc),
+        )
+        for room_id, patient_id, admitted in rooms
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Hospital', '0005_daily_revenue_rollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RoomOccupancy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bed', models.PositiveIntegerField(default=1)),
+                ('start', models.DateTimeField()),
+                ('end', models.DateTimeField(blank=True, null=True)),
+                ('duration', models.DurationField(blank=True, null=True)),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='room_stays', to='Hospital.patient')),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='occupancies', to='Hospital.room')),
+            ],
+            options={
+                'verbose_name': 'Room Occupancy',
+                'verbose_name_plural': 'Room Occupancies',
+                'ordering': ['-start'],
+                'indexes': [models.Index(fields=['start'], name='occupancy_start_idx'), models.Index(fields=['end', 'start'], name='occupancy_end_start_idx'), models.Index(fields=['duration'], name='occupancy_duration_idx'), models.Index(fields=['patient', '-start'], name='occupancy_patient_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('end__isnull', True)), fields=('room', 'bed'), name='occupancy_open_bed_unique'), models.UniqueConstraint(condition=models.Q(('end__isnull', True)), fields=('patient',), name='occupancy_open_patient_unique')],
+            },
+        ),
+        migrations.RunPython(backfill_open_stays, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:30
+
+import Hospital.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Hospital', '0006_room_occupancy'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='medicalrecord',
+            name='attachments',
+            field=models.FileField(blank=True, max_length=255, null=True, storage=Hospital.storage.attachment_storage, upload_to='medical_records/'),
+        ),
+        migrations.AlterField(
+            model_name='report',
+            name='file_attachment',
+            field=models.FileField(blank=True, max_length=255, null=True, storage=Hospital.storage.attachment_storage, upload_to='reports/'),
+        ),
+    ]
@@ -0,0 +1,170 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:34
+
+import Hospital.storage
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Hospital', '0007_content_addressed_attachments'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedBill',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('bill_number', models.CharField(max_length=20, unique=True)),
+                ('total_amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('paid_amount', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('discount_amount', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('tax_amount', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('status', models.CharField(choices=[('paid', 'Paid'), ('unpaid', 'Unpaid'), ('partially_paid', 'Partially Paid'), ('overdue', 'Overdue'), ('cancelled', 'Cancelled')], default='unpaid', max_length=20)),
+                ('payment_method', models.CharField(blank=True, choices=[('cash', 'Cash'), ('card', 'Card'), ('bank_transfer', 'Bank Transfer'), ('insurance', 'Insurance'), ('cheque', 'Cheque')], max_length=20)),
+                ('bill_date', models.DateField(auto_now_add=True)),
+                ('due_date', models.DateField()),
+                ('payment_date', models.DateField(blank=True, null=True)),
+                ('description', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('patient', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='Hospital.patient')),
+            ],
+            options={
+                'verbose_name': 'Archived bill',
+                'verbose_name_plural': 'Archived bills',
+                'ordering': ['-bill_date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedBillItem',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('item_type', models.CharField(choices=[('consultation', 'Consultation'), ('medicine', 'Medicine'), ('test', 'Medical Test'), ('procedure', 'Medical Procedure'), ('room_charge', 'Room Charge'), ('equipment', 'Equipment Usage'), ('other', 'Other')], max_length=20)),
+                ('description', models.CharField(max_length=200)),
+                ('quantity', models.PositiveIntegerField(default=1)),
+                ('unit_price', models.DecimalField(decimal_places=2, max_digits=8)),
+                ('total_price', models.DecimalField(decimal_places=2, max_digits=8)),
+                ('bill', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='Hospital.archivedbill')),
+            ],
+            options={
+                'verbose_name': 'Archived bill item',
+                'verbose_name_plural': 'Archived bill items',
+                'ordering': [],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedMedicalRecord',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('visit_date', models.DateTimeField()),
+                ('symptoms', models.TextField()),
+                ('diagnosis', models.TextField()),
+                ('treatment', models.TextField()),
+                ('prescription', models.TextField(blank=True)),
+                ('follow_up_date', models.DateField(blank=True, null=True)),
+                ('notes', models.TextField(blank=True)),
+                ('attachments', models.FileField(blank=True, max_length=255, null=True, storage=Hospital.storage.attachment_storage, upload_to='medical_records/')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('doctor', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='Hospital.doctor')),
+                ('patient', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='Hospital.patient')),
+            ],
+            options={
+                'verbose_name': 'Archived medical record',
+                'verbose_name_plural': 'Archived medical records',
+                'ordering': ['-visit_date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedPatient',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=100)),
+                ('age', models.PositiveIntegerField()),
+                ('gender', models.CharField(choices=[('male', 'Male'), ('female', 'Female'), ('other', 'Other')], max_length=10)),
+                ('phone', models.CharField(max_length=17)),
+                ('email', models.EmailField(blank=True, max_length=254, null=True)),
+                ('address', models.TextField()),
+                ('blood_group', models.CharField(blank=True, choices=[('A+', 'A+'), ('A-', 'A-'), ('B+', 'B+'), ('B-', 'B-'), ('AB+', 'AB+'), ('AB-', 'AB-'), ('O+', 'O+'), ('O-', 'O-')], max_length=3)),
+                ('emergency_contact', models.CharField(max_length=100)),
+                ('emergency_phone', models.CharField(max_length=17)),
+                ('diagnosis', models.TextField()),
+                ('medical_history', models.TextField(blank=True)),
+                ('allergies', models.TextField(blank=True)),
+                ('current_medications', models.TextField(blank=True)),
+                ('status', models.CharField(choices=[('active', 'Active'), ('discharged', 'Discharged'), ('admitted', 'Admitted'), ('emergency', 'Emergency')], default='active', max_length=20)),
+                ('admitted_date', models.DateField()),
+                ('discharge_date', models.DateField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('assigned_doctor', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='Hospital.doctor')),
+            ],
+            options={
+                'verbose_name': 'Archived patient',
+                'verbose_name_plural': 'Archived patients',
+                'ordering': ['-admitted_date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedRoomOccupancy',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('bed', models.PositiveIntegerField(default=1)),
+                ('start', models.DateTimeField()),
+                ('end', models.DateTimeField(blank=True, null=True)),
+                ('duration', models.DurationField(blank=True, null=True)),
+                ('patient', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='Hospital.patient')),
+                ('room', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='Hospital.room')),
+            ],
+            options={
+                'verbose_name': 'Archived room occupancy',
+                'verbose_name_plural': 'Archived room occupancies',
+                'ordering': ['-start'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedAppointment',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('appointment_date', models.DateField()),
+                ('appointment_time', models.TimeField()),
+                ('appointment_type', models.CharField(choices=[('consultation', 'Consultation'), ('follow_up', 'Follow Up'), ('emergency', 'Emergency'), ('routine_checkup', 'Routine Checkup'), ('surgery', 'Surgery'), ('diagnostic', 'Diagnostic')], default='consultation', max_length=20)),
+                ('duration_minutes', models.PositiveIntegerField(default=30)),
+                ('reason', models.TextField()),
+                ('notes', models.TextField(blank=True)),
+                ('status', models.CharField(choices=[('scheduled', 'Scheduled'), ('completed', 'Completed'), ('cancelled', 'Cancelled'), ('rescheduled', 'Rescheduled'), ('no_show', 'No Show')], default='scheduled', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('doctor', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='Hospital.doctor')),
+                ('patient', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='Hospital.patient')),
+            ],
+            options={
+                'verbose_name': 'Archived appointment',
+                'verbose_name_plural': 'Archived appointments',
+                'ordering': ['appointment_date', 'appointment_time'],
+                'indexes': [models.Index(fields=['patient', 'appointment_date'], name='archived_appt_patient_idx'), models.Index(fields=['doctor', 'appointment_date'], name='archived_appt_doctor_idx')],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='archivedbill',
+            index=models.Index(fields=['patient', '-bill_date'], name='archived_bill_patient_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedbill',
+            index=models.Index(fields=['status', 'bill_date'], name='archived_bill_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedmedicalrecord',
+            index=models.Index(fields=['patient', '-visit_date'], name='archived_record_patient_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedpatient',
+            index=models.Index(fields=['discharge_date'], name='archived_patient_discharge_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedroomoccupancy',
+            index=models.Index(fields=['patient', '-start'], name='archived_stay_patient_idx'),
+        ),
+    ]
@@ -0,0 +1,15 @@
+from django.db import migrations
+
+# CursorPaginator's keyset indexes (patient_admitted_idx, appt_date_time_idx,
+# bill_date_idx) are created by 0002. This migration briefly created them
+# instead; it is kept, without operations, so databases that recorded it
+# keep a consistent history.
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Hospital', '0008_archive_tables'),
+    ]
+
+    operations = []
@@ -0,0 +1,62 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+COVERED_COLUMNS = {'patient_id': 'patient', 'doctor_id': 'doctor'}
+
+
+def drop_covered_indexes(apps, schema_editor):
+    """Drop the foreign key indexes by name; AlterField would rebuild the table on SQLite"""
+    Appointment = apps.get_model('Hospital', 'Appointment')
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, Appointment._meta.db_table)
+    for name, details in constraints.items():
+        columns = details['columns']
+        if details['index'] and not details['unique'] and len(columns) == 1 and columns[0] in COVERED_COLUMNS:
+            schema_editor.remove_index(Appointment, models.Index(fields=[COVERED_COLUMNS[columns[0]]], name=name))
+
+
+def restore_indexes(apps, schema_editor):
+    """Recreate them under the hashed names Django gives foreign key indexes"""
+    Appointment = apps.get_model('Hospital', 'Appointment')
+    for field in COVERED_COLUMNS.values():
+        schema_editor.execute(schema_editor._create_index_sql(Appointment, fields=[Appointment._meta.get_field(field)]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Hospital', '0009_keyset_indexes'),
+    ]
+    
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='appointment',
+                    name='doctor',
+                    field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='appointments', to='Hospital.doctor'),
+                ),
+                migrations.AlterField(
+                    model_name='appointment',
+                    name='patient',
+                    field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='appointments', to='Hospital.patient'),
+                ),
+            ],
+            database_operations=[
+                migrations.RunPython(drop_covered_indexes, restore_indexes),
+            ],
+        ),
+        migrations.RemoveIndex(
+            model_name='appointment',
+            name='appt_doctor_date_status_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='bill',
+            name='bill_unpaid_due_idx',
+        ),
+        migrations.AddIndex(
+            model_name='bill',
+            index=models.Index(fields=['status', 'due_date'], name='bill_status_due_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+from django.db import migrations
+
+# The journal mode is stored in the database file, so it is set once here
+# rather than on every connection (Hospital.sqlite_profile). SQLite refuses
+# to change it inside a transaction, hence atomic = False. An in-memory
+# database keeps its 'memory' journal.
+
+
+def journal_mode(mode):
+    def set_mode(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA journal_mode = {mode}')
+    return set_mode
+
+
+class Migration(migrations.Migration):
+    atomic = False
+    
+    dependencies = [
+        ('Hospital', '0010_prune_query_indexes'),
+    ]
+    
+    operations = [
+        migrations.RunPython(journal_mode('wal'), journal_mode('delete')),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Hospital', '0011_sqlite_wal'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='archivedroomoccupancy',
+            index=models.Index(fields=['start'], name='archived_stay_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedroomoccupancy',
+            index=models.Index(fields=['duration'], name='archived_stay_duration_idx'),
+        ),
+    ]
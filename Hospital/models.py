@@ -1,8 +1,14 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.core.validators import RegexValidator
+from django.db.models.functions import Length
 from django.utils import timezone
 
+from .sequences import SequenceAllocator
+from .storage import attachment_storage
+
+BILL_NUMBER_PREFIX = 'BILL-'
+
 class Doctor(models.Model):
     """Doctor model for managing hospital doctors"""
     SPECIALTY_CHOICES = [
@@ -45,6 +51,9 @@ class Doctor(models.Model):
     
     @property
     def patient_count(self):
+        # Lists annotate active_patients so that rows do not query one by one
+        if hasattr(self, 'active_patients'):
+            return self.active_patients
         return self.patients.filter(status='active').count()
 
 class Patient(models.Model):
@@ -101,6 +110,14 @@ class Patient(models.Model):
         ordering = ['-admitted_date']
         verbose_name = 'Patient'
         verbose_name_plural = 'Patients'
+        indexes = [
+            # patient_list / dashboard: status filter, newest admissions first
+            models.Index(fields=['status', '-admitted_date'], name='patient_status_admitted_idx'),
+            # CursorPaginator keyset order
+            models.Index(fields=['-admitted_date', 'id'], name='patient_admitted_idx'),
+            # Doctor.patient_count and the admin active_patients annotation
+            models.Index(fields=['assigned_doctor', 'status'], name='patient_doctor_status_idx'),
+        ]
     
     def __str__(self):
         return f"{self.name} - {self.diagnosis}"
@@ -130,8 +147,10 @@ class Appointment(models.Model):
         ('diagnostic', 'Diagnostic'),
     ]
     
-    patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='appointments')
-    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='appointments')
+    # No single column indexes: appt_patient_date_idx and the unique
+    # (doctor, appointment_date, appointment_time) index lead with these
+    patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='appointments', db_index=False)
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='appointments', db_index=False)
     appointment_date = models.DateField()
     appointment_time = models.TimeField()
     appointment_type = models.CharField(max_length=20, choices=APPOINTMENT_TYPE_CHOICES, default='consultation')
@@ -147,6 +166,17 @@ class Appointment(models.Model):
         unique_together = ['doctor', 'appointment_date', 'appointment_time']
         verbose_name = 'Appointment'
         verbose_name_plural = 'Appointments'
+        # appointment_list / api_doctor_availability filter a doctor's days through
+        # the unique (doctor, appointment_date, appointment_time) index
+        indexes = [
+            # dashboard: today's scheduled count and today's list ordered by time
+            models.Index(fields=['appointment_date', 'status', 'appointment_time'], name='appt_date_status_time_idx'),
+            models.Index(fields=['status', 'appointment_date'], name='appt_status_date_idx'),
+            # CursorPaginator keyset order
+            models.Index(fields=['appointment_date', 'appointment_time', 'id'], name='appt_date_time_idx'),
+            # patient_detail: a patient's appointments in calendar order
+            models.Index(fields=['patient', 'appointment_date', 'appointment_time'], name='appt_patient_date_idx'),
+        ]
     
     def __str__(self):
         return f"{self.patient.name} - {self.doctor.name} on {self.appointment_date}"
@@ -155,6 +185,18 @@ class Appointment(models.Model):
     def appointment_datetime(self):
         return timezone.datetime.combine(self.appointment_date, self.appointment_time)
 
+class Sequence(models.Model):
+    """Counter row for SequenceAllocator; updated atomically, one row per sequence"""
+    name = models.CharField(max_length=50, unique=True)
+    last_value = models.BigIntegerField(default=0)
+    
+    class Meta:
+        verbose_name = 'Sequence'
+        verbose_name_plural = 'Sequences'
+    
+    def __str__(self):
+        return f"{self.name} = {self.last_value}"
+
 class Bill(models.Model):
     """Bill model for managing patient billing"""
     STATUS_CHOICES = [
@@ -192,6 +234,17 @@ class Bill(models.Model):
         ordering = ['-bill_date']
         verbose_name = 'Bill'
         verbose_name_plural = 'Bills'
+        indexes = [
+            # dashboard / bill_list status filter in list order, and
+            # generate_revenue_report: status='paid' AND bill_date BETWEEN ...
+            models.Index(fields=['status', '-bill_date'], name='bill_status_date_idx'),
+            # OverdueBillFilter / sweep_statuses: status='unpaid' AND due_date < today.
+            # Not partial: SQLite cannot match a condition against a bound parameter
+            models.Index(fields=['status', 'due_date'], name='bill_status_due_idx'),
+            # CursorPaginator keyset order
+            models.Index(fields=['-bill_date', 'id'], name='bill_date_idx'),
+            models.Index(fields=['patient', '-bill_date'], name='bill_patient_date_idx'),
+        ]
     
     def __str__(self):
         return f"Bill #{self.bill_number} - {self.patient.name}"
@@ -202,19 +255,30 @@ class Bill(models.Model):
     
     @property
     def is_overdue(self):
-        return self.due_date < timezone.now().date() and self.status == 'unpaid'
+        return self.status == 'overdue' or (self.due_date < timezone.now().date() and self.status == 'unpaid')
     
     def save(self, *args, **kwargs):
         if not self.bill_number:
             # Generate bill number
-            last_bill = Bill.objects.order_by('-id').first()
-            if last_bill:
-                last_number = int(last_bill.bill_number.split('-')[-1])
-                self.bill_number = f"BILL-{last_number + 1:06d}"
-            else:
-                self.bill_number = "BILL-000001"
+            self.bill_number = format_bill_number(bill_numbers.next())
         super().save(*args, **kwargs)
 
+def format_bill_number(number):
+    return f"{BILL_NUMBER_PREFIX}{number:06d}"
+
+def last_bill_number():
+    """Highest BILL-nnnnnn number in use, to seed the bill number sequence"""
+    last_bill = (
+        Bill.objects.filter(bill_number__regex=r'^BILL-[0-9]+$')
+        .order_by(Length('bill_number').desc(), '-bill_number')
+        .first()
+    )
+    if last_bill:
+        return int(last_bill.bill_number[len(BILL_NUMBER_PREFIX):])
+    return 0
+
+bill_numbers = SequenceAllocator('bill_number', initial_value=last_bill_number)
+
 class BillItem(models.Model):
     """Bill item model for itemized billing"""
     ITEM_TYPE_CHOICES = [
@@ -245,6 +309,31 @@ class BillItem(models.Model):
         self.total_price = self.quantity * self.unit_price
         super().save(*args, **kwargs)
 
+class DailyRevenue(models.Model):
+    """Paid revenue rolled up per bill day, payment method and item type.
+    
+    Rows with an empty item_type hold whole bills (bill_count bills totalling
+    amount); the other rows hold the item lines of those bills by category.
+    Maintained by Hospital.revenue; rebuild with backfill_revenue_rollup.
+    """
+    day = models.DateField()
+    payment_method = models.CharField(max_length=20, blank=True)
+    item_type = models.CharField(max_length=20, blank=True)
+    bill_count = models.PositiveIntegerField(default=0)
+    quantity = models.PositiveIntegerField(default=0)
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    
+    class Meta:
+        ordering = ['day', 'payment_method', 'item_type']
+        verbose_name = 'Daily Revenue'
+        verbose_name_plural = 'Daily Revenue'
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'payment_method', 'item_type'], name='daily_revenue_key'),
+        ]
+    
+    def __str__(self):
+        return f"{self.day} {self.payment_method or '-'} {self.item_type or 'bills'}: {self.amount}"
+
 class Report(models.Model):
     """Report model for managing hospital reports"""
     REPORT_TYPE_CHOICES = [
@@ -273,7 +362,9 @@ class Report(models.Model):
     report_date = models.DateField()
     period_start = models.DateField(blank=True, null=True)
     period_end = models.DateField(blank=True, null=True)
-    file_attachment = models.FileField(upload_to='reports/', blank=True, null=True)
+    file_attachment = models.FileField(
+        upload_to='reports/', storage=attachment_storage, max_length=255, blank=True, null=True
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -351,10 +442,55 @@ class Room(models.Model):
         ordering = ['room_number']
         verbose_name = 'Room'
         verbose_name_plural = 'Rooms'
+        indexes = [
+            # dashboard available_rooms and room_list status/type filters
+            models.Index(fields=['status', 'room_type'], name='room_status_type_idx'),
+            # DepartmentAdmin room counts per status
+            models.Index(fields=['department', 'status'], name='room_department_status_idx'),
+        ]
     
     def __str__(self):
         return f"Room {self.room_number} - {self.room_type}"
 
+class RoomOccupancy(models.Model):
+    """One patient's stay in one bed of a room; end is null while it lasts.
+    
+    duration is filled in when the stay ends. Its index makes the longest
+    stay a single lookup, which bounds how far back point-in-time queries
+    have to look (see Hospital.occupancy).
+    """
+    room = models.ForeignKey(Room, on_delete=models.CASCADE, related_name='occupancies')
+    bed = models.PositiveIntegerField(default=1)
+    patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='room_stays')
+    start = models.DateTimeField()
+    end = models.DateTimeField(blank=True, null=True)
+    duration = models.DurationField(blank=True, null=True)
+    
+    class Meta:
+        ordering = ['-start']
+        verbose_name = 'Room Occupancy'
+        verbose_name_plural = 'Room Occupancies'
+        constraints = [
+            # Also the index the bed board counts a room's open stays with
+            models.UniqueConstraint(fields=['room', 'bed'], condition=models.Q(end__isnull=True), name='occupancy_open_bed_unique'),
+            models.UniqueConstraint(fields=['patient'], condition=models.Q(end__isnull=True), name='occupancy_open_patient_unique'),
+        ]
+        indexes = [
+            # Closed stays that began in a window: start BETWEEN t - longest AND t
+            models.Index(fields=['start'], name='occupancy_start_idx'),
+            # Stays still open that began by t: end IS NULL AND start <= t
+            models.Index(fields=['end', 'start'], name='occupancy_end_start_idx'),
+            models.Index(fields=['duration'], name='occupancy_duration_idx'),
+            models.Index(fields=['patient', '-start'], name='occupancy_patient_idx'),
+        ]
+    
+    def save(self, *args, **kwargs):
+        self.duration = self.end - self.start if self.end else None
+        super().save(*args, **kwargs)
+    
+    def __str__(self):
+        return f"Room {self.room.room_number} bed {self.bed}: {self.patient.name} from {self.start:%Y-%m-%d %H:%M}"
+
 class MedicalRecord(models.Model):
     """Medical record model for patient medical history"""
     patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='medical_records')
@@ -366,7 +502,9 @@ class MedicalRecord(models.Model):
     prescription = models.TextField(blank=True)
     follow_up_date = models.DateField(blank=True, null=True)
     notes = models.TextField(blank=True)
-    attachments = models.FileField(upload_to='medical_records/', blank=True, null=True)
+    attachments = models.FileField(
+        upload_to='medical_records/', storage=attachment_storage, max_length=255, blank=True, null=True
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -374,6 +512,78 @@ class MedicalRecord(models.Model):
         ordering = ['-visit_date']
         verbose_name = 'Medical Record'
         verbose_name_plural = 'Medical Records'
+        indexes = [
+            # patient_detail / medical_record_list: a patient's records, newest first
+            models.Index(fields=['patient', '-visit_date'], name='record_patient_visit_idx'),
+            models.Index(fields=['doctor', '-visit_date'], name='record_doctor_visit_idx'),
+            models.Index(fields=['follow_up_date'], condition=models.Q(follow_up_date__isnull=False), name='record_follow_up_idx'),
+        ]
     
     def __str__(self):
-        return f"{self.patient.name} - {self.visit_date.date()}"
\ No newline at end of file
+        return f"{self.patient.name} - {self.visit_date.date()}"
+
+
+# Archive tables: rows moved out of the hot tables by Hospital.archive
+
+
+def archive_model(model, name, archived_parents=None, indexes=()):
+    """A table with ``model``'s columns, for the rows archived out of it.
+    
+    Rows keep their ids. A foreign key to a model in ``archived_parents``
+    points at that model's archive (the rows always move together); every
+    other one holds the id without a database constraint, since its target
+    may be hot or archived by now. Built from the hot model's fields, so a
+    column added there reaches the archive with the next makemigrations.
+    """
+    archived_parents = archived_parents or {}
+    attrs = {'__module__': __name__}
+    for field in model._meta.concrete_fields:
+        if field.primary_key:
+            attrs[field.name] = models.BigIntegerField(primary_key=True)
+        elif field.is_relation:
+            # Built by hand: deconstructing a relation needs the app registry
+            parent = archived_parents.get(field.remote_field.model)
+            if parent is not None:
+                attrs[field.name] = models.ForeignKey(parent, on_delete=models.CASCADE, related_name='items')
+            else:
+                attrs[field.name] = models.ForeignKey(
+                    field.remote_field.model, on_delete=models.DO_NOTHING, db_constraint=False,
+                    related_name='+', null=field.null, blank=field.blank,
+                )
+        else:
+            field_name, path, args, kwargs = field.deconstruct()
+            kwargs.pop('validators', None)
+            attrs[field.name] = type(field)(*args, **kwargs)
+    attrs['Meta'] = type('Meta', (), {
+        'ordering': model._meta.ordering,
+        'verbose_name': f'Archived {model._meta.verbose_name.lower()}',
+        'verbose_name_plural': f'Archived {model._meta.verbose_name_plural.lower()}',
+        'indexes': list(indexes),
+    })
+    archived = type(name, (models.Model,), attrs)
+    archived.hot_model = model
+    model.archive_model = archived
+    return archived
+
+
+ArchivedPatient = archive_model(Patient, 'ArchivedPatient', indexes=[
+    models.Index(fields=['discharge_date'], name='archived_patient_discharge_idx'),
+])
+ArchivedAppointment = archive_model(Appointment, 'ArchivedAppointment', indexes=[
+    models.Index(fields=['patient', 'appointment_date'], name='archived_appt_patient_idx'),
+    models.Index(fields=['doctor', 'appointment_date'], name='archived_appt_doctor_idx'),
+])
+ArchivedBill = archive_model(Bill, 'ArchivedBill', indexes=[
+    models.Index(fields=['patient', '-bill_date'], name='archived_bill_patient_idx'),
+    models.Index(fields=['status', 'bill_date'], name='archived_bill_status_idx'),
+])
+ArchivedBillItem = archive_model(BillItem, 'ArchivedBillItem', archived_parents={Bill: ArchivedBill})
+ArchivedMedicalRecord = archive_model(MedicalRecord, 'ArchivedMedicalRecord', indexes=[
+    models.Index(fields=['patient', '-visit_date'], name='archived_record_patient_idx'),
+])
+ArchivedRoomOccupancy = archive_model(RoomOccupancy, 'ArchivedRoomOccupancy', indexes=[
+    models.Index(fields=['patient', '-start'], name='archived_stay_patient_idx'),
+    # Point-in-time occupancy reads archived stays too (Hospital.occupancy)
+    models.Index(fields=['start'], name='archived_stay_start_idx'),
+    models.Index(fields=['duration'], name='archived_stay_duration_idx'),
+])
@@ -0,0 +1,254 @@
+"""Bed occupancy history and the bed board.
+
+Every stay is a RoomOccupancy interval [start, end) in one bed of a room;
+open stays have no end. Room.status and Room.current_patient are kept in
+step with the intervals by assign_bed() and release_bed(), so existing
+screens keep working while the history accumulates. The admin changes a
+room's patient through change_current_patient() and re-derives the rest
+with sync_room(), so no write path bypasses the intervals.
+
+"Who was in a bed at T" never scans the history: an open stay must have
+started by T, and a closed stay covering T must have started no earlier than
+T minus the longest stay on record (a single lookup on the duration index),
+so both halves are range seeks on the start indexes.
+
+Stays moved to ArchivedRoomOccupancy with their patients (Hospital.archive)
+are part of the history: the longest stay, the point-in-time queries and
+utilization read both tables. Archived stays are always closed.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import router, transaction
+from django.db.models import Count, IntegerField, Max, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import ArchivedPatient, ArchivedRoomOccupancy, Room, RoomOccupancy
+
+# Rooms whose beds cannot be given out, whoever is (or is not) in them
+OUT_OF_SERVICE_STATUSES = ['maintenance', 'reserved']
+
+
+def open_stays():
+    return RoomOccupancy.objects.filter(end__isnull=True)
+
+
+def open_bed_count():
+    """Subquery: number of open stays in the outer Room"""
+    return Coalesce(
+        Subquery(
+            open_stays().filter(room=OuterRef('pk')).order_by().values('room')
+            .annotate(count=Count('id')).values('count'),
+            output_field=IntegerField(),
+        ),
+        Value(0),
+    )
+
+
+def sync_room(room, using=None):
+    """Room.status/current_patient from the room's open stays"""
+    using = using or router.db_for_write(RoomOccupancy)
+    stays = list(
+        RoomOccupancy.objects.using(using).filter(room=room, end__isnull=True)
+        .order_by('-start', '-id').values_list('patient_id', flat=True)
+    )
+    room.current_patient_id = stays[0] if stays else None
+    if room.status not in OUT_OF_SERVICE_STATUSES:
+        room.status = 'occupied' if len(stays) >= room.capacity else 'available'
+    room.save(update_fields=['current_patient', 'status', 'updated_at'])
+
+
+def assign_bed(room, patient, bed=None, start=None):
+    """Open a stay for ``patient`` in ``bed`` (the lowest free one by
+    default) of ``room``; raises ValueError if that cannot be done"""
+    using = router.db_for_write(RoomOccupancy)
+    start = start or timezone.now()
+    with transaction.atomic(using=using):
+        # Serialises concurrent assignments to the same room
+        room = Room.objects.using(using).select_for_update().get(pk=room.pk)
+        if room.status in OUT_OF_SERVICE_STATUSES:
+            raise ValueError(f'Room {room.room_number} is {room.get_status_display().lower()}')
+        if RoomOccupancy.objects.using(using).filter(patient=patient, end__isnull=True).exists():
+            raise ValueError(f'{patient.name} already has a bed; release it first')
+        taken = set(
+            RoomOccupancy.objects.using(using).filter(room=room, end__isnull=True).values_list('bed', flat=True)
+        )
+        free = [number for number in range(1, room.capacity + 1) if number not in taken]
+        if bed is None:
+            if not free:
+                raise ValueError(f'Room {room.room_number} has no free bed')
+            bed = free[0]
+        elif bed not in free:
+            raise ValueError(f'Bed {bed} of room {room.room_number} is not free')
+        stay = RoomOccupancy.objects.using(using).create(room=room, bed=bed, patient=patient, start=start)
+        sync_room(room, using)
+    return stay
+
+
+def release_bed(stay, end=None):
+    """Close an open stay at ``end`` (now by default)"""
+    using = router.db_for_write(RoomOccupancy)
+    end = end or timezone.now()
+    if stay.end is not None:
+        raise ValueError('This stay has already ended')
+    if end < stay.start:
+        raise ValueError('A stay cannot end before it starts')
+    with transaction.atomic(using=using):
+        room = Room.objects.using(using).select_for_update().get(pk=stay.room_id)
+        stay.end = end
+        stay.save(update_fields=['end', 'duration'])
+        sync_room(room, using)
+    return stay
+
+
+def change_current_patient(room, patient, at=None):
+    """Make ``patient`` (None: nobody) the patient of ``room`` as of ``at``.
+    
+    The stay of the room's current patient ends. A patient in another
+    room is moved: that stay ends and one opens here. Raises ValueError
+    when assign_bed() does.
+    """
+    using = router.db_for_write(RoomOccupancy)
+    at = at or timezone.now()
+    with transaction.atomic(using=using):
+        current = (
+            Room.objects.using(using).select_for_update().filter(pk=room.pk)
+            .values_list('current_patient_id', flat=True).get()
+        )
+        patient_id = getattr(patient, 'pk', None)
+        if current is not None and current != patient_id:
+            for stay in open_stays().using(using).filter(room=room, patient_id=current):
+                release_bed(stay, at)
+        if patient is None:
+            sync_room(room, using)
+            return None
+        stays = list(open_stays().using(using).filter(patient=patient))
+        if any(stay.room_id == room.pk for stay in stays):
+            sync_room(room, using)
+            return None
+        for stay in stays:
+            release_bed(stay, at)
+        return assign_bed(room, patient, start=at)
+
+
+def longest_stay():
+    """Duration of the longest closed stay, hot or archived, from the end of
+    the duration indexes"""
+    return max(
+        model.objects.aggregate(longest=Max('duration'))['longest'] or timedelta(0)
+        for model in (RoomOccupancy, ArchivedRoomOccupancy)
+    )
+
+
+def stays_overlapping(start, end, archived=False):
+    """Stays that were open at some point of [start, end); start == end
+    asks for the stays open at that instant. ``archived`` reads
+    ArchivedRoomOccupancy instead.
+    
+    Each branch of the OR is bounded on start, so the database answers it
+    with a seek on the open-stay or the start index.
+    """
+    earliest = start - longest_stay()
+    started = 'start__lte' if start == end else 'start__lt'
+    closed = Q(start__gte=earliest, end__gt=start, **{started: end})
+    if archived:
+        return ArchivedRoomOccupancy.objects.filter(closed)
+    return RoomOccupancy.objects.filter(Q(end__isnull=True, **{started: end}) | closed)
+
+
+def occupancy_at(at, archived=False):
+    """Stays open at the instant ``at``"""
+    return stays_overlapping(at, at, archived)
+
+
+def occupants_at(at):
+    """(stay, patient name) for every stay open at ``at``, archived ones
+    included, by room number, bed and start"""
+    occupants = [(stay, stay.patient.name) for stay in occupancy_at(at).select_related('room', 'patient')]
+    archived = list(occupancy_at(at, archived=True).select_related('room'))
+    if archived:
+        # The patient of an archived stay was archived with it
+        names = dict(
+            ArchivedPatient.objects.filter(pk__in={stay.patient_id for stay in archived}).values_list('pk', 'name')
+        )
+        occupants += [(stay, names.get(stay.patient_id, '')) for stay in archived]
+    return sorted(occupants, key=lambda occupant: (occupant[0].room.room_number, occupant[0].bed, occupant[0].start))
+
+
+def utilization(start, end, rooms=None):
+    """Occupied bed-hours over [start, end) against the beds of ``rooms``
+    (all rooms by default), per floor and overall"""
+    rooms = Room.objects.all() if rooms is None else rooms
+    beds = dict(rooms.order_by().values_list('floor').annotate(beds=Sum('capacity')))
+    hours = (end - start).total_seconds() / 3600
+    occupied = defaultdict(float)
+    for archived in (False, True):
+        stays = (
+            stays_overlapping(start, end, archived).filter(room__in=rooms)
+            .values_list('room__floor', 'start', 'end')
+        )
+        for floor, stay_start, stay_end in stays:
+            overlap = min(stay_end or end, end) - max(stay_start, start)
+            occupied[floor] += max(overlap.total_seconds(), 0) / 3600
+    
+    def figures(bed_count, bed_hours):
+        available = bed_count * hours
+        return {
+            'beds': bed_count,
+            'occupied_bed_hours': round(bed_hours, 2),
+            'available_bed_hours': round(available, 2),
+            'rate': round(bed_hours / available, 4) if available else None,
+        }
+    
+    result = figures(sum(beds.values()), sum(occupied.values()))
+    result['by_floor'] = {floor: figures(beds[floor], occupied[floor]) for floor in sorted(beds)}
+    return result
+
+
+def bed_board():
+    """Beds, occupied and free beds per (floor, department), rolled up per
+    floor and per department, from one grouped query over the rooms"""
+    rows = (
+        Room.objects.annotate(occupied_beds=open_bed_count())
+        .order_by().values('floor', 'department_id', 'department__name')
+        .annotate(
+            rooms=Count('id'),
+            beds=Sum('capacity'),
+            occupied=Sum('occupied_beds'),
+            out_of_service=Coalesce(Sum('capacity', filter=Q(status__in=OUT_OF_SERVICE_STATUSES)), Value(0)),
+            occupied_out_of_service=Coalesce(
+                Sum('occupied_beds', filter=Q(status__in=OUT_OF_SERVICE_STATUSES)), Value(0)
+            ),
+        )
+        .order_by('floor', 'department__name')
+    )
+    
+    def empty():
+        return {'rooms': 0, 'beds': 0, 'occupied': 0, 'out_of_service': 0, 'available': 0}
+    
+    cells = []
+    floors = defaultdict(empty)
+    departments = defaultdict(empty)
+    totals = empty()
+    for row in rows:
+        # Patients still in a room taken out of service hold their bed, so
+        # it is not counted twice
+        cell = {
+            'rooms': row['rooms'],
+            'beds': row['beds'],
+            'occupied': row['occupied'],
+            'out_of_service': row['out_of_service'] - row['occupied_out_of_service'],
+        }
+        cell['available'] = max(cell['beds'] - cell['occupied'] - cell['out_of_service'], 0)
+        department = row['department__name'] or 'Unassigned'
+        for bucket in (floors[row['floor']], departments[department], totals):
+            for key, value in cell.items():
+                bucket[key] += value
+        cells.append({'floor': row['floor'], 'department_id': row['department_id'], 'department': department, **cell})
+    return {
+        'totals': totals,
+        'by_floor': dict(sorted(floors.items())),
+        'by_department': dict(sorted(departments.items())),
+        'cells': cells,
+    }
@@ -0,0 +1,108 @@
+"""Whole-page caching of the doctor, department and room pages.
+
+A page is stored under the versions of what it shows: the counter of its
+own row (object_dependency) and the counters of the tables it lists. Saving
+a row bumps its own counter and those of the pages it appears on (see
+PAGE_OBJECTS), so only the pages that show the change are rebuilt.
+
+Only anonymous-looking responses are stored: a GET that carries no pending
+flash messages and whose view left no per-client state behind (no cookie,
+no session access, no CSRF token). Anything else is served uncached.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.cache import cache
+
+from .caching import DEFAULT_TIMEOUT, get_stats, model_dependency, object_dependency, versioned_key
+from .models import Appointment, Department, Doctor, Patient, Room, RoomOccupancy
+from .routers import primary_reads
+
+# The rows whose pages show a saved or deleted instance: {model: instance -> [(model, pk)]}.
+# Only the current parent is bumped; moving a row to another parent is rare
+# enough that the old parent's page may wait for its next bump.
+PAGE_OBJECTS = {
+    Doctor: lambda doctor: [(Doctor, doctor.pk)],
+    Department: lambda department: [(Department, department.pk)],
+    Room: lambda room: [(Room, room.pk), (Department, room.department_id)],
+    Appointment: lambda appointment: [(Doctor, appointment.doctor_id)],
+    RoomOccupancy: lambda stay: [(Room, stay.room_id)],
+}
+
+
+def page_object_dependencies(instance):
+    """Object dependencies to bump when ``instance`` changes"""
+    return [
+        object_dependency(model, pk)
+        for model, pk in PAGE_OBJECTS.get(type(instance), lambda instance: [])(instance)
+        if pk is not None
+    ]
+
+
+def cacheable(request, response):
+    if response.status_code != 200 or response.streaming or response.cookies:
+        return False
+    # The page would hand one client's token or session state to another
+    if request.META.get('CSRF_COOKIE_NEEDS_UPDATE'):
+        return False
+    session = getattr(request, 'session', None)
+    return session is None or not session.accessed
+
+
+def cached_page(dependencies, timeout=DEFAULT_TIMEOUT):
+    """Serve a view's GET responses from the versioned cache.
+    
+    ``dependencies(**kwargs)`` lists what the page for those URL arguments
+    shows; the path and query string are part of the key.
+    """
+    def decorator(view):
+        name = f'page:{view.__name__}'
+        
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or CookieStorage.cookie_name in request.COOKIES:
+                return view(request, *args, **kwargs)
+            stats = get_stats(name)
+            key = versioned_key(
+                name, dependencies(**kwargs), hashlib.sha1(request.get_full_path().encode()).hexdigest()
+            )
+            response = cache.get(key)
+            if response is not None:
+                stats.record_hit()
+                return response
+            started = time.perf_counter()
+            # Never from a lagging replica: the page is stored under the current version
+            with primary_reads():
+                response = view(request, *args, **kwargs)
+            if cacheable(request, response):
+                stats.record_rebuild(time.perf_counter() - started)
+                cache.set(key, response, timeout)
+            return response
+        
+        wrapper.page_dependencies = dependencies
+        return wrapper
+    return decorator
+
+
+# Pages that name or count patients depend on the whole patient table
+
+def doctor_list_dependencies():
+    return [model_dependency(Doctor), model_dependency(Patient)]
+
+
+def doctor_detail_dependencies(doctor_id):
+    return [object_dependency(Doctor, doctor_id), model_dependency(Patient)]
+
+
+def department_list_dependencies():
+    return [model_dependency(Department), model_dependency(Doctor)]
+
+
+def department_detail_dependencies(department_id):
+    return [object_dependency(Department, department_id), model_dependency(Doctor), model_dependency(Patient)]
+
+
+def room_detail_dependencies(room_id):
+    return [object_dependency(Room, room_id), model_dependency(Department), model_dependency(Patient)]
@@ -0,0 +1,153 @@
+"""Keyset (cursor) pagination for the list views.
+
+Paginator runs COUNT(*) and then OFFSET n, so every page costs more than the
+one before it. A cursor instead remembers the ordering values of the last row
+shown and asks for the rows after it, which the composite indexes on
+(-admitted_date, id), (appointment_date, appointment_time, id) and
+(-bill_date, id) answer with an index seek; page 500 costs what page 1 does.
+
+Cursors are signed, so they are opaque to the browser and cannot be edited
+into arbitrary filters. A bad or stale cursor just shows the first page.
+"""
+import hashlib
+from datetime import date, datetime, time
+
+from django.core import signing
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+from .caching import get_or_build, model_dependency
+
+CURSOR_SALT = 'hospital.pagination'
+
+
+def ordering_fields(queryset):
+    """[(field name, descending), ...] for the queryset's ordering, with the
+    primary key appended as the tiebreaker that makes every key unique"""
+    model = queryset.model
+    ordering = queryset.query.order_by or model._meta.ordering
+    fields = []
+    for name in ordering:
+        descending = name.startswith('-')
+        name = name.lstrip('-')
+        if name == 'pk':
+            name = model._meta.pk.name
+        if '__' in name or model._meta.get_field(name).null:
+            raise ValueError(f'Cannot paginate {model.__name__} by a cursor on {name!r}')
+        fields.append((name, descending))
+    if model._meta.pk.name not in [name for name, _ in fields]:
+        fields.append((model._meta.pk.name, False))
+    return fields
+
+
+def _encode(value):
+    if isinstance(value, (date, datetime, time)):
+        return value.isoformat()
+    return value
+
+
+class CursorPage:
+    """One page of results; iterates like a Paginator page"""
+    
+    def __init__(self, object_list, next_cursor, previous_cursor, estimated_count=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.estimated_count = estimated_count
+    
+    def __iter__(self):
+        return iter(self.object_list)
+    
+    def __len__(self):
+        return len(self.object_list)
+    
+    def has_next(self):
+        return self.next_cursor is not None
+    
+    def has_previous(self):
+        return self.previous_cursor is not None
+    
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """Page through ``queryset`` in its own ordering (Meta.ordering by default).
+    
+    With ``estimate_count`` the page also carries the total, counted once and
+    cached until the model changes, instead of a COUNT(*) per request.
+    """
+    
+    def __init__(self, queryset, per_page, estimate_count=False):
+        self.fields = ordering_fields(queryset)
+        self.queryset = queryset.order_by(*self._order_by(reverse=False))
+        self.per_page = per_page
+        self.estimate_count = estimate_count
+    
+    def _order_by(self, reverse):
+        return [('-' if descending != reverse else '') + name for name, descending in self.fields]
+    
+    def _key(self, obj):
+        return [_encode(getattr(obj, name)) for name, _ in self.fields]
+    
+    def make_cursor(self, obj, direction):
+        return signing.dumps({'d': direction, 'k': self._key(obj)}, salt=CURSOR_SALT, compress=True)
+    
+    def _after(self, values, reverse):
+        """Rows strictly after ``values`` in the (possibly reversed) ordering.
+        
+        The leading field is also bounded on its own, so the database can seek
+        the index instead of filtering an ordered scan.
+        """
+        condition = Q()
+        equal = Q()
+        for (name, descending), value in zip(self.fields, values):
+            lookup = 'lt' if descending != reverse else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        name, descending = self.fields[0]
+        bound = Q(**{f"{name}__{'lte' if descending != reverse else 'gte'}": values[0]})
+        return bound & condition
+    
+    def decode(self, cursor):
+        """(direction, key values) of a cursor, or None if it is not valid"""
+        try:
+            data = signing.loads(cursor, salt=CURSOR_SALT)
+            direction, raw = data['d'], data['k']
+            if direction not in ('n', 'p') or len(raw) != len(self.fields):
+                return None
+            opts = self.queryset.model._meta
+            return direction, [opts.get_field(name).to_python(value) for (name, _), value in zip(self.fields, raw)]
+        except (signing.BadSignature, ValidationError, KeyError, TypeError, ValueError):
+            return None
+    
+    def count(self):
+        sql, params = self.queryset.query.sql_with_params()
+        digest = hashlib.sha1(f'{sql}|{params}'.encode()).hexdigest()
+        model = self.queryset.model
+        return get_or_build('list_count', [model_dependency(model)], self.queryset.count, digest)
+    
+    def get_page(self, cursor=None):
+        decoded = self.decode(cursor) if cursor else None
+        if decoded is None:
+            direction, queryset = 'n', self.queryset
+        else:
+            direction, values = decoded
+            reverse = direction == 'p'
+            queryset = self.queryset.filter(self._after(values, reverse))
+            if reverse:
+                queryset = queryset.order_by(*self._order_by(reverse=True))
+        
+        rows = list(queryset[:self.per_page + 1])
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if direction == 'p':
+            rows.reverse()
+        
+        if direction == 'n':
+            has_next, has_previous = more, decoded is not None
+        else:
+            has_next, has_previous = True, more
+        next_cursor = self.make_cursor(rows[-1], 'n') if rows and has_next else None
+        previous_cursor = self.make_cursor(rows[0], 'p') if rows and has_previous else None
+        return CursorPage(rows, next_cursor, previous_cursor, self.count() if self.estimate_count else None)
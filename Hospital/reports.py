@@ -0,0 +1,291 @@
+"""Batch generators for the doctor_performance, department_stats,
+patient_summary and monthly report types.
+
+Per-doctor and per-department figures are computed for a chunk of ids at a
+time with grouped aggregate queries (a handful of queries per chunk, never
+one per doctor), and the chunks are spread over a process pool. The period
+wide reports are a few aggregates each and run in the calling process.
+
+Every figure over a period reads the archive tables as well as the hot ones:
+Hospital.archive moves old appointments, bills and discharged patients out
+with their dates and statuses unchanged.
+"""
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+
+import django
+from django.db import connections
+from django.db.models import Avg, Count, F, OuterRef, Q, Subquery, Sum
+from django.utils import timezone
+
+from .models import (
+    Appointment, ArchivedAppointment, ArchivedBill, ArchivedPatient, Bill, Department, Doctor, Patient, Report, Room,
+)
+from .revenue import revenue_summary, summary_json
+
+REPORT_TYPES = ['doctor_performance', 'department_stats', 'patient_summary', 'monthly']
+BILLED_STATUSES = ['paid', 'unpaid', 'partially_paid', 'overdue']
+DEFAULT_CHUNK_SIZE = 50
+
+
+def _rate(part, whole):
+    return round(part / whole, 4) if whole else None
+
+
+def billed_revenue(doctor_ids, start, end):
+    """(doctor id, amount) pairs for the bills dated start..end, hot and
+    archived; a doctor may appear more than once.
+    
+    Bills carry no doctor; they are credited to the patient's assigned doctor.
+    An archived bill's patient may be hot (bills archived on their own) or
+    archived with it.
+    """
+    for model in (Bill, ArchivedBill):
+        bills = model.objects.filter(bill_date__range=(start, end), status__in=BILLED_STATUSES).order_by()
+        yield from (
+            bills.filter(patient__assigned_doctor_id__in=doctor_ids)
+            .values_list('patient__assigned_doctor_id').annotate(amount=Sum('total_amount'))
+        )
+    archived_doctor = ArchivedPatient.objects.filter(pk=OuterRef('patient_id')).values('assigned_doctor_id')
+    yield from (
+        ArchivedBill.objects.filter(bill_date__range=(start, end), status__in=BILLED_STATUSES).order_by()
+        .annotate(doctor_id=Subquery(archived_doctor)).filter(doctor_id__in=doctor_ids)
+        .values_list('doctor_id').annotate(amount=Sum('total_amount'))
+    )
+
+
+def doctor_performance(doctor_ids, start, end):
+    """{doctor_id: metrics} for appointments and bills dated start..end"""
+    metrics = {
+        doctor_id: {
+            'appointments': 0,
+            'by_status': {},
+            'no_show_rate': None,
+            'avg_duration_minutes': None,
+            'active_patients': 0,
+            'billed_revenue': Decimal('0.00'),
+        }
+        for doctor_id in doctor_ids
+    }
+    durations = defaultdict(int)
+    # Completed and cancelled appointments move to the archive after a while
+    for model in (Appointment, ArchivedAppointment):
+        appointments = model.objects.filter(doctor_id__in=doctor_ids, appointment_date__range=(start, end))
+        for doctor_id, status, count, minutes in (
+            appointments.order_by().values_list('doctor_id', 'status')
+            .annotate(count=Count('id'), minutes=Sum('duration_minutes'))
+        ):
+            by_status = metrics[doctor_id]['by_status']
+            by_status[status] = by_status.get(status, 0) + count
+            metrics[doctor_id]['appointments'] += count
+            durations[doctor_id] += minutes
+    for doctor_id, minutes in durations.items():
+        metrics[doctor_id]['avg_duration_minutes'] = round(minutes / metrics[doctor_id]['appointments'], 1)
+    
+    patients = Patient.objects.filter(assigned_doctor_id__in=doctor_ids, status='active')
+    for doctor_id, count in patients.order_by().values_list('assigned_doctor_id').annotate(count=Count('id')):
+        metrics[doctor_id]['active_patients'] = count
+    
+    for doctor_id, amount in billed_revenue(doctor_ids, start, end):
+        metrics[doctor_id]['billed_revenue'] += amount
+    
+    for values in metrics.values():
+        # Of the appointments that were due, the share nobody turned up for
+        attended = values['by_status'].get('completed', 0)
+        missed = values['by_status'].get('no_show', 0)
+        values['no_show_rate'] = _rate(missed, attended + missed)
+    return metrics
+
+
+def specialty_for(department_name):
+    """Doctor.specialty whose key or label matches a department name, if any"""
+    name = department_name.strip().lower()
+    for key, label in Doctor.SPECIALTY_CHOICES:
+        if name in (key, label.lower()):
+            return key
+    return None
+
+
+def department_stats(department_ids, start, end):
+    """{department_id: metrics}; a department's doctors are its head doctor
+    and the doctors of the matching specialty"""
+    departments = list(Department.objects.filter(id__in=department_ids).values_list('id', 'name', 'head_doctor_id'))
+    specialties = {department_id: specialty_for(name) for department_id, name, _ in departments}
+    by_specialty = defaultdict(list)
+    for doctor_id, specialty in Doctor.objects.filter(
+        specialty__in=[specialty for specialty in specialties.values() if specialty]
+    ).values_list('id', 'specialty'):
+        by_specialty[specialty].append(doctor_id)
+    members = {}
+    for department_id, name, head_doctor_id in departments:
+        doctors = set(by_specialty.get(specialties[department_id], []))
+        if head_doctor_id:
+            doctors.add(head_doctor_id)
+        members[department_id] = doctors
+    performance = doctor_performance(set().union(*members.values()), start, end) if members else {}
+    
+    rooms = defaultdict(dict)
+    for department_id, status, count in (
+        Room.objects.filter(department_id__in=department_ids)
+        .order_by().values_list('department_id', 'status').annotate(count=Count('id'))
+    ):
+        rooms[department_id][status] = count
+    
+    stats = {}
+    for department_id, name, _ in departments:
+        doctors = [performance[doctor_id] for doctor_id in sorted(members[department_id])]
+        by_status = defaultdict(int)
+        for values in doctors:
+            for status, count in values['by_status'].items():
+                by_status[status] += count
+        appointments = sum(by_status.values())
+        weighted = sum(
+            values['avg_duration_minutes'] * values['appointments']
+            for values in doctors if values['avg_duration_minutes'] is not None
+        )
+        room_counts = rooms.get(department_id, {})
+        total_rooms = sum(room_counts.values())
+        stats[department_id] = {
+            'name': name,
+            'doctors': len(doctors),
+            'appointments': appointments,
+            'by_status': dict(by_status),
+            'no_show_rate': _rate(by_status.get('no_show', 0), by_status.get('completed', 0) + by_status.get('no_show', 0)),
+            'avg_duration_minutes': round(weighted / appointments, 1) if appointments else None,
+            'active_patients': sum(values['active_patients'] for values in doctors),
+            'billed_revenue': sum((values['billed_revenue'] for values in doctors), Decimal('0.00')),
+            'rooms': room_counts,
+            'occupancy_rate': _rate(room_counts.get('occupied', 0), total_rooms),
+        }
+    return stats
+
+
+CHUNK_FUNCTIONS = {
+    'doctor_performance': doctor_performance,
+    'department_stats': department_stats,
+}
+
+
+def _init_worker():
+    # Spawned workers start without Django; forked ones must not reuse the
+    # parent's database connections
+    django.setup()
+    for connection in connections.all(initialized_only=True):
+        connection.close()
+
+
+def _run_chunk(kind, ids, start, end):
+    return CHUNK_FUNCTIONS[kind](ids, start, end)
+
+
+def _chunks(ids, size):
+    return [ids[position:position + size] for position in range(0, len(ids), size)]
+
+
+def run_chunked(kind, ids, start, end, workers=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Merge the per-chunk results of ``kind``, using a process pool when
+    there is more than one worker and more than one chunk"""
+    chunks = _chunks(ids, chunk_size)
+    workers = min(workers or os.cpu_count() or 1, len(chunks))
+    results = {}
+    if workers <= 1:
+        for chunk in chunks:
+            results.update(_run_chunk(kind, chunk, start, end))
+        return results
+    # Children open their own connections
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        futures = [pool.submit(_run_chunk, kind, chunk, start, end) for chunk in chunks]
+        for future in futures:
+            results.update(future.result())
+    return results
+
+
+def patient_summary(start, end):
+    admitted, discharged = 0, 0
+    by_gender = defaultdict(int)
+    by_age = {'children': 0, 'adults': 0, 'seniors': 0}
+    stay = timedelta(0)
+    # Discharged patients move to the archive after a while
+    for model in (Patient, ArchivedPatient):
+        rows = model.objects.filter(admitted_date__range=(start, end))
+        for gender, count in rows.order_by().values_list('gender').annotate(count=Count('id')):
+            by_gender[gender] += count
+            admitted += count
+        for group, count in rows.aggregate(
+            children=Count('id', filter=Q(age__lt=18)),
+            adults=Count('id', filter=Q(age__gte=18, age__lt=65)),
+            seniors=Count('id', filter=Q(age__gte=65)),
+        ).items():
+            by_age[group] += count
+        totals = model.objects.filter(discharge_date__range=(start, end)).aggregate(
+            count=Count('id'), average=Avg(F('discharge_date') - F('admitted_date')),
+        )
+        if totals['count']:
+            discharged += totals['count']
+            stay += totals['average'] * totals['count']
+    return {
+        'admitted': admitted,
+        'admitted_by_gender': dict(by_gender),
+        'admitted_by_age': by_age,
+        'discharged': discharged,
+        'avg_stay_days': round(stay.total_seconds() / 86400 / discharged, 1) if discharged else None,
+        'current_by_status': dict(Patient.objects.order_by().values_list('status').annotate(count=Count('id'))),
+    }
+
+
+def monthly(start, end):
+    by_status = defaultdict(int)
+    for model in (Appointment, ArchivedAppointment):
+        appointments = model.objects.filter(appointment_date__range=(start, end))
+        for status, count in appointments.order_by().values_list('status').annotate(count=Count('id')):
+            by_status[status] += count
+    return {
+        'revenue': revenue_summary(start, end),
+        'appointments_by_status': dict(by_status),
+        'patients': patient_summary(start, end),
+    }
+
+
+def _summary_line(kind, content):
+    if kind == 'doctor_performance':
+        appointments = sum(values['appointments'] for values in content.values())
+        return f'{len(content)} doctors, {appointments} appointments'
+    if kind == 'department_stats':
+        return f'{len(content)} departments'
+    if kind == 'patient_summary':
+        return f"Admitted: {content['admitted']}, Discharged: {content['discharged']}"
+    return (
+        f"Total Revenue: ${content['revenue']['total_revenue']}, "
+        f"Appointments: {sum(content['appointments_by_status'].values())}"
+    )
+
+
+def generate_report(kind, start, end, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, generated_by=None):
+    """Compute one report type for start..end and store it as a Report row"""
+    if kind == 'doctor_performance':
+        ids = list(Doctor.objects.filter(is_active=True).order_by('id').values_list('id', flat=True))
+        content = run_chunked(kind, ids, start, end, workers, chunk_size)
+    elif kind == 'department_stats':
+        ids = list(Department.objects.filter(is_active=True).order_by('id').values_list('id', flat=True))
+        content = run_chunked(kind, ids, start, end, workers, chunk_size)
+    elif kind == 'patient_summary':
+        content = patient_summary(start, end)
+    elif kind == 'monthly':
+        content = monthly(start, end)
+    else:
+        raise ValueError(f'No generator for report type {kind!r}')
+    label = dict(Report.REPORT_TYPE_CHOICES)[kind]
+    return Report.objects.create(
+        title=f'{label} ({start} to {end})',
+        report_type=kind,
+        summary=_summary_line(kind, content),
+        detailed_content=summary_json(content),
+        generated_by=generated_by,
+        report_date=timezone.now().date(),
+        period_start=start,
+        period_end=end,
+    )
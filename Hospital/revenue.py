@@ -0,0 +1,148 @@
+"""Daily revenue rollup.
+
+DailyRevenue holds one row per (bill day, payment method) with the paid
+bills of that day, plus one row per (bill day, payment method, item type)
+with their item lines. Bill and BillItem signals re-aggregate the days a
+transaction touched after it commits, each day once (one indexed day of
+bills, not the table) and upserted in place, and backfill_revenue_rollup
+rebuilds any range from history in grouped queries.
+Revenue reports then sum a few rows per day whatever the range.
+"""
+import json
+import threading
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import router, transaction
+from django.db.models import Count, Sum
+
+from .models import ArchivedBill, ArchivedBillItem, Bill, BillItem, DailyRevenue
+
+REVENUE_STATUSES = ['paid']
+KEY_FIELDS = ['day', 'payment_method', 'item_type']
+# using -> days waiting for this thread's transaction to commit
+_pending_days = threading.local()
+
+
+def rollup_rows(start, end, using=None):
+    """Unsaved DailyRevenue rows for bills dated start..end inclusive,
+    hot and archived alike (Hospital.archive keeps bill dates and statuses)"""
+    bills, items = defaultdict(lambda: [0, 0]), defaultdict(lambda: [0, 0, 0])
+    for bill_model, item_model in [(Bill, BillItem), (ArchivedBill, ArchivedBillItem)]:
+        rows = bill_model.objects.using(using).filter(
+            bill_date__range=(start, end), status__in=REVENUE_STATUSES
+        ).order_by().values_list('bill_date', 'payment_method').annotate(
+            bills=Count('id'), amount=Sum('total_amount')
+        )
+        for day, method, count, amount in rows:
+            totals = bills[(day, method)]
+            totals[0] += count
+            totals[1] += amount
+        rows = item_model.objects.using(using).filter(
+            bill__bill_date__range=(start, end), bill__status__in=REVENUE_STATUSES
+        ).order_by().values_list('bill__bill_date', 'bill__payment_method', 'item_type').annotate(
+            bills=Count('bill_id', distinct=True), quantity=Sum('quantity'), amount=Sum('total_price')
+        )
+        for day, method, item_type, count, quantity, amount in rows:
+            totals = items[(day, method, item_type)]
+            totals[0] += count
+            totals[1] += quantity
+            totals[2] += amount
+    return [
+        DailyRevenue(day=day, payment_method=method, item_type='', bill_count=count, amount=amount)
+        for (day, method), (count, amount) in bills.items()
+    ] + [
+        DailyRevenue(
+            day=day, payment_method=method, item_type=item_type,
+            bill_count=count, quantity=quantity, amount=amount,
+        )
+        for (day, method, item_type), (count, quantity, amount) in items.items()
+    ]
+
+
+def rebuild(start, end, using=None):
+    """Replace the rollup rows of start..end with fresh aggregates"""
+    using = using or router.db_for_write(DailyRevenue)
+    with transaction.atomic(using=using):
+        DailyRevenue.objects.using(using).filter(day__range=(start, end)).delete()
+        rows = rollup_rows(start, end, using)
+        DailyRevenue.objects.using(using).bulk_create(rows)
+    return len(rows)
+
+
+def refresh_day(day, using=None):
+    """Bring the rollup rows of ``day`` up to date in place"""
+    using = using or router.db_for_write(DailyRevenue)
+    rollup = DailyRevenue.objects.using(using)
+    with transaction.atomic(using=using):
+        rows = rollup_rows(day, day, using)
+        rollup.bulk_create(
+            rows, update_conflicts=True, unique_fields=KEY_FIELDS, update_fields=['bill_count', 'quantity', 'amount'],
+        )
+        # Rows of a method or category that no longer has paid bills that day
+        keys = {(row.day, row.payment_method, row.item_type) for row in rows}
+        stale = [pk for pk, *key in rollup.filter(day=day).values_list('pk', *KEY_FIELDS) if tuple(key) not in keys]
+        if stale:
+            rollup.filter(pk__in=stale).delete()
+
+
+def refresh_days(days, using=None):
+    """Re-aggregate ``days`` once the current transaction commits, each day
+    once however many changes in the transaction touched it"""
+    using = using or router.db_for_write(DailyRevenue)
+    days = {day for day in days if day is not None}
+    if not days:
+        return
+    pending = vars(_pending_days).setdefault(using, set())
+    pending |= days
+    
+    def run():
+        # The first callback to run takes every day collected so far; the
+        # others find nothing left. One per call, because a callback
+        # registered in a savepoint that rolls back is dropped.
+        days = sorted(pending)
+        pending.clear()
+        for day in days:
+            refresh_day(day, using)
+    
+    transaction.on_commit(run, using=using)
+
+
+def revenue_summary(start, end, using=None):
+    """Totals and per-day, per-category and per-payment-method breakdowns"""
+    rows = DailyRevenue.objects.using(using).filter(day__range=(start, end)).values_list(
+        'day', 'payment_method', 'item_type', 'bill_count', 'quantity', 'amount'
+    )
+    total = Decimal('0.00')
+    bills = 0
+    by_day = defaultdict(Decimal)
+    by_category = defaultdict(Decimal)
+    by_method = defaultdict(Decimal)
+    for day, payment_method, item_type, bill_count, quantity, amount in rows:
+        if item_type:
+            by_category[item_type] += amount
+            continue
+        total += amount
+        bills += bill_count
+        by_day[day.isoformat()] += amount
+        by_method[payment_method or 'unspecified'] += amount
+    return {
+        'total_revenue': total,
+        'total_bills': bills,
+        'by_day': dict(sorted(by_day.items())),
+        'by_category': dict(sorted(by_category.items())),
+        'by_payment_method': dict(sorted(by_method.items())),
+    }
+
+
+def summary_json(summary):
+    return json.dumps(summary, default=str, indent=2)
+
+
+def date_chunks(start, end, days=366):
+    """(first, last) pairs covering start..end, so a backfill commits as it goes"""
+    while start <= end:
+        last = min(end, start + timedelta(days=days - 1))
+        yield start, last
+        start = last + timedelta(days=1)
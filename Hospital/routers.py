@@ -0,0 +1,133 @@
+"""Send request reads to read replicas and every write to the primary.
+
+Replicas are the aliases in settings.REPLICA_DATABASES; with none, everything
+stays on the primary. Only reads made while serving a request go to a
+replica, and only until the request writes something: from then on it reads
+from the primary, and so do the same client's requests for the next
+REPLICA_PIN_SECONDS (a cookie), so a redirect after a POST sees the new
+rows. Reads inside a transaction on the primary stay on the primary.
+
+Views that must not see replica lag are marked with @read_from_primary.
+Cached values are built under primary_reads(), since a value built from a
+lagging replica would be stored under the new version and stay stale.
+
+Replicas are copies made outside Django (replication, or sync_replica for
+a local SQLite copy), so nothing is migrated on them.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PIN_COOKIE = 'hms_primary'
+# Read from the primary whatever the request state
+PRIMARY_APPS = {'sessions'}
+
+_routing = ContextVar('hospital_replica_routing', default=None)
+
+
+class RequestRouting:
+    __slots__ = ('primary', 'wrote')
+    
+    def __init__(self, primary=False):
+        self.primary = primary
+        self.wrote = False
+
+
+def replicas():
+    return getattr(settings, 'REPLICA_DATABASES', [])
+
+
+def read_from_primary(view):
+    """Mark a view whose reads must not lag behind the primary"""
+    view.read_from_primary = True
+    return view
+
+
+@contextmanager
+def primary_reads():
+    """Read from the primary inside the block"""
+    token = _routing.set(RequestRouting(primary=True))
+    try:
+        yield
+    finally:
+        _routing.reset(token)
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        routing = _routing.get()
+        if (
+            routing is None or routing.primary or routing.wrote
+            or model._meta.app_label in PRIMARY_APPS
+            or not replicas()
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas())
+    
+    def db_for_write(self, model, **hints):
+        routing = _routing.get()
+        if routing is not None:
+            routing.wrote = True
+        return DEFAULT_DB_ALIAS
+    
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        databases = {DEFAULT_DB_ALIAS, *replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+    
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in replicas():
+            return False
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    """Track whether the request has written, honour @read_from_primary and
+    the pin cookie, and set the cookie after a write"""
+    sync_capable = True
+    async_capable = True
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+    
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        routing = RequestRouting(primary=PIN_COOKIE in request.COOKIES)
+        token = _routing.set(routing)
+        try:
+            response = self.get_response(request)
+        finally:
+            _routing.reset(token)
+        return self.pin(routing, response)
+    
+    async def __acall__(self, request):
+        routing = RequestRouting(primary=PIN_COOKIE in request.COOKIES)
+        token = _routing.set(routing)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _routing.reset(token)
+        return self.pin(routing, response)
+    
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        routing = _routing.get()
+        if routing is not None and getattr(view_func, 'read_from_primary', False):
+            routing.primary = True
+    
+    def pin(self, routing, response):
+        if routing.wrote and replicas():
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=getattr(settings, 'REPLICA_PIN_SECONDS', 5),
+                httponly=True, samesite='Lax',
+            )
+        return response
@@ -0,0 +1,101 @@
+"""Patient full-text search.
+
+On SQLite the Hospital_patient_fts FTS5 table (migration 0004) indexes
+name, phone, diagnosis and emergency_contact and is kept in sync by
+triggers, so every write path, bulk_create and QuerySet.update included,
+updates it. Every word is a prefix match, so "jo sm" finds "John Smith",
+and autocomplete results are ranked by bm25. Other backends, or SQLite
+builds without FTS5, fall back to icontains: every word must be found in
+one of the fields.
+"""
+import re
+
+from django.db import connections, router
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Patient
+
+FTS_TABLE = 'Hospital_patient_fts'
+SEARCH_FIELDS = ['name', 'phone', 'diagnosis', 'emergency_contact']
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+# Candidates ranked per autocomplete lookup when every word is a single
+# character, newest patients first
+RANK_WINDOW = 500
+
+_available = {}
+
+
+def fts_available(using=None):
+    """Whether the FTS5 table exists on this database (checked once per process)"""
+    using = using or router.db_for_read(Patient)
+    if using not in _available:
+        connection = connections[using]
+        _available[using] = (
+            connection.vendor == 'sqlite'
+            and FTS_TABLE in connection.introspection.table_names()
+        )
+    return _available[using]
+
+
+def match_expression(query):
+    """Turn free text into a safe FTS5 query: every word is a quoted prefix"""
+    return ' '.join(f'"{token}"*' for token in TOKEN_RE.findall(query))
+
+
+def search_patients(query, queryset=None):
+    """Filter ``queryset`` (default: all patients) to the matching patients.
+    
+    The list keeps the queryset's own ordering; the MATCH runs once as an
+    IN subquery, so no per-row LIKE scan and no ranking of every match.
+    """
+    queryset = Patient.objects.all() if queryset is None else queryset
+    match = match_expression(query)
+    if not match:
+        return queryset.none()
+    if not fts_available(queryset.db):
+        condition = Q()
+        for word in TOKEN_RE.findall(query):
+            in_any_field = Q()
+            for field in SEARCH_FIELDS:
+                in_any_field |= Q(**{f'{field}__icontains': word})
+            condition &= in_any_field
+        return queryset.filter(condition)
+    table = connections[queryset.db].ops.quote_name(FTS_TABLE)
+    return queryset.filter(id__in=RawSQL(f'SELECT rowid FROM {table} WHERE {table} MATCH %s', [match]))
+
+
+def top_patient_ids(query, limit=10, using=None):
+    """Ids of the ``limit`` best matches by bm25 (ties: lowest id first),
+    straight from the index.
+    
+    Every match is ranked, except when every word is a single character:
+    such a prefix can match most of the table, so only the newest
+    RANK_WINDOW matches are ranked then.
+    """
+    using = using or router.db_for_read(Patient)
+    match = match_expression(query)
+    if not match:
+        return []
+    if not fts_available(using):
+        return list(search_patients(query, Patient.objects.using(using)).values_list('id', flat=True)[:limit])
+    connection = connections[using]
+    table = connection.ops.quote_name(FTS_TABLE)
+    matches = f'SELECT rowid AS id, rank FROM {table} WHERE {table} MATCH %s'
+    params = [match]
+    if max(len(word) for word in TOKEN_RE.findall(query)) == 1:
+        matches += ' ORDER BY rowid DESC LIMIT %s'
+        params.append(RANK_WINDOW)
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT id FROM ({matches}) ORDER BY rank, id LIMIT %s', params + [limit])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def rebuild_index(using=None):
+    """Re-read every patient into the FTS table and merge its segments"""
+    using = using or router.db_for_write(Patient)
+    connection = connections[using]
+    table = connection.ops.quote_name(FTS_TABLE)
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {table}({table}) VALUES ('rebuild')")
+        cursor.execute(f"INSERT INTO {table}({table}) VALUES ('optimize')")
@@ -0,0 +1,106 @@
+"""Race-free number allocation from counter rows (hi/lo style).
+
+Each worker process reserves a block of numbers with a single atomic
+``UPDATE ... SET last_value = last_value + n`` on the counter row and then
+hands them out from memory, so most allocations cost no query at all and
+concurrent workers never receive the same number. Numbers are monotonic
+within a process and gap tolerant across processes: a block that is not
+used up before a restart is simply skipped.
+
+Inside the caller's transaction the block is reserved all the same (SQLite
+allows no second writer to reserve it on the side), but its spare numbers
+are only used once that transaction has committed.
+"""
+import os
+import threading
+
+from django.conf import settings
+from django.db import IntegrityError, connections, router, transaction
+from django.db.models import F
+
+DEFAULT_BLOCK_SIZE = 20
+
+
+class SequenceAllocator:
+    """Hand out numbers for the counter row ``name``"""
+    
+    def __init__(self, name, block_size=None, initial_value=None):
+        self.name = name
+        self._block_size = block_size
+        # Called to seed a missing counter row, e.g. from existing data
+        self.initial_value = initial_value or (lambda: 0)
+        self.lock = threading.Lock()
+        self.pid = None
+        self.next_value = 0
+        self.last_value = -1
+    
+    @property
+    def block_size(self):
+        if self._block_size is not None:
+            return self._block_size
+        return getattr(settings, 'SEQUENCE_BLOCK_SIZE', DEFAULT_BLOCK_SIZE)
+    
+    def allocate(self, count=1):
+        """Return ``count`` unused numbers in increasing order"""
+        with self.lock:
+            if self.pid != os.getpid():
+                # Never share a block with a forked parent or sibling
+                self.pid = os.getpid()
+                self.reset()
+            values = []
+            while len(values) < count:
+                if self.next_value > self.last_value:
+                    self._refill(count - len(values))
+                take = min(count - len(values), self.last_value - self.next_value + 1)
+                values.extend(range(self.next_value, self.next_value + take))
+                self.next_value += take
+            return values
+    
+    def reset(self):
+        """Drop the numbers held in memory; the next allocation reserves a new block"""
+        self.next_value, self.last_value = 0, -1
+    
+    def next(self):
+        return self.allocate(1)[0]
+    
+    def _refill(self, needed):
+        from .models import Sequence
+        
+        using = router.db_for_write(Sequence)
+        size = max(needed, self.block_size)
+        last = self._reserve(Sequence, using, size)
+        first = last - size + 1
+        if not connections[using].in_atomic_block:
+            self.next_value, self.last_value = first, last
+            return
+        # The reservation commits or rolls back with the caller's transaction.
+        # Only the numbers needed now are handed out before it commits: after
+        # a rollback another process may get the same block. The rest of the
+        # block is kept once the reservation has committed.
+        self.next_value, self.last_value = first, first + needed - 1
+        pid = os.getpid()
+        transaction.on_commit(lambda: self._keep(pid, first + needed - 1, last), using=using)
+    
+    def _keep(self, pid, handed_out, last):
+        with self.lock:
+            # Unless another block was reserved meanwhile; its numbers are higher
+            if self.pid == pid and self.last_value == handed_out:
+                self.last_value = last
+    
+    def _reserve(self, Sequence, using, size):
+        with transaction.atomic(using=using):
+            updated = Sequence.objects.using(using).filter(name=self.name).update(
+                last_value=F('last_value') + size
+            )
+            if not updated:
+                try:
+                    with transaction.atomic(using=using):
+                        Sequence.objects.using(using).create(
+                            name=self.name, last_value=self.initial_value() + size
+                        )
+                except IntegrityError:
+                    # Another worker created the row first
+                    Sequence.objects.using(using).filter(name=self.name).update(
+                        last_value=F('last_value') + size
+                    )
+            return Sequence.objects.using(using).values_list('last_value', flat=True).get(name=self.name)
@@ -0,0 +1,102 @@
+"""Model signal handlers that keep caches and derived data in sync"""
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+
+from . import autocomplete, live, revenue
+from .caching import bump_version, model_dependency
+from .dashboard import DASHBOARD_MODELS
+from .models import Department, Doctor, Patient, Appointment, Bill, BillItem, Room, RoomOccupancy
+from .pages import page_object_dependencies
+
+# Note that QuerySet.update() and bulk_create() do not send these signals;
+# code that writes in bulk must call bump_version() itself.
+VERSIONED_MODELS = [Department, Doctor, Appointment, Bill, Room, RoomOccupancy]
+
+
+def bump_model_version(sender, instance, using, **kwargs):
+    # The table, and the rows whose cached pages show this one
+    dependencies = [model_dependency(sender), *page_object_dependencies(instance)]
+    # After commit, so that no reader can cache the old rows under the new version
+    transaction.on_commit(lambda: bump_version(*dependencies), using=using)
+
+
+def patient_changed(patient_id, record, using):
+    def apply():
+        versions = bump_version(autocomplete.DEPENDENCY)
+        autocomplete.index.apply(patient_id, record, versions[autocomplete.DEPENDENCY])
+    transaction.on_commit(apply, using=using)
+
+
+def bill_changed(sender, instance, using, **kwargs):
+    revenue.refresh_days([instance.bill_date], using)
+
+
+def bill_item_changed(sender, instance, using, **kwargs):
+    if BillItem._meta.get_field('bill').is_cached(instance):
+        days = [instance.bill.bill_date]
+    else:
+        # The bill may already be gone when its items are cascade-deleted
+        days = Bill.objects.using(using).filter(pk=instance.bill_id).values_list('bill_date', flat=True)
+    revenue.refresh_days(days, using)
+
+
+def appointment_event(instance, action):
+    return {
+        'action': action,
+        'id': instance.pk,
+        'patient_id': instance.patient_id,
+        'doctor_id': instance.doctor_id,
+        'date': instance.appointment_date,
+        'time': instance.appointment_time,
+        'status': instance.status,
+    }
+
+
+def appointment_saved(sender, instance, created, using, **kwargs):
+    live.publish('appointment', appointment_event(instance, 'created' if created else 'updated'), using)
+
+
+def appointment_deleted(sender, instance, using, **kwargs):
+    live.publish('appointment', appointment_event(instance, 'deleted'), using)
+
+
+def room_changed(sender, instance, using, **kwargs):
+    live.publish('room', {
+        'id': instance.pk,
+        'room_number': instance.room_number,
+        'status': instance.status,
+        'current_patient_id': instance.current_patient_id,
+    }, using)
+
+
+def dashboard_changed(sender, using, **kwargs):
+    live.refresh_stats(using)
+
+
+def patient_saved(sender, instance, using, **kwargs):
+    record = (instance.age, *(getattr(instance, field) for field in autocomplete.SEARCH_FIELDS))
+    patient_changed(instance.pk, record, using)
+
+
+def patient_deleted(sender, instance, using, **kwargs):
+    patient_changed(instance.pk, None, using)
+
+
+for model in VERSIONED_MODELS:
+    post_save.connect(bump_model_version, sender=model, dispatch_uid=f'version-save-{model.__name__}')
+    post_delete.connect(bump_model_version, sender=model, dispatch_uid=f'version-delete-{model.__name__}')
+
+post_save.connect(patient_saved, sender=Patient, dispatch_uid='version-save-Patient')
+post_delete.connect(patient_deleted, sender=Patient, dispatch_uid='version-delete-Patient')
+
+post_save.connect(bill_changed, sender=Bill, dispatch_uid='revenue-save-Bill')
+post_delete.connect(bill_changed, sender=Bill, dispatch_uid='revenue-delete-Bill')
+post_save.connect(bill_item_changed, sender=BillItem, dispatch_uid='revenue-save-BillItem')
+post_delete.connect(bill_item_changed, sender=BillItem, dispatch_uid='revenue-delete-BillItem')
+
+post_save.connect(appointment_saved, sender=Appointment, dispatch_uid='live-save-Appointment')
+post_delete.connect(appointment_deleted, sender=Appointment, dispatch_uid='live-delete-Appointment')
+post_save.connect(room_changed, sender=Room, dispatch_uid='live-save-Room')
+for model in DASHBOARD_MODELS:
+    post_save.connect(dashboard_changed, sender=model, dispatch_uid=f'live-stats-save-{model.__name__}')
+    post_delete.connect(dashboard_changed, sender=model, dispatch_uid=f'live-stats-delete-{model.__name__}')
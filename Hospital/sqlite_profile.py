@@ -0,0 +1,68 @@
+"""SQLite performance profile, applied to every new connection.
+
+With the default rollback journal a writer locks readers out while it
+commits, and a deferred transaction that reads before it writes fails at
+once with "database is locked" when another connection is writing, however
+long the busy timeout. Migration 0011 switches the file to WAL, so readers
+never block on the writer and the writer never waits for readers; the mode
+is stored in the file, so it is not set again here. SQLITE_PRAGMAS (see
+settings) syncs each commit at checkpoints rather than every time, and sets
+the page cache, memory map and lock wait. OPTIONS['transaction_mode'] =
+'IMMEDIATE' takes the write lock at BEGIN, so writers queue on the busy
+timeout instead of failing on the upgrade.
+
+These pragmas last for the connection, which CONN_MAX_AGE keeps open across
+requests.
+"""
+import re
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+
+PRAGMA_NAME = re.compile(r'^[a-z_]+$')
+PRAGMA_VALUE = re.compile(r'^-?\w+$')
+
+
+def pragma_statements(pragmas):
+    statements = []
+    for name, value in pragmas.items():
+        if not PRAGMA_NAME.match(name) or not PRAGMA_VALUE.match(str(value)):
+            raise ValueError(f'Invalid SQLite pragma {name} = {value!r}')
+        if name == 'journal_mode':
+            raise ValueError('journal_mode is stored in the database file; use set_journal_mode')
+        statements.append(f'PRAGMA {name} = {value}')
+    return statements
+
+
+def apply_pragmas(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', {})
+    if not pragmas:
+        return
+    with connection.cursor() as cursor:
+        for statement in pragma_statements(pragmas):
+            cursor.execute(statement)
+
+
+def set_journal_mode(connection, mode):
+    """Switch the database file to ``mode``, outside any transaction; returns
+    the mode SQLite reports"""
+    if not PRAGMA_VALUE.match(mode):
+        raise ValueError(f'Invalid SQLite journal mode {mode!r}')
+    with connection.cursor() as cursor:
+        cursor.execute(f'PRAGMA journal_mode = {mode}')
+        return cursor.fetchone()[0]
+
+
+def current_pragmas(connection, names):
+    """{name: value} as the connection reports them"""
+    values = {}
+    with connection.cursor() as cursor:
+        for name in names:
+            cursor.execute(f'PRAGMA {name}')
+            values[name] = cursor.fetchone()[0]
+    return values
+
+
+connection_created.connect(apply_pragmas, dispatch_uid='sqlite-performance-profile')
@@ -0,0 +1,129 @@
+"""Content-addressed storage for medical record and report attachments.
+
+Each upload is streamed to a temporary file in chunks while it is hashed,
+then moved to blobs/<aa>/<sha256> unless a blob with that digest is already
+stored, in which case the copy is dropped. The name saved on the model is
+blobs/<aa>/<sha256>/<original file name>: it keeps the file name for
+downloads, and every name with the same digest resolves to the one blob.
+
+Blobs are shared, so delete() leaves them alone; prune_attachments removes
+the ones no row refers to any more. Names saved before this storage (e.g.
+medical_records/scan.pdf) are still served from where they are.
+"""
+import hashlib
+import os
+import re
+import tempfile
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage, storages
+from django.core.files.utils import validate_file_name
+
+BLOB_DIRECTORY = 'blobs'
+BLOB_NAME = re.compile(r'^blobs/[0-9a-f]{2}/(?P<digest>[0-9a-f]{64})(?:/[^/]+)?$')
+CHUNK_SIZE = 256 * 1024
+
+
+def attachment_storage():
+    """The storage of attachment fields: STORAGES['attachments']"""
+    return storages['attachments']
+
+
+def digest_of(name):
+    """SHA-256 of a content-addressed name's file; None for other names"""
+    match = BLOB_NAME.match(name or '')
+    return match['digest'] if match else None
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    def blob_name(self, name):
+        digest = digest_of(name)
+        if digest is None:
+            return name
+        return f'{BLOB_DIRECTORY}/{digest[:2]}/{digest}'
+    
+    def path(self, name):
+        return super().path(self.blob_name(name))
+    
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        validate_file_name(name, allow_relative_path=True)
+        digest = self.store(content)
+        prefix = f'{BLOB_DIRECTORY}/{digest[:2]}/{digest}/'
+        root, extension = os.path.splitext(os.path.basename(name))
+        if max_length is not None and len(prefix) + len(root) + len(extension) > max_length:
+            root = root[:max_length - len(prefix) - len(extension)]
+            if not root:
+                raise SuspiciousFileOperation(f'Storage can not find an available filename for "{name}".')
+        name = prefix + root + extension
+        validate_file_name(name, allow_relative_path=True)
+        return name
+    
+    def store(self, content):
+        """Write ``content`` once per distinct content; returns its digest"""
+        temporary_directory = self.make_directory(f'{BLOB_DIRECTORY}/tmp')
+        descriptor, temporary = tempfile.mkstemp(dir=temporary_directory, prefix='upload-')
+        try:
+            sha256 = hashlib.sha256()
+            with os.fdopen(descriptor, 'wb') as output:
+                for chunk in content.chunks(CHUNK_SIZE):
+                    if isinstance(chunk, str):
+                        chunk = chunk.encode()
+                    sha256.update(chunk)
+                    output.write(chunk)
+            digest = sha256.hexdigest()
+            blob = self.path(f'{BLOB_DIRECTORY}/{digest[:2]}/{digest}')
+            if os.path.exists(blob):
+                # Already stored. Touched so that prune_attachments' grace
+                # period covers the row about to refer to it.
+                os.utime(blob)
+                os.remove(temporary)
+            else:
+                self.make_directory(f'{BLOB_DIRECTORY}/{digest[:2]}')
+                if self.file_permissions_mode is not None:
+                    os.chmod(temporary, self.file_permissions_mode)
+                # Atomic: a concurrent upload of the same content writes the same bytes
+                os.replace(temporary, blob)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+        return digest
+    
+    def make_directory(self, name):
+        directory = super().path(name)
+        if self.directory_permissions_mode is not None:
+            umask = os.umask(0o777 & ~self.directory_permissions_mode)
+            try:
+                os.makedirs(directory, self.directory_permissions_mode, exist_ok=True)
+            finally:
+                os.umask(umask)
+        else:
+            os.makedirs(directory, exist_ok=True)
+        return directory
+    
+    def delete(self, name):
+        # Other rows may share the blob; prune_attachments collects it
+        if digest_of(name) is None:
+            super().delete(name)
+    
+    def blobs(self):
+        """(digest, path) of every stored blob"""
+        root = super().path(BLOB_DIRECTORY)
+        if not os.path.isdir(root):
+            return
+        for shard in sorted(os.listdir(root)):
+            if not re.fullmatch(r'[0-9a-f]{2}', shard):
+                continue
+            for digest in sorted(os.listdir(os.path.join(root, shard))):
+                yield digest, os.path.join(root, shard, digest)
+    
+    def temporary_files(self):
+        root = super().path(f'{BLOB_DIRECTORY}/tmp')
+        if os.path.isdir(root):
+            for name in os.listdir(root):
+                yield os.path.join(root, name)
@@ -0,0 +1,79 @@
+"""Status sweeps: unpaid bills past their due date become 'overdue', and
+scheduled appointments that have passed become 'no_show'.
+
+Each sweep is a few UPDATE statements rather than a loop over rows: the
+bounds of the matching primary keys are read once, then one UPDATE per
+``chunk_size`` wide id range. Each UPDATE commits on its own, so no write
+lock is held for long. The conditions are repeated in every UPDATE, so a row
+paid or completed meanwhile is left alone. update() sends no signals, so
+the caches of the changed rows are invalidated here.
+
+An appointment becomes a no-show NO_SHOW_GRACE_MINUTES (settings, default
+60) after it was due to start.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import router, transaction
+from django.db.models import Max, Min, Q
+from django.utils import timezone
+
+from . import live
+from .caching import bump_version, model_dependency, object_dependency
+from .models import Appointment, Bill, Doctor
+
+DEFAULT_CHUNK_SIZE = 10_000
+
+
+def overdue_bills(now):
+    return Bill.objects.filter(status='unpaid', due_date__lt=timezone.localdate(now))
+
+
+def missed_appointments(now):
+    grace = timedelta(minutes=getattr(settings, 'NO_SHOW_GRACE_MINUTES', 60))
+    # Appointment dates and times are local and naive
+    cutoff = timezone.localtime(now) - grace
+    return Appointment.objects.filter(
+        Q(appointment_date__lt=cutoff.date())
+        | Q(appointment_date=cutoff.date(), appointment_time__lte=cutoff.time().replace(tzinfo=None)),
+        status='scheduled',
+    )
+
+
+# kind: (rows to sweep, new status)
+SWEEPS = {
+    'bills': (overdue_bills, 'overdue'),
+    'appointments': (missed_appointments, 'no_show'),
+}
+
+
+def changed_dependencies(queryset):
+    """Cache dependencies of the rows about to change (see pages)"""
+    dependencies = [model_dependency(queryset.model)]
+    if queryset.model is Appointment:
+        doctors = queryset.order_by().values_list('doctor_id', flat=True).distinct()
+        dependencies += [object_dependency(Doctor, pk) for pk in doctors]
+    return dependencies
+
+
+def sweep(kind, now=None, chunk_size=DEFAULT_CHUNK_SIZE, using=None):
+    """Move every row of ``kind`` due for it to its new status; yields the
+    number of rows each UPDATE changed"""
+    rows_to_sweep, status = SWEEPS[kind]
+    now = now or timezone.now()
+    queryset = rows_to_sweep(now)
+    using = using or router.db_for_write(queryset.model)
+    queryset = queryset.using(using)
+    bounds = queryset.order_by().aggregate(first=Min('pk'), last=Max('pk'))
+    if bounds['first'] is None:
+        return
+    for start in range(bounds['first'], bounds['last'] + 1, chunk_size):
+        with transaction.atomic(using=using):
+            chunk = queryset.filter(pk__gte=start, pk__lt=start + chunk_size)
+            dependencies = changed_dependencies(chunk)
+            # update() does not apply auto_now
+            changed = chunk.update(status=status, updated_at=now)
+            if changed:
+                transaction.on_commit(lambda: bump_version(*dependencies), using=using)
+                live.refresh_stats(using)
+        yield changed
@@ -0,0 +1,395 @@
+"""Synthetic, referentially consistent data for benchmarks and load tests"""
+import random
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from .caching import bump_version, model_dependency
+from .models import (
+    Doctor, Patient, Appointment, Bill, BillItem,
+    Department, Room, RoomOccupancy, MedicalRecord
+)
+from .revenue import rebuild as rebuild_revenue
+
+DEFAULT_BATCH_SIZE = 5000
+
+# A large hospital; seed_synthetic --scale shrinks every count in proportion
+FULL_VOLUMES = {
+    'departments': 15,
+    'doctors': 10_000,
+    'patients': 1_000_000,
+    'rooms': 5_000,
+    'appointments': 10_000_000,
+    'bills': 2_000_000,
+    'medical_records': 3_000_000,
+    'room_stays': 1_000_000,
+}
+GENERATED_MODELS = [User, Department, Doctor, Patient, Room, Appointment, Bill, BillItem, MedicalRecord, RoomOccupancy]
+
+# 09:00 - 16:30 in 30 minute steps, the working day used by api_doctor_availability
+SLOT_TIMES = [time(9 + minutes // 60, minutes % 60) for minutes in range(0, 8 * 60, 30)]
+
+FIRST_NAMES = [
+    'James', 'Mary', 'Robert', 'Patricia', 'John', 'Jennifer', 'Michael', 'Linda',
+    'David', 'Elizabeth', 'William', 'Barbara', 'Richard', 'Susan', 'Joseph', 'Jessica',
+    'Thomas', 'Sarah', 'Charles', 'Karen', 'Aarav', 'Priya', 'Sita', 'Ram', 'Utsab',
+]
+LAST_NAMES = [
+    'Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis',
+    'Rodriguez', 'Martinez', 'Hernandez', 'Lopez', 'Wilson', 'Anderson', 'Thomas',
+    'Taylor', 'Moore', 'Shrestha', 'Sharma', 'Adhikari', 'Thapa', 'Karki',
+]
+DIAGNOSES = [
+    'Hypertension', 'Type 2 diabetes', 'Asthma', 'Migraine', 'Pneumonia', 'Fracture',
+    'Gastritis', 'Anemia', 'Bronchitis', 'Arthritis', 'Dermatitis', 'Depression',
+    'Appendicitis', 'Influenza', 'Kidney stones', 'Hypothyroidism',
+]
+DEPARTMENT_NAMES = [
+    'Cardiology', 'Neurology', 'Orthopedics', 'Pediatrics', 'Dermatology', 'Psychiatry',
+    'Oncology', 'Gastroenterology', 'Pulmonology', 'Endocrinology', 'General Medicine',
+    'Emergency', 'Radiology', 'Surgery', 'Intensive Care',
+]
+
+
+def batched(iterable, size):
+    """Yield lists of at most ``size`` items from ``iterable``"""
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+@contextmanager
+def explicit_dates(model, *field_names):
+    """Let bulk_create keep the dates we generate instead of auto_now_add's today"""
+    fields = [model._meta.get_field(name) for name in field_names]
+    saved = [field.auto_now_add for field in fields]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, value in zip(fields, saved):
+            field.auto_now_add = value
+
+
+def _phone(rng):
+    return '+1' + ''.join(rng.choice('0123456789') for _ in range(10))
+
+
+def _name(rng):
+    return f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+
+
+class SyntheticDataGenerator:
+    """Generate hospital data with bulk_create in fixed-size batches.
+    
+    Every ``generate_*`` method returns the number of rows written. Related
+    rows are drawn from the ids generated earlier, so the order of calls
+    matters: departments, doctors, patients, then everything else.
+    """
+    
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE, seed=0, stdout=None, today=None):
+        self.batch_size = batch_size
+        self.rng = random.Random(seed)
+        self.stdout = stdout
+        self.today = today or timezone.now().date()
+        self.department_ids = []
+        self.doctor_ids = []
+        self.doctor_specialties = {}
+        self.patient_ids = []
+    
+    def log(self, message):
+        if self.stdout is not None:
+            self.stdout.write(message)
+    
+    def _insert(self, model, rows, label):
+        written = 0
+        for batch in batched(rows, self.batch_size):
+            with transaction.atomic():
+                model.objects.bulk_create(batch, batch_size=self.batch_size)
+            written += len(batch)
+        self.log(f'  {label}: {written}')
+        return written
+    
+    def generate_departments(self, count):
+        start = Department.objects.count()
+        rows = (
+            Department(
+                name=DEPARTMENT_NAMES[i % len(DEPARTMENT_NAMES)] + ('' if i < len(DEPARTMENT_NAMES) else f' {i}'),
+                location=f'Block {chr(65 + i % 6)}',
+                phone=_phone(self.rng),
+            )
+            for i in range(start, start + count)
+        )
+        written = self._insert(Department, rows, 'departments')
+        self.department_ids = list(Department.objects.values_list('id', flat=True))
+        return written
+    
+    def generate_doctors(self, count):
+        start = Doctor.objects.count()
+        specialties = [choice[0] for choice in Doctor.SPECIALTY_CHOICES]
+        users = (
+            User(username=f'synthetic-doctor-{i}', password='!', first_name='Doctor', last_name=str(i))
+            for i in range(start, start + count)
+        )
+        self._insert(User, users, 'doctor users')
+        user_ids = list(User.objects.filter(
+            username__startswith='synthetic-doctor-', doctor_profile__isnull=True
+        ).values_list('id', flat=True))
+        rows = (
+            Doctor(
+                user_id=user_id,
+                name=_name(self.rng),
+                specialty=specialties[i % len(specialties)],
+                phone=f'+1{9000000000 + start + i}',
+                email=f'doctor{start + i}@hospital.example',
+                license_number=f'LIC-{start + i:07d}',
+                years_of_experience=self.rng.randint(0, 40),
+            )
+            for i, user_id in enumerate(user_ids)
+        )
+        written = self._insert(Doctor, rows, 'doctors')
+        self.doctor_specialties = dict(Doctor.objects.values_list('id', 'specialty'))
+        self.doctor_ids = sorted(self.doctor_specialties)
+        return written
+    
+    def generate_patients(self, count):
+        statuses = ['active'] * 5 + ['discharged'] * 3 + ['admitted', 'emergency']
+        blood_groups = [choice[0] for choice in Patient.BLOOD_GROUP_CHOICES]
+        genders = [choice[0] for choice in Patient.GENDER_CHOICES]
+        rng = self.rng
+        
+        def rows():
+            for _ in range(count):
+                admitted = self.today - timedelta(days=rng.randint(0, 3 * 365))
+                status = rng.choice(statuses)
+                discharged = admitted + timedelta(days=rng.randint(1, 30)) if status == 'discharged' else None
+                yield Patient(
+                    name=_name(rng),
+                    age=rng.randint(0, 95),
+                    gender=rng.choice(genders),
+                    phone=_phone(rng),
+                    address=f'{rng.randint(1, 999)} Main Street',
+                    blood_group=rng.choice(blood_groups),
+                    emergency_contact=_name(rng),
+                    emergency_phone=_phone(rng),
+                    diagnosis=rng.choice(DIAGNOSES),
+                    assigned_doctor_id=rng.choice(self.doctor_ids) if self.doctor_ids else None,
+                    status=status,
+                    admitted_date=admitted,
+                    discharge_date=discharged,
+                )
+        
+        written = self._insert(Patient, rows(), 'patients')
+        self.patient_ids = list(Patient.objects.values_list('id', flat=True))
+        return written
+    
+    def generate_appointments(self, count, days_back=365):
+        """Spread appointments over doctors, days and slots without violating
+        the (doctor, appointment_date, appointment_time) unique constraint"""
+        if not self.doctor_ids or not self.patient_ids:
+            return 0
+        rng = self.rng
+        doctors = self.doctor_ids
+        slots_per_day = len(SLOT_TIMES)
+        types = [choice[0] for choice in Appointment.APPOINTMENT_TYPE_CHOICES]
+        first_day = self.today - timedelta(days=days_back)
+        
+        def rows():
+            for i in range(count):
+                slot = i // len(doctors)
+                day = first_day + timedelta(days=slot // slots_per_day)
+                if day < self.today:
+                    status = rng.choices(['completed', 'cancelled', 'no_show'], [85, 10, 5])[0]
+                else:
+                    status = 'scheduled'
+                yield Appointment(
+                    patient_id=rng.choice(self.patient_ids),
+                    doctor_id=doctors[i % len(doctors)],
+                    appointment_date=day,
+                    appointment_time=SLOT_TIMES[slot % slots_per_day],
+                    appointment_type=rng.choice(types),
+                    duration_minutes=rng.choice([15, 30, 30, 30, 45, 60]),
+                    reason=rng.choice(DIAGNOSES),
+                    status=status,
+                )
+        
+        return self._insert(Appointment, rows(), 'appointments')
+    
+    def generate_bills(self, count, max_items=4, days_back=3 * 365):
+        """Bills with their BillItems; totals are the sum of the items"""
+        if not self.patient_ids:
+            return 0
+        rng = self.rng
+        methods = [choice[0] for choice in Bill.PAYMENT_METHOD_CHOICES]
+        item_types = [choice[0] for choice in BillItem.ITEM_TYPE_CHOICES]
+        start = Bill.objects.count()
+        written = 0
+        items_written = 0
+        with explicit_dates(Bill, 'bill_date'):
+            for offset in range(0, count, self.batch_size):
+                bills = []
+                items = []
+                for i in range(offset, min(count, offset + self.batch_size)):
+                    bill_items = []
+                    for _ in range(rng.randint(1, max_items)):
+                        quantity = rng.randint(1, 5)
+                        unit_price = Decimal(rng.randint(500, 50000)) / 100
+                        bill_items.append(BillItem(
+                            item_type=rng.choice(item_types),
+                            description=rng.choice(DIAGNOSES),
+                            quantity=quantity,
+                            unit_price=unit_price,
+                            total_price=quantity * unit_price,
+                        ))
+                    total = sum(item.total_price for item in bill_items)
+                    bill_date = self.today - timedelta(days=rng.randint(0, days_back))
+                    status = rng.choices(['paid', 'unpaid', 'partially_paid', 'cancelled'], [70, 20, 7, 3])[0]
+                    paid = total if status == 'paid' else (total / 2).quantize(Decimal('0.01')) if status == 'partially_paid' else 0
+                    bills.append(Bill(
+                        patient_id=rng.choice(self.patient_ids),
+                        bill_number=f'SYN-{start + i:09d}',
+                        total_amount=total,
+                        paid_amount=paid,
+                        status=status,
+                        payment_method=rng.choice(methods) if paid else '',
+                        bill_date=bill_date,
+                        due_date=bill_date + timedelta(days=30),
+                        payment_date=bill_date + timedelta(days=rng.randint(0, 30)) if status == 'paid' else None,
+                    ))
+                    items.append(bill_items)
+                with transaction.atomic():
+                    Bill.objects.bulk_create(bills, batch_size=self.batch_size)
+                    for bill, bill_items in zip(bills, items):
+                        for item in bill_items:
+                            item.bill_id = bill.pk
+                    flat_items = [item for bill_items in items for item in bill_items]
+                    BillItem.objects.bulk_create(flat_items, batch_size=self.batch_size)
+                written += len(bills)
+                items_written += len(flat_items)
+        if written:
+            # bulk_create skips the signals that keep the rollup current
+            rebuild_revenue(self.today - timedelta(days=days_back), self.today)
+        self.log(f'  bills: {written} ({items_written} items)')
+        return written
+    
+    def generate_medical_records(self, count, days_back=3 * 365):
+        if not self.patient_ids:
+            return 0
+        rng = self.rng
+        now = timezone.now()
+        
+        def rows():
+            for _ in range(count):
+                diagnosis = rng.choice(DIAGNOSES)
+                yield MedicalRecord(
+                    patient_id=rng.choice(self.patient_ids),
+                    doctor_id=rng.choice(self.doctor_ids) if self.doctor_ids else None,
+                    visit_date=now - timedelta(days=rng.randint(0, days_back), minutes=rng.randint(0, 600)),
+                    symptoms=f'Symptoms consistent with {diagnosis.lower()}',
+                    diagnosis=diagnosis,
+                    treatment='Standard treatment protocol',
+                    follow_up_date=self.today + timedelta(days=rng.randint(1, 60)) if rng.random() < 0.3 else None,
+                )
+        
+        return self._insert(MedicalRecord, rows(), 'medical records')
+    
+    def generate_rooms(self, count):
+        rng = self.rng
+        start = Room.objects.count()
+        room_types = [choice[0] for choice in Room.ROOM_TYPE_CHOICES]
+        occupants = iter(rng.sample(self.patient_ids, min(len(self.patient_ids), count // 2)))
+        
+        def rows():
+            for i in range(start, start + count):
+                status = rng.choices(['available', 'occupied', 'maintenance', 'reserved'], [45, 45, 5, 5])[0]
+                patient_id = next(occupants, None) if status == 'occupied' else None
+                yield Room(
+                    room_number=f'R{i:06d}',
+                    room_type=rng.choice(room_types),
+                    department_id=rng.choice(self.department_ids) if self.department_ids else None,
+                    capacity=rng.choice([1, 1, 2, 4]),
+                    floor=1 + i % 12,
+                    status='occupied' if patient_id else ('available' if status == 'occupied' else status),
+                    daily_rate=Decimal(rng.randint(50, 1500)),
+                    current_patient_id=patient_id,
+                )
+        
+        return self._insert(Room, rows(), 'rooms')
+    
+    def generate_room_stays(self, count, days_back=3 * 365):
+        """Back-to-back closed stays in every bed over the last ``days_back``
+        days, then an open stay for each room's current patient"""
+        rng = self.rng
+        now = timezone.now()
+        beds = [
+            (room_id, bed)
+            for room_id, capacity in Room.objects.values_list('id', 'capacity')
+            for bed in range(1, capacity + 1)
+        ]
+        if not beds or not self.patient_ids:
+            return 0
+        current = dict(Room.objects.filter(current_patient__isnull=False).values_list('id', 'current_patient_id'))
+        
+        def rows():
+            per_bed, extra = divmod(count, len(beds))
+            for position, (room_id, bed) in enumerate(beds):
+                start = now - timedelta(days=days_back)
+                for _ in range(per_bed + (position < extra)):
+                    start += timedelta(hours=rng.randint(0, 72))
+                    duration = timedelta(hours=rng.randint(6, 14 * 24))
+                    if start + duration >= now:
+                        break
+                    yield RoomOccupancy(
+                        room_id=room_id, bed=bed, patient_id=rng.choice(self.patient_ids),
+                        start=start, end=start + duration, duration=duration,
+                    )
+                    start += duration
+                if bed == 1 and room_id in current:
+                    yield RoomOccupancy(
+                        room_id=room_id, bed=1, patient_id=current[room_id],
+                        start=max(start, now - timedelta(days=rng.randint(0, 14))),
+                    )
+        
+        return self._insert(RoomOccupancy, rows(), 'room stays')
+    
+    def appointment_days(self, count):
+        """Days of full diaries that ``count`` appointments take"""
+        per_day = max(len(self.doctor_ids), 1) * len(SLOT_TIMES)
+        return -(-count // per_day)
+    
+    def generate(self, departments=15, doctors=100, patients=10000, appointments=50000,
+                 bills=20000, medical_records=20000, rooms=200, room_stays=20000, appointment_days_back=365):
+        """Generate a whole hospital and return the row counts per model.
+        
+        ``appointment_days_back=None`` puts half of the appointments in the
+        past and books the other half ahead.
+        """
+        started = datetime.now()
+        counts = {
+            'departments': self.generate_departments(departments),
+            'doctors': self.generate_doctors(doctors),
+            'patients': self.generate_patients(patients),
+            'rooms': self.generate_rooms(rooms),
+        }
+        if appointment_days_back is None:
+            appointment_days_back = self.appointment_days(appointments) // 2
+        counts.update({
+            'appointments': self.generate_appointments(appointments, days_back=appointment_days_back),
+            'bills': self.generate_bills(bills),
+            'medical_records': self.generate_medical_records(medical_records),
+            'room_stays': self.generate_room_stays(room_stays),
+        })
+        # bulk_create sends no signals, so nothing else invalidates the caches
+        bump_version(*(model_dependency(model) for model in GENERATED_MODELS))
+        self.log(f'  generated in {(datetime.now() - started).total_seconds():.1f}s')
+        return counts
@@ -0,0 +1,44 @@
+"""{% versioned_cache %}: template fragments in the versioned cache.
+
+    {% load hospital_cache %}
+    {% versioned_cache 'doctor_card' doctor %}...{% endversioned_cache %}
+
+Each argument after the name is a model instance, whose row counter the
+fragment depends on, or a dependency name such as 'Hospital.patient'. The
+fragment is rebuilt only when one of those is bumped, so an unchanged card
+is reused even when the page around it has to be rendered again.
+"""
+from django import template
+from django.db.models import Model
+
+from ..caching import get_or_build, object_dependency
+
+register = template.Library()
+
+
+def dependency_name(value):
+    if isinstance(value, Model):
+        return object_dependency(type(value), value.pk)
+    return str(value)
+
+
+class VersionedCacheNode(template.Node):
+    def __init__(self, nodelist, name, dependencies):
+        self.nodelist = nodelist
+        self.name = name
+        self.dependencies = dependencies
+    
+    def render(self, context):
+        name = self.name.resolve(context)
+        dependencies = [dependency_name(dependency.resolve(context)) for dependency in self.dependencies]
+        return get_or_build(f'fragment:{name}', dependencies, lambda: self.nodelist.render(context))
+
+
+@register.tag('versioned_cache')
+def do_versioned_cache(parser, token):
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' takes a fragment name and at least one dependency")
+    nodelist = parser.parse(('endversioned_cache',))
+    parser.delete_first_token()
+    return VersionedCacheNode(nodelist, parser.compile_filter(bits[1]), [parser.compile_filter(bit) for bit in bits[2:]])
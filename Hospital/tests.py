@@ -1,3 +1,1825 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+from collections.abc import Iterable
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import CommandError, call_command
+from django.core.exceptions import ValidationError
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.template import Context, Template
+from django.db import connection, transaction
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from asgiref.sync import sync_to_async
+
+from .autocomplete import DEPENDENCY as AUTOCOMPLETE_DEPENDENCY, PatientAutocompleteIndex, index as autocomplete_index
+from .archive import PLANS, archive, include_archived
+from .availability import busy_intervals, doctor_availability, first_free_slot, free_slots
+from .billing import create_bill, create_bills
+from .booking import book_series
+from .caching import all_stats, bump_version
+from .dashboard import count_statistics
+from .exports import csv_rows
+from .models import (
+    Doctor, Patient, Appointment, Bill, BillItem, DailyRevenue, Department, MedicalRecord, Report, Room,
+    RoomOccupancy, Sequence, bill_numbers, ArchivedAppointment, ArchivedBill, ArchivedBillItem,
+    ArchivedMedicalRecord, ArchivedPatient,
+)
+from .live import ThreadSubscription, broadcaster
+from .metrics import store as metrics_store
+from .occupancy import assign_bed, bed_board, longest_stay, occupancy_at, occupants_at, release_bed, utilization
+from .pagination import CursorPaginator
+from .reports import department_stats, doctor_performance, generate_report, monthly, patient_summary
+from .revenue import rebuild, refresh_day, revenue_summary
+from .search import search_patients, top_patient_ids
+from .routers import PIN_COOKIE, PrimaryReplicaRouter, ReplicaRoutingMiddleware, primary_reads, read_from_primary
+from .sequences import SequenceAllocator
+from .sqlite_profile import current_pragmas, pragma_statements
+from .storage import digest_of
+from .sweeper import sweep
+from .urls import urlpatterns
+
+
+def make_patient(**kwargs):
+    defaults = {
+        'name': 'Test Patient',
+        'age': 40,
+        'gender': 'female',
+        'phone': '+1234567890',
+        'address': '1 Main Street',
+        'emergency_contact': 'Contact',
+        'emergency_phone': '+1234567891',
+        'diagnosis': 'Hypertension',
+        'admitted_date': date.today(),
+    }
+    defaults.update(kwargs)
+    return Patient.objects.create(**defaults)
+
+
+def make_doctor(name, specialty='general'):
+    user = User.objects.create_user(username=name.lower().replace(' ', '-'))
+    return Doctor.objects.create(
+        user=user,
+        name=name,
+        specialty=specialty,
+        phone=f'+1555{user.pk:07d}',
+        email=f'{user.username}@example.com',
+        license_number=f'LIC-{user.pk}',
+    )
+
+
+class SequenceAllocatorTests(TestCase):
+    def test_numbers_are_monotonic_within_a_process(self):
+        allocator = SequenceAllocator('test', block_size=5)
+        values = [allocator.next() for _ in range(12)]
+        self.assertEqual(values, sorted(values))
+        self.assertEqual(len(set(values)), 12)
+    
+    def test_allocators_never_share_numbers(self):
+        first = SequenceAllocator('test', block_size=5)
+        second = SequenceAllocator('test', block_size=5)
+        values = first.allocate(3) + second.allocate(3) + first.allocate(4) + second.allocate(4)
+        self.assertEqual(len(set(values)), len(values))
+    
+    def test_block_reserved_in_a_transaction_is_kept_after_commit(self):
+        Sequence.objects.create(name='test')
+        allocator = SequenceAllocator('test', block_size=50)
+        # TestCase wraps each test in a transaction
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(allocator.allocate(2), [1, 2])
+        self.assertEqual(Sequence.objects.get(name='test').last_value, 50)
+        with self.assertNumQueries(0):
+            self.assertEqual(allocator.allocate(3), [3, 4, 5])
+    
+    def test_block_reserved_in_a_rolled_back_transaction_is_dropped(self):
+        Sequence.objects.create(name='test')
+        allocator = SequenceAllocator('test', block_size=50)
+        with self.assertRaises(ZeroDivisionError), transaction.atomic():
+            self.assertEqual(allocator.allocate(2), [1, 2])
+            1 / 0
+        self.assertEqual(Sequence.objects.get(name='test').last_value, 0)
+        # Whoever reserves next gets the same numbers; this allocator must not hand them out too
+        self.assertEqual(SequenceAllocator('test', block_size=50).allocate(3), [1, 2, 3])
+        self.assertEqual(allocator.allocate(1), [51])
+    
+    def test_bill_numbers_continue_after_existing_bills(self):
+        patient = make_patient()
+        Sequence.objects.filter(name='bill_number').delete()
+        Bill.objects.create(patient=patient, bill_number='BILL-000041', total_amount=10, due_date=date.today())
+        bill_numbers.reset()
+        bill = Bill.objects.create(patient=patient, total_amount=10, due_date=date.today())
+        self.assertEqual(bill.bill_number, 'BILL-000042')
+
+
+class ConcurrentBillNumberTests(TransactionTestCase):
+    """Stress test: concurrent bill creation must never collide on bill_number"""
+    
+    workers = 8
+    bills_per_worker = 25
+    
+    def setUp(self):
+        # Tests that run on_commit callbacks inside their rolled back
+        # transaction leave the allocator holding numbers that were never
+        # reserved for good
+        bill_numbers.reset()
+    
+    def run_workers(self, target):
+        errors = []
+        
+        def run(index):
+            try:
+                target(index)
+            except Exception as e:  # pragma: no cover - reported below
+                errors.append(e)
+            finally:
+                connection.close()
+        
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+    
+    def test_block_is_served_from_memory(self):
+        allocator = SequenceAllocator('test', block_size=50)
+        allocator.next()
+        with self.assertNumQueries(0):
+            for _ in range(49):
+                allocator.next()
+        self.assertEqual(Sequence.objects.get(name='test').last_value, 50)
+    
+    def test_concurrent_bill_create(self):
+        patient = make_patient()
+        due_date = date.today() + timedelta(days=30)
+        
+        def create_bills(index):
+            for _ in range(self.bills_per_worker):
+                Bill.objects.create(patient_id=patient.id, total_amount=100, due_date=due_date)
+        
+        self.run_workers(create_bills)
+        numbers = list(Bill.objects.values_list('bill_number', flat=True))
+        self.assertEqual(len(numbers), self.workers * self.bills_per_worker)
+        self.assertEqual(len(set(numbers)), len(numbers))
+    
+    def test_concurrent_allocators_get_disjoint_monotonic_numbers(self):
+        # One allocator per thread stands in for one allocator per worker process
+        results = {}
+        
+        def allocate(index):
+            allocator = SequenceAllocator('stress', block_size=7)
+            results[index] = [allocator.next() for _ in range(self.bills_per_worker)]
+        
+        self.run_workers(allocate)
+        everything = [value for values in results.values() for value in values]
+        self.assertEqual(len(set(everything)), self.workers * self.bills_per_worker)
+        for values in results.values():
+            self.assertEqual(values, sorted(values))
+
+
+class BulkBillingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.patient = make_patient()
+    
+    def bill_data(self, **kwargs):
+        data = {
+            'patient': self.patient.id,
+            'due_date': '2026-12-31',
+            'items': [
+                {'type': 'consultation', 'description': 'Visit', 'quantity': 1, 'unit_price': '50.00'},
+                {'type': 'medicine', 'description': 'Tablets', 'quantity': 3, 'unit_price': '12.50'},
+            ],
+        }
+        data.update(kwargs)
+        return data
+    
+    @override_settings(BILL_TAX_RATE='0.10')
+    def test_totals_are_derived_from_items(self):
+        bill = create_bill(self.bill_data(discount_amount='7.50', total_amount='1.00'))
+        bill.refresh_from_db()
+        self.assertEqual(bill.discount_amount, Decimal('7.50'))
+        self.assertEqual(bill.tax_amount, Decimal('8.00'))
+        self.assertEqual(bill.total_amount, Decimal('88.00'))
+        self.assertEqual(
+            sorted(bill.items.values_list('total_price', flat=True)),
+            [Decimal('37.50'), Decimal('50.00')],
+        )
+    
+    @override_settings(BILL_TAX_RATE='0.10')
+    def test_total_with_tax_is_limited_to_the_bill_column(self):
+        item = {'type': 'procedure', 'description': 'Theatre', 'quantity': 1, 'unit_price': '999999.99'}
+        with self.assertRaisesMessage(ValidationError, 'total_amount cannot exceed 99999999.99'):
+            create_bill(self.bill_data(items=[item] * 100))
+        bill = create_bill(self.bill_data(items=[{**item, 'quantity': 2.0, 'unit_price': '400000.00'}]))
+        self.assertEqual(bill.total_amount, Decimal('880000.00'))
+    
+    def test_batch_costs_a_constant_number_of_queries(self):
+        # patient check, sequence UPDATE + SELECT, two INSERTs and savepoints
+        with self.assertNumQueries(9):
+            bills = create_bills([self.bill_data() for _ in range(20)])
+        self.assertEqual(len({bill.bill_number for bill in bills}), 20)
+        self.assertEqual(BillItem.objects.filter(bill__in=bills).count(), 40)
+    
+    def test_invalid_item_writes_nothing(self):
+        bad = self.bill_data(items=[{'type': 'magic', 'description': 'x', 'quantity': 1, 'unit_price': 1}])
+        with self.assertRaises(ValidationError):
+            create_bills([self.bill_data(), bad])
+        self.assertFalse(Bill.objects.exists())
+    
+    def test_bulk_endpoint(self):
+        url = reverse('hospital:api_bill_bulk_create')
+        response = self.client.post(
+            url, json.dumps({'bills': [self.bill_data(), self.bill_data()]}), content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.json()['bills']), 2)
+        response = self.client.post(url, json.dumps({'bills': [{'patient': self.patient.id}]}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(response.json()['success'])
+    
+    def test_malformed_entries_are_rejected_per_bill(self):
+        url = reverse('hospital:api_bill_bulk_create')
+        item = {'type': 'consultation', 'description': 'Visit', 'quantity': 1, 'unit_price': '10.00'}
+        cases = [
+            ([self.bill_data(items=[], total_amount='NaN')], 'Bill 1: total_amount must be a number'),
+            ([self.bill_data(items=[], total_amount='Infinity')], 'Bill 1: total_amount must be a number'),
+            ([self.bill_data(items=[{**item, 'unit_price': 'NaN'}])], 'Bill 1: Item 1 unit_price must be a number'),
+            ([self.bill_data(), 1], 'Bill 2: A bill must be an object'),
+            ([[1]], 'Bill 1: A bill must be an object'),
+            ([self.bill_data(items=5)], 'Bill 1: items must be a list'),
+            ([self.bill_data(items=[[1]])], 'Bill 1: Item 1 must be an object'),
+            ([self.bill_data(items=[{**item, 'type': ['lab']}])], "Bill 1: Item 1 has unknown type ['lab']"),
+            ([self.bill_data(payment_method=['cash'])], "Bill 1: Unknown payment_method ['cash']"),
+            ([self.bill_data(items=[], total_amount='1e12')], 'Bill 1: total_amount cannot exceed'),
+            ([self.bill_data(items=[{**item, 'quantity': 1.9}])], 'Bill 1: Item 1 quantity must be a whole number'),
+            ([self.bill_data(items=[{**item, 'quantity': True}])], 'Bill 1: Item 1 quantity must be a whole number'),
+            ([self.bill_data(items=[{**item, 'quantity': 'NaN'}])], 'Bill 1: Item 1 quantity must be a whole number'),
+            (
+                [self.bill_data(items=[{**item, 'unit_price': '5000000.00'}])],
+                'Bill 1: Item 1 unit_price cannot exceed 999999.99',
+            ),
+            (
+                [self.bill_data(items=[{**item, 'quantity': 100000, 'unit_price': '999.00'}])],
+                'Bill 1: Item 1 total_price cannot exceed 999999.99',
+            ),
+            (
+                [self.bill_data(items=[{**item, 'unit_price': '999999.99'}] * 101)],
+                'Bill 1: The item subtotal cannot exceed 99999999.99',
+            ),
+        ]
+        for bills, message in cases:
+            with self.subTest(message):
+                response = self.client.post(url, json.dumps({'bills': bills}), content_type='application/json')
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(message, response.json()['message'])
+        self.assertFalse(Bill.objects.exists())
+
+
+class PatientSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.john = make_patient(name='John Smith', diagnosis='Asthma', phone='+9779841000001')
+        cls.joan = make_patient(name='Joan Smithers', diagnosis='Migraine', emergency_contact='Ram Thapa')
+        cls.other = make_patient(name='Priya Sharma', diagnosis='Hypertension')
+    
+    def test_prefix_matches_across_fields(self):
+        self.assertEqual(set(search_patients('jo smi')), {self.john, self.joan})
+        self.assertEqual(list(search_patients('hyper')), [self.other])
+        self.assertEqual(list(search_patients('thapa')), [self.joan])
+        self.assertEqual(list(search_patients('9779841')), [self.john])
+    
+    def test_fallback_without_fts_matches_every_word(self):
+        with mock.patch.dict('Hospital.search._available', {'default': False}):
+            self.assertEqual(set(search_patients('jo sm')), {self.john, self.joan})
+            self.assertEqual(list(search_patients('joan thapa')), [self.joan])
+            self.assertEqual(list(search_patients('john thapa')), [])
+            self.assertEqual(top_patient_ids('priya hyper'), [self.other.pk])
+    
+    def test_index_follows_updates_and_deletes(self):
+        Patient.objects.filter(pk=self.other.pk).update(name='Sita Karki')
+        self.assertEqual(list(search_patients('karki')), [self.other])
+        self.assertEqual(list(search_patients('priya')), [])
+        self.john.delete()
+        self.assertEqual(top_patient_ids('john'), [])
+    
+    def test_every_match_is_ranked_unless_the_words_are_single_letters(self):
+        # John has "smith" once in a short row, Joan only as a prefix of a longer one
+        with mock.patch('Hospital.search.RANK_WINDOW', 1):
+            self.assertEqual(top_patient_ids('smith'), [self.john.id, self.joan.id])
+            self.assertEqual(top_patient_ids('s'), [self.other.id])
+    
+    def test_punctuation_only_query_matches_nothing(self):
+        self.assertEqual(list(search_patients('"*')), [])
+    
+    def test_autocomplete_endpoint(self):
+        autocomplete_index.clear()
+        response = self.client.get(reverse('hospital:api_patient_search'), {'q': 'joan smi'})
+        self.assertEqual([result['id'] for result in response.json()['results']], [self.joan.id])
+
+
+class PatientAutocompleteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.john = make_patient(name='John Smith')
+        cls.jose = make_patient(name='José Álvarez')
+        cls.priya = make_patient(name='Priya Sharma')
+    
+    def setUp(self):
+        self.index = PatientAutocompleteIndex()
+    
+    def names(self, query):
+        return [name for _, name, _, _ in self.index.search(query)]
+    
+    def test_prefix_lookup_is_served_from_memory(self):
+        self.index.load()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.names('jo'), ['John Smith', 'José Álvarez'])
+            self.assertEqual(self.names('alv jo'), ['José Álvarez'])
+            self.assertEqual(self.names('sh pri'), ['Priya Sharma'])
+            self.assertEqual(self.names('zz'), [])
+    
+    def test_changes_from_this_process_apply_incrementally(self):
+        autocomplete_index.load()
+        self.addCleanup(autocomplete_index.clear)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.priya.name = 'Priya Karki'
+            self.priya.save()
+            self.john.delete()
+        self.assertTrue(autocomplete_index.is_current())
+        with self.assertNumQueries(0):
+            self.assertEqual([row[1] for row in autocomplete_index.search('karki')], ['Priya Karki'])
+            self.assertEqual(autocomplete_index.search('sharma'), [])
+            self.assertEqual(autocomplete_index.search('john'), [])
+    
+    def test_matches_and_order_are_those_of_the_search_index(self):
+        make_patient(name='Smith Smith', diagnosis='Smithosis', emergency_contact='Joan Smith', phone='+1555000002')
+        make_patient(name='Sam Jones', diagnosis='Asthma', emergency_contact='John Jones', phone='+1555000003')
+        self.index.load()
+        for query in ['s', 'jo', 'smith', 'asth jo', 'contact', '1555', 'jos alv', 'zz']:
+            with self.subTest(query):
+                self.assertEqual([row[0] for row in self.index.search(query)], top_patient_ids(query))
+        with mock.patch('Hospital.search.RANK_WINDOW', 2):
+            self.assertEqual([row[0] for row in self.index.search('s')], top_patient_ids('s'))
+    
+    def test_lookups_during_the_first_load_ask_the_database(self):
+        self.index.loading = True
+        self.assertIsNone(self.index.search('john'))
+        self.assertFalse(self.index.loaded)
+    
+    def test_change_by_another_worker_marks_copy_stale(self):
+        self.index.load()
+        bump_version(AUTOCOMPLETE_DEPENDENCY)
+        self.assertFalse(self.index.is_current())
+        self.index.refresh_in_background = lambda: None
+        self.assertIsNone(self.index.search('john'))
+    
+    def test_memory_is_reported(self):
+        self.index.load()
+        stats = self.index.stats()
+        self.assertEqual(stats['patients'], 3)
+        self.assertGreater(stats['bytes_per_100k_patients'], 0)
+
+
+class DoctorAvailabilityTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.patient = make_patient()
+        cls.house = make_doctor('Gregory House', 'cardiology')
+        cls.wilson = make_doctor('James Wilson', 'cardiology')
+        cls.grey = make_doctor('Meredith Grey', 'general')
+        cls.day = date(2030, 1, 7)
+    
+    def book(self, doctor, start, duration, day=None, status='scheduled'):
+        hour, minute = map(int, start.split(':'))
+        return Appointment.objects.create(
+            patient=self.patient,
+            doctor=doctor,
+            appointment_date=day or self.day,
+            appointment_time=f'{hour:02d}:{minute:02d}',
+            duration_minutes=duration,
+            reason='Checkup',
+            status=status,
+        )
+    
+    def test_sweep_skips_busy_intervals(self):
+        self.assertEqual(free_slots([(60, 150)], 30, 0, 240, 30), [0, 30, 150, 180, 210])
+        self.assertEqual(free_slots([(60, 150)], 60, 0, 240, 30), [0, 150, 180])
+        self.assertEqual(free_slots([], 30, 0, 240, 30, earliest=95), [120, 150, 180, 210])
+    
+    def test_overlapping_appointments_merge(self):
+        self.book(self.house, '09:00', 60)
+        self.book(self.house, '09:30', 45)
+        self.book(self.house, '10:15', 15)
+        self.book(self.house, '11:00', 30, status='cancelled')
+        busy, taken = busy_intervals([self.house.pk], self.day, self.day)
+        self.assertEqual(busy, {(self.house.pk, self.day): [(540, 630)]})
+        self.assertEqual(taken, {(self.house.pk, self.day): {540, 570, 615, 660}})
+    
+    def test_slots_of_any_appointment_are_not_offered(self):
+        # A cancelled appointment still holds the unique (doctor, date, time)
+        self.book(self.house, '11:00', 30, status='cancelled')
+        self.book(self.house, '13:00', 30, status='completed')
+        slots = doctor_availability([self.house.pk], self.day, self.day)[self.house.pk][self.day]
+        slots = [slot.strftime('%H:%M') for slot in slots]
+        self.assertNotIn('11:00', slots)
+        self.assertNotIn('13:00', slots)
+        self.assertIn('11:30', slots)
+        self.assertEqual(len(slots), 14)
+        found = first_free_slot([self.house.pk], self.day, self.day, duration=30, now=datetime(2030, 1, 7, 10, 45))
+        self.assertEqual(found[1].strftime('%H:%M'), '11:30')
+    
+    def test_durations_block_their_whole_length(self):
+        self.book(self.house, '09:00', 90)
+        with self.assertNumQueries(1):
+            slots = doctor_availability([self.house.pk, self.wilson.pk], self.day, self.day + timedelta(days=6))
+        house = [slot.strftime('%H:%M') for slot in slots[self.house.pk][self.day]]
+        self.assertEqual(house[:2], ['10:30', '11:00'])
+        self.assertEqual(house[-1], '16:30')
+        self.assertEqual(len(slots[self.wilson.pk]), 7)
+        self.assertEqual(len(slots[self.wilson.pk][self.day]), 16)
+    
+    def test_first_free_slot_across_doctors(self):
+        self.book(self.house, '09:00', 120)
+        self.book(self.wilson, '09:00', 60)
+        found = first_free_slot([self.house.pk, self.wilson.pk], self.day, self.day + timedelta(days=6), duration=60)
+        self.assertEqual(found, (self.day, datetime.strptime('10:00', '%H:%M').time(), self.wilson.pk))
+    
+    def test_specialty_endpoint(self):
+        self.book(self.house, '09:00', 480)
+        self.book(self.wilson, '09:00', 480)
+        self.book(self.grey, '09:00', 30, day=self.day + timedelta(days=1))
+        response = self.client.get(reverse('hospital:api_doctor_availability'), {
+            'specialty': 'cardiology',
+            'start_date': self.day.isoformat(),
+            'end_date': (self.day + timedelta(days=6)).isoformat(),
+            'first': '1',
+        })
+        self.assertEqual(response.json()['first_available'], {
+            'doctor_id': self.house.pk,
+            'doctor_name': 'Gregory House',
+            'date': (self.day + timedelta(days=1)).isoformat(),
+            'time': '09:00',
+        })
+    
+    def test_single_doctor_day_keeps_available_slots(self):
+        self.book(self.grey, '12:00', 60)
+        response = self.client.get(reverse('hospital:api_doctor_availability'), {
+            'doctor_id': self.grey.pk,
+            'date': self.day.isoformat(),
+        })
+        slots = response.json()['available_slots']
+        self.assertNotIn('12:00', slots)
+        self.assertNotIn('12:30', slots)
+        self.assertIn('13:00', slots)
+
+
+class CursorPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # Three patients per admission day, so the id tiebreaker matters
+        for number in range(25):
+            make_patient(name=f'Patient {number}', admitted_date=date(2030, 1, 1) + timedelta(days=number // 3))
+    
+    def expected(self):
+        return list(Patient.objects.order_by('-admitted_date', 'id'))
+    
+    def test_walks_forward_and_back_through_every_row(self):
+        paginator = CursorPaginator(Patient.objects.all(), 10)
+        pages = [paginator.get_page()]
+        while pages[-1].has_next():
+            pages.append(paginator.get_page(pages[-1].next_cursor))
+        self.assertEqual([len(page) for page in pages], [10, 10, 5])
+        self.assertEqual([patient for page in pages for patient in page], self.expected())
+        self.assertFalse(pages[0].has_previous())
+        
+        back = paginator.get_page(pages[-1].previous_cursor)
+        self.assertEqual(back.object_list, pages[1].object_list)
+        back = paginator.get_page(back.previous_cursor)
+        self.assertEqual(back.object_list, pages[0].object_list)
+        self.assertFalse(back.has_previous())
+    
+    def test_deep_pages_seek_instead_of_offset(self):
+        paginator = CursorPaginator(Patient.objects.all(), 3)
+        page = paginator.get_page()
+        for _ in range(5):
+            page = paginator.get_page(page.next_cursor)
+        with self.assertNumQueries(1) as queries:
+            page = paginator.get_page(page.next_cursor)
+        self.assertNotIn('OFFSET', queries.captured_queries[0]['sql'])
+        self.assertEqual(page.object_list, self.expected()[18:21])
+    
+    def test_pages_after_a_cursor_seek_the_keyset_indexes(self):
+        cases = [
+            (Patient, [date(2030, 1, 1), 1], 'patient_admitted_idx'),
+            (Appointment, [date(2030, 1, 1), datetime.min.time(), 1], 'appt_date_time_idx'),
+            (Bill, [date(2030, 1, 1), 1], 'bill_date_idx'),
+        ]
+        for model, key, index in cases:
+            with self.subTest(model.__name__):
+                paginator = CursorPaginator(model.objects.all(), 15)
+                plan = paginator.queryset.filter(paginator._after(key, reverse=False))[:16].explain()
+                self.assertIn(f'USING INDEX {index}', plan)
+                self.assertNotIn('TEMP B-TREE', plan)
+    
+    def test_tampered_cursor_shows_first_page(self):
+        paginator = CursorPaginator(Patient.objects.all(), 10)
+        cursor = paginator.get_page().next_cursor
+        page = paginator.get_page(cursor[:-2] + 'xx')
+        self.assertEqual(page.object_list, self.expected()[:10])
+    
+    def test_estimated_count_is_cached_until_patients_change(self):
+        paginator = CursorPaginator(Patient.objects.filter(status='active'), 10, estimate_count=True)
+        self.assertEqual(paginator.get_page().estimated_count, 25)
+        with self.assertNumQueries(1):
+            paginator.get_page()
+
+
+class QueryPlanTests(TestCase):
+    """The hot filters are answered from their composite indexes"""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = make_doctor('Gregory House')
+        cls.patient = make_patient()
+    
+    def assertUsesIndex(self, queryset, index):
+        plan = queryset.explain()
+        self.assertRegex(plan, rf'USING (COVERING )?INDEX {index}\b')
+        self.assertNotIn('TEMP B-TREE', plan)
+    
+    def test_filters_use_their_indexes(self):
+        today = date.today()
+        cases = [
+            (Appointment.objects.filter(appointment_date=today, status='scheduled').order_by('appointment_time'),
+             'appt_date_status_time_idx'),
+            (Appointment.objects.filter(status='scheduled', appointment_date__lt=today).order_by(), 'appt_status_date_idx'),
+            (Appointment.objects.filter(patient=self.patient), 'appt_patient_date_idx'),
+            (Bill.objects.filter(status='paid', bill_date__range=(today, today)), 'bill_status_date_idx'),
+            (Bill.objects.filter(status='unpaid', due_date__lt=today).order_by(), 'bill_status_due_idx'),
+            (Patient.objects.filter(status='active'), 'patient_status_admitted_idx'),
+            (Room.objects.filter(status='available', room_type='general').order_by(), 'room_status_type_idx'),
+            (MedicalRecord.objects.filter(patient=self.patient), 'record_patient_visit_idx'),
+        ]
+        for queryset, index in cases:
+            with self.subTest(index):
+                self.assertUsesIndex(queryset, index)
+    
+    def test_appointment_doctor_filters_use_the_unique_index(self):
+        # It leads with (doctor, appointment_date), so no other index needs to
+        unique = r'Hospital_appointment_doctor_id_appointment_date_appointment_time_\w+_uniq'
+        today = date.today()
+        for queryset in [
+            Appointment.objects.filter(doctor=self.doctor).order_by(),
+            Appointment.objects.filter(doctor=self.doctor, appointment_date=today, status='scheduled'),
+            Appointment.objects.filter(doctor__in=[self.doctor], appointment_date__range=(today, today)).order_by(),
+        ]:
+            self.assertRegex(queryset.explain(), rf'USING (COVERING )?INDEX {unique}\b')
+
+
+class ListQueryCountTests(TestCase):
+    """Every list surface runs the same number of queries for 2 rows as for 8"""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        cls.doctors = [make_doctor('Gregory House', 'cardiology'), make_doctor('James Wilson', 'oncology')]
+        cls.department = Department.objects.create(name='Cardiology', head_doctor=cls.doctors[0])
+        cls.created = 0
+    
+    def add_rows(self, count):
+        for _ in range(count):
+            number = ListQueryCountTests.created = ListQueryCountTests.created + 1
+            doctor = self.doctors[number % 2]
+            patient = make_patient(name=f'Patient {number}', phone=f'+1555{number:07d}', assigned_doctor=doctor)
+            Appointment.objects.create(
+                patient=patient, doctor=doctor, appointment_date=date.today() + timedelta(days=number),
+                appointment_time='10:00', reason='Checkup',
+            )
+            create_bill({'patient': patient.pk, 'total_amount': '10.00', 'due_date': date.today()})
+            MedicalRecord.objects.create(
+                patient=patient, doctor=doctor, visit_date=timezone.now(),
+                symptoms='Cough', diagnosis='Cold', treatment='Rest',
+            )
+            room = Room.objects.create(
+                room_number=f'R{number}', room_type='general', floor=1,
+                department=self.department, current_patient=patient,
+            )
+            RoomOccupancy.objects.create(room=room, patient=patient, start=timezone.now())
+            Department.objects.create(name=f'Ward {number}', head_doctor=None)
+            Report.objects.create(
+                title=f'Report {number}', report_type='revenue', summary='-',
+                generated_by=self.admin, report_date=date.today(),
+            )
+    
+    def assertConstantQueries(self, measure):
+        # Rolled back afterwards, so every surface starts below one page of rows
+        with transaction.atomic():
+            self.add_rows(2)
+            few = measure()
+            self.add_rows(6)
+            self.assertEqual(measure(), few)
+            transaction.set_rollback(True)
+    
+    def admin_queries(self, model):
+        cache.clear()
+        url = reverse(f'admin:Hospital_{model._meta.model_name}_changelist')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+    
+    def test_admin_changelists(self):
+        self.client.force_login(self.admin)
+        for model in [Doctor, Patient, Appointment, Bill, BillItem, Department, Room, RoomOccupancy, MedicalRecord, Report]:
+            with self.subTest(model=model.__name__):
+                self.assertConstantQueries(lambda: self.admin_queries(model))
+    
+    def view_queries(self, name, *args):
+        """Queries to build the view's context and display every row in it"""
+        cache.clear()
+        with mock.patch('Hospital.views.render', return_value=HttpResponse()) as render, CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse(f'hospital:{name}', args=args))
+            for value in render.call_args.args[2].values():
+                rows = value if isinstance(value, Iterable) and not isinstance(value, (str, dict)) else [value]
+                for row in rows:
+                    str(row)
+                    for field in getattr(row, '_meta', None) and row._meta.concrete_fields or []:
+                        if field.is_relation:
+                            getattr(row, field.name)
+                    getattr(row, 'patient_count', None)
+        return len(queries)
+    
+    def test_views(self):
+        doctor = self.doctors[0]
+        for args in [
+            ('doctor_list',), ('doctor_detail', doctor.pk), ('patient_list',), ('appointment_list',),
+            ('bill_list',), ('room_list',), ('department_list',), ('department_detail', self.department.pk),
+            ('report_list',),
+        ]:
+            with self.subTest(view=args[0]):
+                self.assertConstantQueries(lambda: self.view_queries(*args))
+
+
+class CsvExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        cls.doctor = make_doctor('Gregory House')
+        for number in range(5):
+            patient = make_patient(name=f'Patient {number}', phone=f'+1555{number:07d}')
+            Appointment.objects.create(
+                patient=patient, doctor=cls.doctor, appointment_date=date(2030, 1, 1) + timedelta(days=number),
+                appointment_time='10:00', reason='Checkup',
+            )
+    
+    def test_rows_stream_in_one_query_with_joined_labels(self):
+        with self.assertNumQueries(1):
+            lines = list(csv_rows(Appointment.objects.order_by('pk'), chunk_size=2))
+        rows = list(csv.reader(lines))
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(rows[0][:3], ['ID', 'patient', 'doctor'])
+        self.assertEqual(rows[1][1:5], ['Patient 0', 'Gregory House', '2030-01-01', '10:00:00'])
+    
+    def test_admin_action_streams(self):
+        self.client.force_login(self.admin)
+        response = self.client.post(reverse('admin:Hospital_appointment_changelist'), {
+            'action': 'export_to_csv',
+            '_selected_action': list(Appointment.objects.values_list('pk', flat=True)),
+        })
+        self.assertTrue(response.streaming)
+        self.assertEqual(len(list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode())))), 6)
+    
+    def test_command_filters(self):
+        out = io.StringIO()
+        call_command('export_csv', 'Appointment', '--filter', 'appointment_date__gte=2030-01-04', stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 3)
+
+
+class RevenueRollupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.patient = make_patient()
+    
+    def paid_bill(self, method, items):
+        with self.captureOnCommitCallbacks(execute=True):
+            bill = create_bill({
+                'patient': self.patient.pk,
+                'due_date': '2030-12-31',
+                'payment_method': method,
+                'items': [
+                    {'type': item_type, 'description': item_type, 'quantity': 1, 'unit_price': price}
+                    for item_type, price in items
+                ],
+            })
+        with self.captureOnCommitCallbacks(execute=True):
+            bill.status = 'paid'
+            bill.save()
+        return bill
+    
+    def test_bill_changes_update_the_rollup(self):
+        self.paid_bill('cash', [('consultation', '50.00'), ('medicine', '20.00')])
+        bill = self.paid_bill('card', [('consultation', '30.00')])
+        today = date.today()
+        summary = revenue_summary(today, today)
+        self.assertEqual(summary['total_revenue'], Decimal('100.00'))
+        self.assertEqual(summary['total_bills'], 2)
+        self.assertEqual(summary['by_category'], {'consultation': Decimal('80.00'), 'medicine': Decimal('20.00')})
+        self.assertEqual(summary['by_payment_method'], {'card': Decimal('30.00'), 'cash': Decimal('70.00')})
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            bill.status = 'cancelled'
+            bill.save()
+        self.assertEqual(revenue_summary(today, today)['total_revenue'], Decimal('70.00'))
+        with self.captureOnCommitCallbacks(execute=True):
+            BillItem.objects.filter(item_type='medicine').delete()
+        self.assertEqual(revenue_summary(today, today)['by_category'], {'consultation': Decimal('50.00')})
+    
+    def test_each_day_is_refreshed_once_per_transaction(self):
+        bill = self.paid_bill('cash', [('consultation', '50.00'), ('medicine', '20.00')])
+        with mock.patch('Hospital.revenue.refresh_day', wraps=refresh_day) as refresh:
+            with self.captureOnCommitCallbacks(execute=True):
+                bill.items.filter(item_type='medicine').delete()
+                bill.total_amount = Decimal('50.00')
+                bill.save()
+                card = create_bill({
+                    'patient': self.patient.pk, 'due_date': '2030-12-31', 'payment_method': 'card',
+                    'items': [{'type': 'test', 'description': 'test', 'quantity': 1, 'unit_price': '15.00'}],
+                })
+                card.status = 'paid'
+                card.save()
+        self.assertEqual(refresh.call_count, 1)
+        rows = DailyRevenue.objects.values_list('payment_method', 'item_type', 'amount')
+        self.assertEqual(set(rows), {
+            ('card', '', Decimal('15.00')), ('card', 'test', Decimal('15.00')),
+            ('cash', '', Decimal('50.00')), ('cash', 'consultation', Decimal('50.00')),
+        })
+    
+    def test_backfill_matches_incremental_rollup(self):
+        self.paid_bill('cash', [('consultation', '50.00'), ('test', '15.00')])
+        self.paid_bill('insurance', [('procedure', '400.00')])
+        incremental = list(DailyRevenue.objects.values_list('day', 'payment_method', 'item_type', 'bill_count', 'amount'))
+        DailyRevenue.objects.all().delete()
+        call_command('backfill_revenue_rollup', stdout=io.StringIO())
+        self.assertEqual(
+            list(DailyRevenue.objects.values_list('day', 'payment_method', 'item_type', 'bill_count', 'amount')),
+            incremental,
+        )
+    
+    def test_report_reads_the_rollup(self):
+        self.paid_bill('cash', [('consultation', '50.00')])
+        today = date.today().isoformat()
+        with self.assertNumQueries(2):
+            self.client.post(reverse('hospital:generate_revenue_report'), {'start_date': '2000-01-01', 'end_date': today})
+        report = Report.objects.get()
+        self.assertEqual(report.summary, 'Total Revenue: $50.00, Total Bills: 1')
+        self.assertEqual(json.loads(report.detailed_content)['by_day'], {today: '50.00'})
+
+
+class ReportGeneratorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.house = make_doctor('Gregory House', 'cardiology')
+        cls.wilson = make_doctor('James Wilson', 'oncology')
+        cls.patient = make_patient(assigned_doctor=cls.house)
+        make_patient(name='Discharged', assigned_doctor=cls.house, status='discharged',
+                     admitted_date=date(2030, 1, 1), discharge_date=date(2030, 1, 5))
+        for day, status, duration in [(1, 'completed', 30), (2, 'completed', 60), (3, 'no_show', 30), (4, 'cancelled', 30)]:
+            Appointment.objects.create(
+                patient=cls.patient, doctor=cls.house, appointment_date=date(2030, 1, day),
+                appointment_time='10:00', duration_minutes=duration, reason='Checkup', status=status,
+            )
+        cls.department = Department.objects.create(name='Cardiology')
+        Room.objects.create(room_number='C1', room_type='general', floor=1, department=cls.department, status='occupied')
+        Room.objects.create(room_number='C2', room_type='general', floor=1, department=cls.department)
+        cls.start, cls.end = date(2030, 1, 1), date(2030, 1, 31)
+    
+    def test_doctor_metrics_take_a_fixed_number_of_queries(self):
+        with self.assertNumQueries(6):
+            metrics = doctor_performance([self.house.pk, self.wilson.pk], self.start, self.end)
+        house = metrics[self.house.pk]
+        self.assertEqual(house['appointments'], 4)
+        self.assertEqual(house['by_status'], {'completed': 2, 'no_show': 1, 'cancelled': 1})
+        self.assertEqual(house['no_show_rate'], round(1 / 3, 4))
+        self.assertEqual(house['avg_duration_minutes'], 37.5)
+        self.assertEqual(house['active_patients'], 1)
+        self.assertEqual(metrics[self.wilson.pk]['appointments'], 0)
+    
+    def test_department_groups_doctors_by_specialty(self):
+        stats = department_stats([self.department.pk], self.start, self.end)[self.department.pk]
+        self.assertEqual(stats['doctors'], 1)
+        self.assertEqual(stats['appointments'], 4)
+        self.assertEqual(stats['rooms'], {'occupied': 1, 'available': 1})
+        self.assertEqual(stats['occupancy_rate'], 0.5)
+    
+    def test_reports_are_stored(self):
+        for kind in ['doctor_performance', 'department_stats', 'patient_summary', 'monthly']:
+            generate_report(kind, self.start, self.end, workers=1)
+        report = Report.objects.get(report_type='patient_summary')
+        self.assertEqual(report.period_start, self.start)
+        content = json.loads(report.detailed_content)
+        self.assertEqual(content['discharged'], 1)
+        self.assertEqual(content['avg_stay_days'], 4.0)
+        self.assertEqual(Report.objects.get(report_type='doctor_performance').summary, '2 doctors, 4 appointments')
+
+
+class RoomOccupancyTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.cardiology = Department.objects.create(name='Cardiology')
+        cls.ward = Room.objects.create(room_number='W1', room_type='general', floor=1, capacity=4, department=cls.cardiology)
+        cls.single = Room.objects.create(room_number='P1', room_type='private', floor=2, capacity=1)
+        Room.objects.create(room_number='M1', room_type='general', floor=2, capacity=2, status='maintenance')
+        cls.patients = [make_patient(name=f'Patient {number}', phone=f'+1555{number:07d}') for number in range(4)]
+        cls.day = timezone.make_aware(datetime(2030, 1, 10))
+    
+    def test_beds_fill_in_order_and_keep_the_room_in_step(self):
+        first = assign_bed(self.single, self.patients[0], start=self.day)
+        self.single.refresh_from_db()
+        self.assertEqual((first.bed, self.single.status, self.single.current_patient), (1, 'occupied', self.patients[0]))
+        with self.assertRaisesMessage(ValueError, 'no free bed'):
+            assign_bed(self.single, self.patients[1])
+        with self.assertRaisesMessage(ValueError, 'already has a bed'):
+            assign_bed(self.ward, self.patients[0])
+        
+        release_bed(first, end=self.day + timedelta(days=2))
+        self.single.refresh_from_db()
+        self.assertEqual((self.single.status, self.single.current_patient), ('available', None))
+        self.assertEqual(RoomOccupancy.objects.get().duration, timedelta(days=2))
+        
+        self.assertEqual([assign_bed(self.ward, patient).bed for patient in self.patients[:2]], [1, 2])
+        with self.assertRaisesMessage(ValueError, 'is not free'):
+            assign_bed(self.ward, self.patients[2], bed=2)
+    
+    def test_occupancy_at_a_point_in_time(self):
+        day = self.day
+        release_bed(assign_bed(self.ward, self.patients[0], start=day), end=day + timedelta(days=5))
+        release_bed(assign_bed(self.ward, self.patients[1], start=day + timedelta(days=1)), end=day + timedelta(days=2))
+        assign_bed(self.ward, self.patients[2], start=day + timedelta(days=3))
+        
+        def occupants(at):
+            return sorted(occupancy_at(at).values_list('patient__name', flat=True))
+        
+        self.assertEqual(occupants(day - timedelta(hours=1)), [])
+        self.assertEqual(occupants(day), ['Patient 0'])
+        self.assertEqual(occupants(day + timedelta(days=1, hours=12)), ['Patient 0', 'Patient 1'])
+        # A stay is over at its end
+        self.assertEqual(occupants(day + timedelta(days=2)), ['Patient 0'])
+        self.assertEqual(occupants(day + timedelta(days=4)), ['Patient 0', 'Patient 2'])
+        self.assertEqual(occupants(day + timedelta(days=30)), ['Patient 2'])
+        
+        response = self.client.get(reverse('hospital:api_room_occupancy'), {'at': '2030-01-11T12:00:00Z'})
+        self.assertEqual([row['patient_name'] for row in response.json()['occupied']], ['Patient 0', 'Patient 1'])
+    
+    def test_utilization_over_a_range(self):
+        release_bed(assign_bed(self.single, self.patients[0], start=self.day), end=self.day + timedelta(hours=12))
+        figures = utilization(self.day, self.day + timedelta(days=1), Room.objects.filter(pk=self.single.pk))
+        self.assertEqual(figures['occupied_bed_hours'], 12)
+        self.assertEqual(figures['rate'], 0.5)
+        response = self.client.get(reverse('hospital:api_room_occupancy'), {'date': '2030-01-10'})
+        self.assertEqual(response.json()['by_floor']['2']['occupied_bed_hours'], 12)
+        self.assertEqual(self.client.get(reverse('hospital:api_room_occupancy'), {'date': 'soon'}).status_code, 400)
+    
+    def test_archived_stays_stay_in_the_history(self):
+        start = timezone.make_aware(datetime(2028, 12, 1))
+        patient = self.patients[3]
+        release_bed(assign_bed(self.single, patient, start=start), end=start + timedelta(days=30))
+        Patient.objects.filter(pk=patient.pk).update(status='discharged', discharge_date=date(2029, 1, 1))
+        list(archive('patients', cutoff=date(2029, 6, 1)))
+        self.assertFalse(RoomOccupancy.objects.exists())
+        
+        at = start + timedelta(days=14)
+        self.assertEqual(longest_stay(), timedelta(days=30))
+        self.assertFalse(occupancy_at(at).exists())
+        self.assertEqual([(stay.room, name) for stay, name in occupants_at(at)], [(self.single, 'Patient 3')])
+        response = self.client.get(reverse('hospital:api_room_occupancy'), {'at': at.isoformat()})
+        self.assertEqual([row['patient_name'] for row in response.json()['occupied']], ['Patient 3'])
+        figures = utilization(at, at + timedelta(days=1), Room.objects.filter(pk=self.single.pk))
+        self.assertEqual(figures['occupied_bed_hours'], 24)
+    
+    def test_bed_board_is_one_query(self):
+        assign_bed(self.ward, self.patients[0])
+        assign_bed(self.ward, self.patients[1])
+        assign_bed(self.single, self.patients[2])
+        with self.assertNumQueries(1):
+            board = bed_board()
+        self.assertEqual(board['totals'], {'rooms': 3, 'beds': 7, 'occupied': 3, 'out_of_service': 2, 'available': 2})
+        self.assertEqual(board['by_floor'][1], {'rooms': 1, 'beds': 4, 'occupied': 2, 'out_of_service': 0, 'available': 2})
+        self.assertEqual(board['by_floor'][2]['available'], 0)
+        self.assertEqual(board['by_department']['Cardiology']['occupied'], 2)
+        self.assertEqual(self.client.get(reverse('hospital:api_bed_board')).json()['totals']['available'], 2)
+    
+    def test_admin_room_edits_open_and_close_stays(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        url = reverse('admin:Hospital_room_change', args=[self.single.pk])
+        
+        def edit(**changes):
+            data = {
+                'room_number': 'P1', 'room_type': 'private', 'department': self.cardiology.pk, 'floor': 2, 'capacity': 1,
+                'status': 'available', 'current_patient': '', 'daily_rate': '0', 'amenities': '',
+            }
+            data.update(changes)
+            return self.client.post(url, data)
+        
+        assign_bed(self.ward, self.patients[0])
+        # Moved from the ward into the private room
+        self.assertEqual(edit(current_patient=self.patients[0].pk).status_code, 302)
+        stay = RoomOccupancy.objects.get(end__isnull=True)
+        self.assertEqual((stay.room, stay.patient), (self.single, self.patients[0]))
+        self.single.refresh_from_db()
+        self.assertEqual((self.single.status, self.single.current_patient), ('occupied', self.patients[0]))
+        self.assertEqual(RoomOccupancy.objects.filter(room=self.ward, end__isnull=False).count(), 1)
+        self.assertEqual(bed_board()['by_floor'][2]['occupied'], 1)
+        
+        # Full: a second patient is refused rather than double-booked
+        response = edit(current_patient=self.patients[1].pk, capacity=0)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(RoomOccupancy.objects.filter(patient=self.patients[1]).exists())
+        
+        self.assertEqual(edit().status_code, 302)
+        self.assertFalse(RoomOccupancy.objects.filter(end__isnull=True).exists())
+        self.single.refresh_from_db()
+        self.assertEqual((self.single.status, self.single.current_patient), ('available', None))
+        self.assertEqual(bed_board()['totals']['occupied'], 0)
+
+
+class AsyncApiTests(TestCase):
+    """The JSON endpoints are async views; drive them through the ASGI test client"""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = make_doctor('Gregory House', 'cardiology')
+        cls.patient = make_patient(name='John Smith')
+        cls.appointment = Appointment.objects.create(
+            patient=cls.patient, doctor=cls.doctor, appointment_date=date(2030, 1, 7),
+            appointment_time='10:00', duration_minutes=60, reason='Checkup',
+        )
+    
+    async def test_update_status(self):
+        url = reverse('hospital:appointment_update_status', args=[self.appointment.pk])
+        response = await self.async_client.post(url, {'status': 'completed'})
+        self.assertEqual(response.json(), {'success': True, 'message': 'Status updated successfully'})
+        self.assertEqual((await Appointment.objects.aget(pk=self.appointment.pk)).status, 'completed')
+        response = await self.async_client.post(url, {'status': 'lost'})
+        self.assertFalse(response.json()['success'])
+        missing = reverse('hospital:appointment_update_status', args=[self.appointment.pk + 1])
+        self.assertEqual((await self.async_client.post(missing, {'status': 'completed'})).status_code, 404)
+        self.assertEqual((await self.async_client.get(url)).status_code, 405)
+    
+    async def test_patient_search(self):
+        autocomplete_index.clear()
+        response = await self.async_client.get(reverse('hospital:api_patient_search'), {'q': 'smi'})
+        self.assertEqual([row['name'] for row in response.json()['results']], ['John Smith'])
+    
+    async def test_doctor_availability(self):
+        response = await self.async_client.get(
+            reverse('hospital:api_doctor_availability'), {'doctor_id': self.doctor.pk, 'date': '2030-01-07'}
+        )
+        slots = response.json()['available_slots']
+        self.assertNotIn('10:00', slots)
+        self.assertNotIn('10:30', slots)
+        self.assertIn('11:00', slots)
+
+
+class LiveFeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = make_doctor('Gregory House', 'cardiology')
+        cls.patient = make_patient()
+    
+    def setUp(self):
+        self.subscription = broadcaster.subscribe(ThreadSubscription())
+        self.addCleanup(broadcaster.unsubscribe, self.subscription)
+    
+    def events(self):
+        events = []
+        while (event := self.subscription.get(timeout=0)) is not None:
+            events.append(event[1:])
+        return events
+    
+    def book(self, day):
+        return Appointment.objects.create(
+            patient=self.patient, doctor=self.doctor, appointment_date=day, appointment_time='10:00', reason='Checkup',
+        )
+    
+    def test_changes_are_pushed_after_commit(self):
+        today = timezone.now().date()
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment = self.book(today)
+            self.assertEqual(self.events(), [])
+        (kind, data), (stats_kind, stats) = self.events()
+        self.assertEqual((kind, data['action'], data['id'], data['status']), ('appointment', 'created', appointment.pk, 'scheduled'))
+        self.assertEqual((stats_kind, stats['today_appointments'], stats['total_patients']), ('stats', 1, 1))
+    
+    def test_bed_changes_are_pushed(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            room = Room.objects.create(room_number='W1', room_type='general', floor=1)
+            assign_bed(room, self.patient)
+        events = self.events()
+        self.assertIn(
+            ('room', {'id': room.pk, 'room_number': 'W1', 'status': 'occupied', 'current_patient_id': self.patient.pk}),
+            events,
+        )
+        self.assertEqual([kind for kind, _ in events].count('stats'), 1)
+    
+    def test_one_counter_query_per_transaction(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            for offset in range(3):
+                self.book(date(2030, 1, 1) + timedelta(days=offset))
+        with self.assertNumQueries(1):
+            for callback in callbacks:
+                callback()
+        self.assertEqual(sorted(kind for kind, _ in self.events()), ['appointment'] * 3 + ['stats'])
+    
+    def test_counters_are_pushed_when_a_savepoint_rolls_back(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                try:
+                    with transaction.atomic():
+                        self.book(date(2030, 1, 1))
+                        raise ValueError
+                except ValueError:
+                    pass
+                self.book(date(2030, 1, 2))
+        self.assertEqual(sorted(kind for kind, _ in self.events()), ['appointment', 'stats'])
+    
+    def test_nothing_is_built_without_screens(self):
+        broadcaster.unsubscribe(self.subscription)
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.book(date(2030, 1, 1))
+        # Only the cache version bump; no event payloads, no counter query
+        self.assertEqual(len(callbacks), 1)
+    
+    def test_stream_starts_with_a_snapshot(self):
+        response = self.client.get(reverse('hospital:api_live_feed'))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        first = next(iter(response.streaming_content)).decode()
+        self.assertIn('event: snapshot', first)
+        self.assertEqual(json.loads(first.split('data: ')[1])['total_patients'], 1)
+        self.assertEqual(len(broadcaster), 2)
+        response.close()
+        self.assertEqual(len(broadcaster), 1)
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        metrics_store.clear()
+    
+    def sample(self, text, name, **labels):
+        prefix = name + '{' + ','.join(f'{key}="{value}"' for key, value in labels.items()) + '}'
+        for line in text.splitlines():
+            if line.startswith(prefix + ' '):
+                return float(line.split()[-1])
+        return None
+    
+    def test_requests_are_recorded_per_view(self):
+        self.client.get(reverse('hospital:api_bed_board'))
+        self.client.get(reverse('hospital:api_bed_board'))
+        self.client.get('/no-such-page/')
+        text = self.client.get(reverse('hospital:metrics')).content.decode()
+        
+        view = {'view': 'hospital:api_bed_board', 'method': 'GET'}
+        self.assertEqual(self.sample(text, 'hospital_http_requests_total', **view, status='200'), 2)
+        self.assertEqual(self.sample(text, 'hospital_http_request_duration_seconds_count', **view), 2)
+        # One grouped query per bed board
+        self.assertEqual(self.sample(text, 'hospital_http_request_db_queries_sum', **view), 2)
+        self.assertEqual(self.sample(text, 'hospital_http_request_db_queries_bucket', **view, le='0'), 0)
+        self.assertEqual(self.sample(text, 'hospital_http_request_db_queries_bucket', **view, le='+Inf'), 2)
+        self.assertGreater(self.sample(text, 'hospital_http_response_size_bytes_sum', **view), 0)
+        self.assertEqual(self.sample(text, 'hospital_http_requests_total', view='<unresolved>', method='GET', status='404'), 1)
+    
+    async def test_async_views_count_their_queries(self):
+        doctor = await sync_to_async(make_doctor)('Gregory House')
+        await self.async_client.get(
+            reverse('hospital:api_doctor_availability'), {'doctor_id': doctor.pk, 'date': '2030-01-07'}
+        )
+        text = metrics_store.render()
+        view = {'view': 'hospital:api_doctor_availability', 'method': 'GET'}
+        # The doctor list and the booked appointments
+        self.assertEqual(self.sample(text, 'hospital_http_request_db_queries_sum', **view), 2)
+
+
+class SyntheticBenchmarkTests(TransactionTestCase):
+    # Request reads go to the replica alias when one is configured
+    databases = '__all__'
+    
+    def seed(self):
+        call_command(
+            'seed_synthetic', doctors=4, patients=50, appointments=200, bills=20, medical_records=20,
+            rooms=5, room_stays=20, departments=2, interactive=False, stdout=io.StringIO(),
+        )
+    
+    def test_seed_writes_consistent_rows(self):
+        self.seed()
+        self.assertEqual(Doctor.objects.count(), 4)
+        self.assertEqual(Appointment.objects.count(), 200)
+        self.assertFalse(Appointment.objects.exclude(patient__in=Patient.objects.all()).exists())
+        self.assertFalse(BillItem.objects.exclude(bill__in=Bill.objects.all()).exists())
+        # Half of the diary lies ahead
+        upcoming = Appointment.objects.filter(appointment_date__gte=timezone.localdate()).count()
+        self.assertGreater(upcoming, 50)
+        self.assertLess(upcoming, 150)
+    
+    def test_benchmark_covers_every_route_and_rolls_back_writes(self):
+        self.seed()
+        appointments = dict(Appointment.objects.values_list('id', 'status'))
+        bills = Bill.objects.count()
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'bench.json')
+            call_command('bench_urls', repeat=2, warmup=0, output=output, stdout=io.StringIO())
+            with open(output) as results:
+                routes = json.load(results)['routes']
+        self.assertEqual(set(routes), {pattern.name for pattern in urlpatterns})
+        self.assertEqual(routes['api_bed_board']['status'], 200)
+        self.assertEqual(routes['api_bed_board']['queries'], 1)
+        self.assertEqual(routes['api_bill_bulk_create']['status'], 201)
+        for stats in routes.values():
+            self.assertLessEqual(stats['p50_ms'], stats['p99_ms'])
+        self.assertEqual(dict(Appointment.objects.values_list('id', 'status')), appointments)
+        self.assertEqual(Bill.objects.count(), bills)
+
+
+class SqliteProfileTests(TestCase):
+    def test_connections_get_the_profile(self):
+        pragmas = current_pragmas(connection, ['journal_mode', 'synchronous', 'busy_timeout', 'cache_size'])
+        self.assertEqual(pragmas, {'journal_mode': 'wal', 'synchronous': 1, 'busy_timeout': 5000, 'cache_size': -32768})
+    
+    def test_pragmas_are_validated(self):
+        self.assertEqual(pragma_statements({'cache_size': -2000}), ['PRAGMA cache_size = -2000'])
+        with self.assertRaises(ValueError):
+            pragma_statements({'cache_size': '1; DROP TABLE x'})
+        with self.assertRaises(ValueError):
+            pragma_statements({'journal_mode': 'wal'})
+
+
+@override_settings(REPLICA_DATABASES=['replica'])
+class ReplicaRouterTests(TransactionTestCase):
+    router = PrimaryReplicaRouter()
+    
+    def serve(self, view, **cookies):
+        """Run ``view`` through the middleware; returns (response, database the view read from)"""
+        request = RequestFactory().get('/')
+        request.COOKIES.update(cookies)
+        read = []
+        
+        def get_response(request):
+            middleware.process_view(request, view, (), {})
+            view(request)
+            read.append(self.router.db_for_read(Patient))
+            return HttpResponse()
+        
+        middleware = ReplicaRoutingMiddleware(get_response)
+        return middleware(request), read[0]
+    
+    def reader(self, request):
+        pass
+    
+    def writer(self, request):
+        self.router.db_for_write(Bill)
+    
+    def test_reads_outside_requests_use_the_primary(self):
+        self.assertEqual(self.router.db_for_read(Patient), 'default')
+        self.assertEqual(self.router.db_for_write(Patient), 'default')
+    
+    def test_request_reads_use_a_replica_until_the_request_writes(self):
+        response, database = self.serve(self.reader)
+        self.assertEqual(database, 'replica')
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+        
+        response, database = self.serve(self.writer)
+        self.assertEqual(database, 'default')
+        self.assertEqual(response.cookies[PIN_COOKIE]['max-age'], 5)
+        # The client's next requests read their own writes
+        self.assertEqual(self.serve(self.reader, **{PIN_COOKIE: '1'})[1], 'default')
+    
+    def test_views_can_insist_on_the_primary(self):
+        self.assertEqual(self.serve(read_from_primary(lambda request: None))[1], 'default')
+        
+        def build(request):
+            with primary_reads():
+                self.assertEqual(self.router.db_for_read(Patient), 'default')
+        self.assertEqual(self.serve(build)[1], 'replica')
+    
+    def test_transactions_and_sessions_stay_on_the_primary(self):
+        def atomic(request):
+            with transaction.atomic():
+                self.assertEqual(self.router.db_for_read(Patient), 'default')
+        self.serve(atomic)
+        self.serve(lambda request: self.assertEqual(self.router.db_for_read(Session), 'default'))
+    
+    def test_sync_replica_copies_the_primary(self):
+        make_patient(name='Copied Patient')
+        with tempfile.TemporaryDirectory() as directory:
+            target = os.path.join(directory, 'replica.sqlite3')
+            call_command('sync_replica', output=target, stdout=io.StringIO())
+            copy = sqlite3.connect(target)
+            try:
+                names = [name for name, in copy.execute(f'SELECT name FROM "{Patient._meta.db_table}"')]
+            finally:
+                copy.close()
+        self.assertEqual(names, ['Copied Patient'])
+
+
+class DashboardTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = make_doctor('Gregory House')
+        Doctor.objects.filter(pk=make_doctor('James Wilson').pk).update(is_active=False)
+        cls.patient = make_patient()
+        make_patient(name='Discharged', phone='+1234567800', status='discharged')
+        today = date.today()
+        for day, status in [(today, 'scheduled'), (today, 'completed'), (today + timedelta(days=1), 'scheduled')]:
+            Appointment.objects.create(
+                patient=cls.patient, doctor=cls.doctor, appointment_date=day,
+                appointment_time='10:00' if status == 'scheduled' else '11:00', reason='Checkup', status=status,
+            )
+        for status in ['unpaid', 'overdue', 'paid']:
+            Bill.objects.create(patient=cls.patient, total_amount=10, due_date=today, status=status)
+        Room.objects.create(room_number='101', room_type='general', floor=1)
+        Room.objects.create(room_number='102', room_type='general', floor=1, status='maintenance')
+    
+    def setUp(self):
+        cache.clear()
+    
+    def dashboard(self):
+        with mock.patch('Hospital.views.render', return_value=HttpResponse()) as render:
+            self.client.get(reverse('hospital:dashboard'))
+        return render.call_args.args[2]
+    
+    def test_counters_come_from_one_query(self):
+        with self.assertNumQueries(1):
+            counts = count_statistics(date.today())
+        self.assertEqual(counts, {
+            'total_patients': 2,
+            'active_patients': 1,
+            'total_doctors': 1,
+            'today_appointments': 1,
+            'pending_bills': 2,
+            'available_rooms': 1,
+        })
+    
+    def test_page_loads_the_live_feed_client(self):
+        response = self.client.get(reverse('hospital:dashboard'))
+        self.assertContains(response, 'src="/static/main.js"')
+        self.assertContains(response, f'data-live-feed="{reverse("hospital:api_live_feed")}"')
+    
+    def test_context_is_cached_until_a_patient_or_bill_changes(self):
+        self.assertEqual(self.dashboard()['total_patients'], 2)
+        with self.assertNumQueries(0):
+            self.dashboard()
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            make_patient(name='New', phone='+1234567801')
+        self.assertEqual(self.dashboard()['total_patients'], 3)
+        with self.captureOnCommitCallbacks(execute=True):
+            bill = Bill.objects.get(status='unpaid')
+            bill.status = 'paid'
+            bill.save()
+        self.assertEqual(self.dashboard()['pending_bills'], 1)
+        with self.assertNumQueries(0):
+            self.dashboard()
+
+
+class PageCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = make_doctor('Gregory House', 'cardiology')
+        cls.other = make_doctor('James Wilson', 'oncology')
+    
+    def setUp(self):
+        cache.clear()
+        self.renders = 0
+        patcher = mock.patch('Hospital.views.render', side_effect=self.render)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    def render(self, request, template_name, context):
+        self.renders += 1
+        return HttpResponse(f'{template_name} {self.renders}')
+    
+    def get(self, name, *args, **query):
+        return self.client.get(reverse(f'hospital:{name}', args=args), query).content.decode()
+    
+    def test_pages_are_rendered_once_per_version(self):
+        first = self.get('doctor_detail', self.doctor.pk)
+        self.assertEqual(self.get('doctor_detail', self.doctor.pk), first)
+        self.assertEqual(self.renders, 1)
+        
+        # Another doctor's changes leave the page alone; its own and its appointments' do not
+        with self.captureOnCommitCallbacks(execute=True):
+            self.other.save()
+        self.assertEqual(self.get('doctor_detail', self.doctor.pk), first)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.doctor.save()
+        second = self.get('doctor_detail', self.doctor.pk)
+        self.assertNotEqual(second, first)
+        with self.captureOnCommitCallbacks(execute=True):
+            Appointment.objects.create(
+                patient=make_patient(), doctor=self.doctor, appointment_date=date.today(),
+                appointment_time='10:00', reason='Checkup',
+            )
+        self.assertNotIn(self.get('doctor_detail', self.doctor.pk), [first, second])
+    
+    def test_rooms_bump_their_department_and_stays_their_room(self):
+        department = Department.objects.create(name='Cardiology')
+        room = Room.objects.create(room_number='101', room_type='general', floor=1, department=department)
+        before = self.get('department_detail', department.pk), self.get('room_detail', room.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            assign_bed(room, make_patient())
+        after = self.get('department_detail', department.pk), self.get('room_detail', room.pk)
+        self.assertNotEqual(after[0], before[0])
+        self.assertNotEqual(after[1], before[1])
+        self.assertEqual(self.renders, 4)
+    
+    def test_query_strings_are_cached_apart(self):
+        before = all_stats().get('page:doctor_list', {'hits': 0, 'misses': 0})
+        everyone = self.get('doctor_list')
+        oncology = self.get('doctor_list', specialty='oncology')
+        self.assertNotEqual(oncology, everyone)
+        self.assertEqual(self.get('doctor_list', specialty='oncology'), oncology)
+        stats = all_stats()['page:doctor_list']
+        self.assertEqual((stats['hits'] - before['hits'], stats['misses'] - before['misses']), (1, 2))
+    
+    def test_per_client_responses_are_not_stored(self):
+        def with_token(request, template_name, context):
+            get_token(request)
+            return self.render(request, template_name, context)
+        
+        with mock.patch('Hospital.views.render', side_effect=with_token):
+            self.get('department_list')
+            self.get('department_list')
+        self.assertEqual(self.renders, 2)
+        
+        self.client.cookies['messages'] = 'pending'
+        self.get('department_list')
+        self.get('department_list')
+        self.assertEqual(self.renders, 4)
+    
+    def test_fragments_follow_their_objects(self):
+        fragment = Template(
+            '{% load hospital_cache %}{% versioned_cache "doctor_card" doctor %}{{ doctor.name }} '
+            '{{ counter.next }}{% endversioned_cache %}'
+        )
+        counter = iter(range(10))
+        context = {'doctor': self.doctor, 'counter': {'next': lambda: next(counter)}}
+        first = fragment.render(Context(context))
+        self.assertEqual(fragment.render(Context(context)), first)
+        self.assertNotEqual(fragment.render(Context({**context, 'doctor': self.other})), first)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.doctor.save()
+        self.assertEqual(fragment.render(Context(context)), 'Gregory House 2')
+
+
+class AttachmentStorageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.patient = make_patient()
+        cls.doctor = make_doctor('Gregory House')
+    
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(MEDIA_ROOT=directory.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+    
+    def record(self, name, content):
+        return MedicalRecord.objects.create(
+            patient=self.patient, doctor=self.doctor, visit_date=timezone.now(),
+            symptoms='Cough', diagnosis='Cold', treatment='Rest', attachments=ContentFile(content, name=name),
+        )
+    
+    def download(self, record, **headers):
+        response = self.client.get(
+            reverse('hospital:medical_record_attachment', args=[self.patient.pk, record.pk]), headers=headers,
+        )
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, body
+    
+    def test_identical_uploads_share_one_file(self):
+        first = self.record('scan.dcm', b'pixels' * 1000)
+        second = self.record('copy of scan.dcm', b'pixels' * 1000)
+        other = self.record('scan.dcm', b'other pixels')
+        self.assertEqual(first.attachments.name.rsplit('/', 1)[1], 'scan.dcm')
+        self.assertEqual(first.attachments.path, second.attachments.path)
+        self.assertNotEqual(first.attachments.path, other.attachments.path)
+        self.assertEqual(len(list(first.attachments.storage.blobs())), 2)
+        with second.attachments.open('rb') as file:
+            self.assertEqual(file.read(), b'pixels' * 1000)
+    
+    def test_ranges_and_conditional_requests(self):
+        record = self.record('scan.dcm', b'0123456789')
+        response, body = self.download(record)
+        self.assertEqual((response.status_code, body), (200, b'0123456789'))
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('attachment; filename="scan.dcm"', response['Content-Disposition'])
+        etag = response['ETag']
+        
+        for header, status, expected in [
+            ('bytes=2-5', 206, b'2345'), ('bytes=7-', 206, b'789'), ('bytes=-3', 206, b'789'),
+            ('bytes=5-100', 206, b'56789'), ('bytes=0-1,4-5', 200, b'0123456789'), ('bytes=10-', 416, b''),
+        ]:
+            with self.subTest(range=header):
+                response, body = self.download(record, Range=header)
+                self.assertEqual((response.status_code, body), (status, expected))
+        response, _ = self.download(record, Range='bytes=2-5')
+        self.assertEqual(response['Content-Range'], 'bytes 2-5/10')
+        self.assertEqual(response['Content-Length'], '4')
+        
+        self.assertEqual(self.download(record, If_None_Match=etag)[0].status_code, 304)
+        # A range of an older version of the file is not mixed with this one
+        self.assertEqual(self.download(record, Range='bytes=2-5', If_Range='"stale"')[0].status_code, 200)
+        self.assertEqual(self.download(record, Range='bytes=2-5', If_Range=etag)[0].status_code, 206)
+    
+    def test_files_saved_before_the_storage_are_still_served(self):
+        storage = MedicalRecord._meta.get_field('attachments').storage
+        os.makedirs(os.path.join(storage.location, 'medical_records'))
+        with open(os.path.join(storage.location, 'medical_records', 'old.pdf'), 'wb') as file:
+            file.write(b'%PDF old')
+        record = self.record('new.pdf', b'%PDF new')
+        MedicalRecord.objects.filter(pk=record.pk).update(attachments='medical_records/old.pdf')
+        record.refresh_from_db()
+        response, body = self.download(record)
+        self.assertEqual((response.status_code, body), (200, b'%PDF old'))
+    
+    def test_prune_deletes_only_unreferenced_blobs(self):
+        kept = self.record('a.txt', b'shared')
+        dropped = self.record('b.txt', b'dropped')
+        self.record('c.txt', b'shared').delete()
+        dropped.delete()
+        output = io.StringIO()
+        call_command('prune_attachments', grace=0, stdout=output)
+        self.assertIn('Deleted 1 unreferenced blobs', output.getvalue())
+        self.assertTrue(os.path.exists(kept.attachments.path))
+        self.assertEqual([digest for digest, _ in kept.attachments.storage.blobs()], [digest_of(kept.attachments.name)])
+
+
+class ArchiveTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = make_doctor('Gregory House')
+        cls.long_ago = date.today() - timedelta(days=800)
+    
+    def discharged_patient(self, **kwargs):
+        return make_patient(status='discharged', discharge_date=self.long_ago, **kwargs)
+    
+    def appointment(self, patient, status='completed', day=None):
+        return Appointment.objects.create(
+            patient=patient, doctor=self.doctor, appointment_date=day or self.long_ago,
+            appointment_time='09:00', reason='Checkup', status=status,
+        )
+    
+    def bill(self, patient, status='paid', day=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            bill = create_bill({
+                'patient': patient.pk,
+                'due_date': '2030-12-31',
+                'payment_method': 'cash',
+                'items': [{'type': 'consultation', 'description': 'Visit', 'quantity': 1, 'unit_price': '40.00'}],
+            })
+        Bill.objects.filter(pk=bill.pk).update(status=status, bill_date=day or self.long_ago)
+        return bill
+    
+    def archive(self, *kinds, **options):
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('archive_records', *[f'--only={kind}' for kind in kinds], stdout=io.StringIO(), **options)
+    
+    def test_patients_move_with_all_their_rows(self):
+        patient = self.discharged_patient()
+        self.appointment(patient)
+        bill = self.bill(patient)
+        MedicalRecord.objects.create(
+            patient=patient, doctor=self.doctor, visit_date=timezone.now(),
+            symptoms='Cough', diagnosis='Cold', treatment='Rest',
+        )
+        kept = make_patient()
+        self.archive('patients')
+        
+        self.assertEqual(list(Patient.objects.all()), [kept])
+        self.assertEqual(ArchivedPatient.objects.get().pk, patient.pk)
+        self.assertEqual(ArchivedAppointment.objects.filter(patient_id=patient.pk).count(), 1)
+        self.assertEqual(ArchivedBill.objects.get().bill_number, bill.bill_number)
+        self.assertEqual(ArchivedBill.objects.get().items.count(), 1)
+        self.assertEqual(ArchivedMedicalRecord.objects.filter(patient_id=patient.pk).count(), 1)
+        self.assertFalse(Appointment.objects.exists() or Bill.objects.exists() or BillItem.objects.exists())
+    
+    def test_patients_with_open_business_stay(self):
+        self.appointment(self.discharged_patient(), status='scheduled', day=date.today() + timedelta(days=3))
+        self.bill(self.discharged_patient(), status='unpaid')
+        make_patient(status='discharged', discharge_date=date.today())
+        self.archive('patients')
+        self.assertEqual(Patient.objects.count(), 3)
+        self.assertFalse(ArchivedPatient.objects.exists())
+    
+    def test_every_patient_relation_is_archived_with_the_patient(self):
+        _, steps = PLANS['patients']
+        archived = {model for model, _ in steps}
+        for relation in Patient._meta.related_objects:
+            if relation.related_model is not Room:
+                self.assertIn(relation.related_model, archived, relation.name)
+    
+    def test_old_appointments_and_bills_move_in_batches(self):
+        patient = make_patient()
+        for days in range(5):
+            self.appointment(patient, day=self.long_ago - timedelta(days=days))
+            self.bill(patient)
+        self.appointment(patient, status='scheduled', day=self.long_ago - timedelta(days=10))
+        self.appointment(patient, day=date.today())
+        unpaid = self.bill(patient, status='unpaid')
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            batches = list(archive('appointments', batch_size=2))
+        self.assertEqual(batches, [{'Hospital.Appointment': 2}] * 2 + [{'Hospital.Appointment': 1}])
+        self.assertEqual(Appointment.objects.count(), 2)
+        self.archive('bills', batch_size=2)
+        self.assertEqual(ArchivedBill.objects.count(), 5)
+        self.assertEqual(ArchivedBillItem.objects.count(), 5)
+        self.assertEqual(list(Bill.objects.all()), [unpaid])
+    
+    def test_include_archived_reads_both_tables(self):
+        patient = make_patient()
+        self.appointment(patient)
+        recent = self.appointment(patient, day=date.today())
+        self.archive('appointments')
+        rows = list(include_archived(Appointment, patient_id=patient.pk))
+        self.assertEqual([(row.pk, row.archived) for row in rows], [(recent.pk - 1, True), (recent.pk, False)])
+        self.assertIsInstance(rows[0], Appointment)
+    
+    def test_patient_detail_falls_back_to_the_archive(self):
+        patient = self.discharged_patient()
+        self.appointment(patient)
+        self.archive()
+        with mock.patch('Hospital.views.render', return_value=HttpResponse()) as render:
+            self.client.get(reverse('hospital:patient_detail', args=[patient.pk]))
+        context = render.call_args.args[2]
+        self.assertTrue(context['archived'])
+        self.assertEqual(context['patient'].name, patient.name)
+        self.assertEqual([appointment.doctor for appointment in context['appointments']], [self.doctor])
+    
+    def test_revenue_counts_archived_bills(self):
+        self.bill(make_patient())
+        self.archive('bills')
+        rebuild(self.long_ago, self.long_ago)
+        self.assertEqual(revenue_summary(self.long_ago, self.long_ago)['total_revenue'], Decimal('40.00'))
+        # With no hot bill left the backfill still finds the archived ones
+        DailyRevenue.objects.all().delete()
+        call_command('backfill_revenue_rollup', stdout=io.StringIO())
+        self.assertEqual(revenue_summary(self.long_ago, self.long_ago)['total_revenue'], Decimal('40.00'))
+    
+    def test_reports_count_archived_rows(self):
+        archived = self.discharged_patient(assigned_doctor=self.doctor, admitted_date=self.long_ago - timedelta(days=2))
+        self.appointment(archived)
+        self.bill(archived)
+        hot = make_patient(assigned_doctor=self.doctor)
+        self.appointment(hot, status='cancelled', day=self.long_ago + timedelta(days=1))
+        self.bill(hot)
+        self.archive()
+        self.archive('appointments')
+        self.archive('bills')
+        self.assertFalse(Appointment.objects.exists() or Bill.objects.exists())
+        
+        start, end = self.long_ago - timedelta(days=7), self.long_ago + timedelta(days=7)
+        metrics = doctor_performance([self.doctor.pk], start, end)[self.doctor.pk]
+        self.assertEqual(metrics['by_status'], {'completed': 1, 'cancelled': 1})
+        self.assertEqual(metrics['avg_duration_minutes'], 30)
+        self.assertEqual(metrics['billed_revenue'], Decimal('80.00'))
+        summary = patient_summary(start, end)
+        self.assertEqual((summary['admitted'], summary['discharged'], summary['avg_stay_days']), (1, 1, 2.0))
+        self.assertEqual(monthly(start, end)['appointments_by_status'], {'completed': 1, 'cancelled': 1})
+
+
+class ImportPatientsTests(TestCase):
+    HEADER = 'name,age,gender,phone,address,emergency_contact,emergency_phone,diagnosis,admitted_date,assigned_doctor\n'
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = make_doctor('Gregory House')
+    
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+    
+    def run_import(self, name, content, **options):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(content)
+        output = io.StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('import_patients', path, stdout=output, **{'workers': 0, **options})
+        return path, output.getvalue()
+    
+    def rejects(self, path):
+        with open(f'{path}.rejects.csv', encoding='utf-8') as file:
+            return [(int(line), errors) for line, errors, _ in list(csv.reader(file))[1:]]
+    
+    def test_csv_rows_are_validated_with_the_model_fields(self):
+        license_number = self.doctor.license_number
+        path, output = self.run_import('patients.csv', self.HEADER + (
+            f'Ann Lee,34,female,+15551234567,1 Main St,Kin,+15551234568,Flu,2026-01-05,{license_number}\n'
+            'Bob Ray,51,male,+15551234569,2 Main St,Kin,+15551234568,Cold,2026-01-06,\n'
+            'Bad Phone,40,female,call me,3 Main St,Kin,+15551234568,Flu,2026-01-05,\n'
+            'Bad Gender,40,robot,+15551234567,4 Main St,Kin,+15551234568,Flu,2026-01-05,\n'
+            'No Doctor,40,male,+15551234567,5 Main St,Kin,+15551234568,Flu,not a date,LIC-unknown\n'
+        ), chunk_size=2)
+        self.assertIn('Imported 2 patients', output)
+        self.assertIn('3 rejected', output)
+        ann = Patient.objects.get(name='Ann Lee')
+        self.assertEqual((ann.age, ann.status, ann.assigned_doctor), (34, 'active', self.doctor))
+        self.assertEqual(ann.admitted_date, date(2026, 1, 5))
+        self.assertIsNone(Patient.objects.get(name='Bob Ray').assigned_doctor)
+        
+        rejects = self.rejects(path)
+        self.assertEqual([line for line, _ in rejects], [4, 5, 6])
+        self.assertIn('phone: Phone number must be entered', rejects[0][1])
+        self.assertIn("gender: Value 'robot' is not a valid choice.", rejects[1][1])
+        self.assertIn('admitted_date', rejects[2][1])
+        self.assertIn("no doctor has license number 'LIC-unknown'", rejects[2][1])
+    
+    def test_ndjson_in_worker_processes(self):
+        rows = [
+            {'name': f'Patient {number}', 'age': 30 + number, 'gender': 'other', 'phone': f'+1555000{number:04d}',
+             'address': 'Street', 'emergency_contact': 'Kin', 'emergency_phone': '+15550000000',
+             'diagnosis': 'Flu', 'admitted_date': '2026-02-01', 'blood_group': 'O+'}
+            for number in range(25)
+        ]
+        rows[7]['blood_group'] = 'Z'
+        content = '\n'.join(json.dumps(row) for row in rows) + '\n{not json\n'
+        path, output = self.run_import('patients.ndjson', content, workers=2, chunk_size=4)
+        self.assertEqual(Patient.objects.count(), 24)
+        self.assertEqual(Patient.objects.filter(blood_group='O+').count(), 24)
+        self.assertEqual([line for line, _ in self.rejects(path)], [8, 26])
+        self.assertIn('Imported 24 patients', output)
+    
+    def test_imported_patients_are_searchable_and_invalidate_caches(self):
+        autocomplete_index.load()
+        self.addCleanup(autocomplete_index.clear)
+        self.run_import('patients.csv', self.HEADER + (
+            'Zelda Quill,34,female,+15551234567,1 Main St,Kin,+15551234568,Flu,2026-01-05,\n'
+        ))
+        self.assertFalse(autocomplete_index.is_current())
+        self.assertEqual([patient.name for patient in search_patients('zelda')], ['Zelda Quill'])
+    
+    def test_dry_run_and_unknown_columns(self):
+        _, output = self.run_import('patients.csv', self.HEADER + (
+            'Ann Lee,34,female,+15551234567,1 Main St,Kin,+15551234568,Flu,2026-01-05,\n'
+        ), dry_run=True)
+        self.assertIn('Validated 1 patients', output)
+        self.assertFalse(Patient.objects.exists())
+        with self.assertRaisesMessage(CommandError, 'Unknown columns: shoe_size'):
+            self.run_import('patients.csv', 'name,shoe_size\nAnn,42\n')
+
+
+class AppointmentSeriesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.patient = make_patient()
+        cls.doctor = make_doctor('Gregory House')
+        cls.other_doctor = make_doctor('James Wilson')
+        cls.monday = date(2030, 1, 7)
+    
+    def series(self, **kwargs):
+        return {
+            'patient': self.patient.pk, 'doctor': self.doctor.pk, 'start_date': self.monday.isoformat(),
+            'time': '10:00', 'occurrences': 4, 'reason': 'Physiotherapy', **kwargs,
+        }
+    
+    def existing(self, weeks, at, duration=30, doctor=None, status='scheduled', patient=None):
+        return Appointment.objects.create(
+            patient=patient or make_patient(name='Someone Else'), doctor=doctor or self.doctor,
+            appointment_date=self.monday + timedelta(weeks=weeks), appointment_time=at,
+            duration_minutes=duration, reason='Other', status=status,
+        )
+    
+    def test_conflicts_are_returned_and_free_slots_booked(self):
+        overlapping = self.existing(1, '09:30', duration=60)
+        self.existing(1, '10:30')
+        cancelled = self.existing(2, '10:00', status='cancelled')
+        patient_busy = self.existing(3, '10:15', doctor=self.other_doctor, patient=self.patient)
+        with self.captureOnCommitCallbacks(execute=True):
+            booked, conflicts = book_series(self.series())
+        self.assertEqual([appointment.appointment_date for appointment in booked], [self.monday])
+        self.assertEqual(Appointment.objects.get(pk=booked[0].pk).reason, 'Physiotherapy')
+        self.assertEqual(
+            [(conflict['date'], conflict['reason'], conflict['appointment_id']) for conflict in conflicts],
+            [
+                (self.monday + timedelta(weeks=1), 'doctor_busy', overlapping.pk),
+                (self.monday + timedelta(weeks=2), 'doctor_busy', cancelled.pk),
+                (self.monday + timedelta(weeks=3), 'patient_busy', patient_busy.pk),
+            ],
+        )
+    
+    def test_queries_do_not_grow_with_the_series(self):
+        with CaptureQueriesContext(connection) as short:
+            book_series(self.series(occurrences=2, start_date='2031-01-06'))
+        with CaptureQueriesContext(connection) as long:
+            book_series(self.series(occurrences=40, frequency='daily'))
+        self.assertEqual(len(long), len(short))
+        self.assertEqual(Appointment.objects.filter(doctor=self.doctor).count(), 42)
+    
+    def test_all_or_nothing(self):
+        self.existing(2, '10:00')
+        booked, conflicts = book_series(self.series(), all_or_nothing=True)
+        self.assertEqual((booked, len(conflicts)), ([], 1))
+        self.assertFalse(Appointment.objects.filter(patient=self.patient).exists())
+    
+    def test_api(self):
+        url = reverse('hospital:api_appointment_series')
+        self.existing(0, '10:00')
+        response = self.client.post(url, self.series(frequency='fortnightly'), content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        body = response.json()
+        self.assertEqual([slot['date'] for slot in body['booked']], ['2030-01-21', '2030-02-04', '2030-02-18'])
+        self.assertEqual(body['conflicts'][0]['reason'], 'doctor_busy')
+        
+        response = self.client.post(url, self.series(time='18:00'), content_type='application/json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual({conflict['reason'] for conflict in response.json()['conflicts']}, {'outside_clinic_hours'})
+        response = self.client.post(url, self.series(frequency='hourly'), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('frequency must be one of', response.json()['message'])
+
+
+class StatusSweepTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.patient = make_patient()
+        cls.doctor = make_doctor('Gregory House')
+        cls.today = timezone.localdate()
+    
+    def bill(self, due_in_days, status='unpaid'):
+        with self.captureOnCommitCallbacks(execute=True):
+            bill = create_bill({
+                'patient': self.patient.pk, 'due_date': '2030-12-31', 'total_amount': '10.00',
+            })
+        Bill.objects.filter(pk=bill.pk).update(due_date=self.today + timedelta(days=due_in_days), status=status)
+        return bill
+    
+    def appointment(self, day, at, status='scheduled'):
+        return Appointment.objects.create(
+            patient=self.patient, doctor=self.doctor, appointment_date=day, appointment_time=at,
+            reason='Checkup', status=status,
+        )
+    
+    def statuses(self, model):
+        return dict(model.objects.values_list('pk', 'status'))
+    
+    def test_unpaid_bills_past_due_become_overdue_one_update_per_range(self):
+        overdue = [self.bill(-days) for days in range(1, 6)]
+        paid = self.bill(-3, status='paid')
+        current = self.bill(0)
+        with CaptureQueriesContext(connection) as queries:
+            with self.captureOnCommitCallbacks(execute=True):
+                updates = list(sweep('bills', chunk_size=2))
+        self.assertEqual(updates, [2, 2, 1])
+        self.assertEqual(sum('UPDATE' in query['sql'] for query in queries), 3)
+        statuses = self.statuses(Bill)
+        self.assertEqual({statuses[bill.pk] for bill in overdue}, {'overdue'})
+        self.assertEqual((statuses[paid.pk], statuses[current.pk]), ('paid', 'unpaid'))
+        self.assertTrue(Bill.objects.get(pk=overdue[0].pk).is_overdue)
+        self.assertEqual(count_statistics(self.today)['pending_bills'], 6)
+    
+    def test_past_scheduled_appointments_become_no_shows(self):
+        now = timezone.make_aware(datetime.combine(self.today, datetime.min.time()).replace(hour=12))
+        yesterday = self.appointment(self.today - timedelta(days=1), '15:00')
+        this_morning = self.appointment(self.today, '10:00')
+        within_grace = self.appointment(self.today, '11:30')
+        completed = self.appointment(self.today - timedelta(days=2), '09:00', status='completed')
+        later = self.appointment(self.today, '16:00')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(sum(sweep('appointments', now=now)), 2)
+        statuses = self.statuses(Appointment)
+        self.assertEqual(
+            [statuses[appointment.pk] for appointment in (yesterday, this_morning, within_grace, completed, later)],
+            ['no_show', 'no_show', 'scheduled', 'completed', 'scheduled'],
+        )
+    
+    def test_command_and_admin_filter(self):
+        self.bill(-10)
+        output = io.StringIO()
+        call_command('sweep_statuses', dry_run=True, stdout=output)
+        self.assertIn('bills: 1 due to become overdue', output.getvalue())
+        self.assertFalse(Bill.objects.filter(status='overdue').exists())
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('sweep_statuses', stdout=output)
+        self.assertIn('bills: 1 marked overdue with 1 updates', output.getvalue())
+        self.bill(-1)
+        admin_user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(admin_user)
+        response = self.client.get(reverse('admin:Hospital_bill_changelist'), {'overdue': 'overdue'})
+        self.assertEqual(response.context['cl'].result_count, 2)
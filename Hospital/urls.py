@@ -17,16 +17,19 @@ urlpatterns = [
     path('patients/<int:patient_id>/', views.patient_detail, name='patient_detail'),
     path('patients/<int:patient_id>/medical-records/', views.medical_record_list, name='medical_record_list'),
     path('patients/<int:patient_id>/medical-records/create/', views.medical_record_create, name='medical_record_create'),
+    path('patients/<int:patient_id>/medical-records/<int:record_id>/attachment/', views.medical_record_attachment, name='medical_record_attachment'),
 
     # Appointments
     path('appointments/', views.appointment_list, name='appointment_list'),
     path('appointments/create/', views.appointment_create, name='appointment_create'),
     path('appointments/<int:appointment_id>/update-status/', views.appointment_update_status, name='appointment_update_status'),
+    path('api/appointments/series/', views.api_appointment_series, name='api_appointment_series'),
 
     # Billing
     path('bills/', views.bill_list, name='bill_list'),
     path('bills/create/', views.bill_create, name='bill_create'),
     path('bills/<int:bill_id>/', views.bill_detail, name='bill_detail'),
+    path('api/bills/bulk/', views.api_bill_bulk_create, name='api_bill_bulk_create'),
 
     # Rooms
     path('rooms/', views.room_list, name='room_list'),
@@ -39,8 +42,14 @@ urlpatterns = [
     # Reports
     path('reports/', views.report_list, name='report_list'),
     path('reports/revenue/generate/', views.generate_revenue_report, name='generate_revenue_report'),
+    path('reports/<int:report_id>/file/', views.report_attachment, name='report_attachment'),
 
     # AJAX/API
     path('api/patients/search/', views.api_patient_search, name='api_patient_search'),
     path('api/doctors/availability/', views.api_doctor_availability, name='api_doctor_availability'),
+    path('api/rooms/bed-board/', views.api_bed_board, name='api_bed_board'),
+    path('api/rooms/occupancy/', views.api_room_occupancy, name='api_room_occupancy'),
+    path('api/live/', views.api_live_feed, name='api_live_feed'),
+    path('api/cache/stats/', views.api_cache_stats, name='api_cache_stats'),
+    path('metrics', views.metrics, name='metrics'),
 ]
@@ -1,43 +1,55 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib import messages
-from django.http import JsonResponse
+from django.core.exceptions import ValidationError
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.core.paginator import Paginator
-from django.db.models import Q, Sum
+from django.db.models import Count, Q, prefetch_related_objects
 from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from django.views.decorators.http import require_http_methods
+from asgiref.sync import sync_to_async
 
 import json
 from datetime import datetime, timedelta
 
 from .models import (
     Doctor, Patient, Appointment, Bill, BillItem, 
-    Report, Department, Room, MedicalRecord
+    Report, Department, Room, MedicalRecord, ArchivedPatient
 )
+from .archive import include_archived
+from .autocomplete import index as autocomplete_index
+from .availability import active_doctors, adoctor_availability, afirst_free_slot
+from .billing import create_bill, create_bills
+from .booking import book_series
+from .caching import all_stats
+from .dashboard import dashboard_counters, get_dashboard_context
+from .downloads import serve_file
+from .live import astream, stream
+from .metrics import store as metrics_store
+from .occupancy import bed_board, occupants_at, open_bed_count, utilization
+from .pages import (
+    cached_page, department_detail_dependencies, department_list_dependencies, doctor_detail_dependencies,
+    doctor_list_dependencies, room_detail_dependencies,
+)
+from .pagination import CursorPaginator
+from .revenue import revenue_summary, summary_json
+from .routers import read_from_primary
+from .search import search_patients, top_patient_ids
 
 # Dashboard Views
 def dashboard(request):
     """Main dashboard with statistics"""
-    context = {
-        'total_patients': Patient.objects.count(),
-        'active_patients': Patient.objects.filter(status='active').count(),
-        'total_doctors': Doctor.objects.filter(is_active=True).count(),
-        'today_appointments': Appointment.objects.filter(
-            appointment_date=timezone.now().date(),
-            status='scheduled'
-        ).count(),
-        'pending_bills': Bill.objects.filter(status='unpaid').count(),
-        'available_rooms': Room.objects.filter(status='available').count(),
-        'recent_patients': Patient.objects.all()[:5],
-        'todays_appointments': Appointment.objects.filter(
-            appointment_date=timezone.now().date()
-        ).order_by('appointment_time')[:10],
-    }
+    context = get_dashboard_context()
     return render(request, 'home.html', context)
 
 # Doctor Views
+@cached_page(doctor_list_dependencies)
 def doctor_list(request):
     """List all doctors with search and filter"""
-    doctors = Doctor.objects.filter(is_active=True)
+    doctors = Doctor.objects.filter(is_active=True).annotate(
+        active_patients=Count('patients', filter=Q(patients__status='active'))
+    ).order_by('name')
     
     search_query = request.GET.get('search')
     if search_query:
@@ -65,11 +77,12 @@ def doctor_list(request):
     }
     return render(request, 'hospital/doctor_list.html', context)
 
+@cached_page(doctor_detail_dependencies)
 def doctor_detail(request, doctor_id):
     """View doctor details"""
     doctor = get_object_or_404(Doctor, id=doctor_id)
-    recent_appointments = doctor.appointments.all()[:10]
-    patient_count = doctor.patients.filter(status='active').count()
+    recent_appointments = doctor.appointments.select_related('patient')[:10]
+    patient_count = doctor.patient_count
     
     context = {
         'doctor': doctor,
@@ -81,23 +94,18 @@ def doctor_detail(request, doctor_id):
 # Patient Views
 def patient_list(request):
     """List all patients with search and filter"""
-    patients = Patient.objects.all()
+    patients = Patient.objects.select_related('assigned_doctor')
     
     search_query = request.GET.get('search')
     if search_query:
-        patients = patients.filter(
-            Q(name__icontains=search_query) |
-            Q(phone__icontains=search_query) |
-            Q(diagnosis__icontains=search_query)
-        )
+        patients = search_patients(search_query, patients)
     
     status_filter = request.GET.get('status')
     if status_filter:
         patients = patients.filter(status=status_filter)
     
-    paginator = Paginator(patients, 15)
-    page_number = request.GET.get('page')
-    patients_page = paginator.get_page(page_number)
+    paginator = CursorPaginator(patients, 15, estimate_count=True)
+    patients_page = paginator.get_page(request.GET.get('cursor'))
     
     statuses = [choice[0] for choice in Patient.STATUS_CHOICES]
     
@@ -110,14 +118,25 @@ def patient_list(request):
     return render(request, 'hospital/patient_list.html', context)
 
 def patient_detail(request, patient_id):
-    """View patient details"""
-    patient = get_object_or_404(Patient, id=patient_id)
-    appointments = patient.appointments.all()[:10]
-    bills = patient.bills.all()[:5]
-    medical_records = patient.medical_records.all()[:10]
+    """View patient details; ?include_archived=1 adds archived history"""
+    patient = Patient.objects.select_related('assigned_doctor').filter(id=patient_id).first()
+    archived = patient is None
+    if archived:
+        # Archived with all of their rows, so their history is all in the archive
+        patient = get_object_or_404(ArchivedPatient.objects.select_related('assigned_doctor'), id=patient_id)
+    if archived or request.GET.get('include_archived'):
+        appointments = list(include_archived(Appointment, patient_id=patient_id)[:10])
+        bills = list(include_archived(Bill, patient_id=patient_id)[:5])
+        medical_records = list(include_archived(MedicalRecord, patient_id=patient_id)[:10])
+        prefetch_related_objects(appointments + medical_records, 'doctor')
+    else:
+        appointments = patient.appointments.select_related('doctor')[:10]
+        bills = patient.bills.all()[:5]
+        medical_records = patient.medical_records.select_related('doctor')[:10]
     
     context = {
         'patient': patient,
+        'archived': archived,
         'appointments': appointments,
         'bills': bills,
         'medical_records': medical_records,
@@ -146,7 +165,7 @@ def patient_create(request):
                 admitted_date=request.POST['admitted_date'],
             )
             messages.success(request, 'Patient created successfully!')
-            return redirect('patient_detail', patient_id=patient.id)
+            return redirect('hospital:patient_detail', patient_id=patient.id)
         except Exception as e:
             messages.error(request, f'Error creating patient: {str(e)}')
     
@@ -162,7 +181,7 @@ def patient_create(request):
 # Appointment Views
 def appointment_list(request):
     """List appointments with filters"""
-    appointments = Appointment.objects.all()
+    appointments = Appointment.objects.select_related('patient', 'doctor')
     
     date_filter = request.GET.get('date')
     if date_filter:
@@ -176,9 +195,8 @@ def appointment_list(request):
     if status_filter:
         appointments = appointments.filter(status=status_filter)
     
-    paginator = Paginator(appointments, 20)
-    page_number = request.GET.get('page')
-    appointments_page = paginator.get_page(page_number)
+    paginator = CursorPaginator(appointments, 20, estimate_count=True)
+    appointments_page = paginator.get_page(request.GET.get('cursor'))
     
     doctors = Doctor.objects.filter(is_active=True)
     statuses = [choice[0] for choice in Appointment.STATUS_CHOICES]
@@ -208,7 +226,7 @@ def appointment_create(request):
                 notes=request.POST.get('notes', ''),
             )
             messages.success(request, 'Appointment scheduled successfully!')
-            return redirect('appointment_list')
+            return redirect('hospital:appointment_list')
         except Exception as e:
             messages.error(request, f'Error creating appointment: {str(e)}')
     
@@ -223,14 +241,39 @@ def appointment_create(request):
     return render(request, 'hospital/appointment_form.html', context)
 
 @require_http_methods(["POST"])
-def appointment_update_status(request, appointment_id):
+def api_appointment_series(request):
+    """Book a recurring series; the slots that conflict are returned, not booked"""
+    try:
+        payload = json.loads(request.body)
+        if not isinstance(payload, dict):
+            raise ValidationError('Expected a JSON object')
+        booked, conflicts = book_series(payload, all_or_nothing=bool(payload.get('all_or_nothing')))
+    except ValueError as e:
+        return JsonResponse({'success': False, 'message': f'Invalid JSON payload: {e}'}, status=400)
+    except ValidationError as e:
+        return JsonResponse({'success': False, 'message': ' '.join(e.messages)}, status=400)
+    
+    return JsonResponse({
+        'success': bool(booked),
+        'booked': [
+            {'id': appointment.id, 'date': appointment.appointment_date, 'time': appointment.appointment_time}
+            for appointment in booked
+        ],
+        'conflicts': conflicts,
+    }, status=201 if booked else 409)
+
+@require_http_methods(["POST"])
+async def appointment_update_status(request, appointment_id):
     """Update appointment status via AJAX"""
-    appointment = get_object_or_404(Appointment, id=appointment_id)
+    try:
+        appointment = await Appointment.objects.aget(id=appointment_id)
+    except Appointment.DoesNotExist:
+        raise Http404('No Appointment matches the given query.')
     new_status = request.POST.get('status')
     
     if new_status in [choice[0] for choice in Appointment.STATUS_CHOICES]:
         appointment.status = new_status
-        appointment.save()
+        await appointment.asave()
         return JsonResponse({'success': True, 'message': 'Status updated successfully'})
     
     return JsonResponse({'success': False, 'message': 'Invalid status'})
@@ -238,7 +281,7 @@ def appointment_update_status(request, appointment_id):
 # Bill Views
 def bill_list(request):
     """List bills with filters"""
-    bills = Bill.objects.all()
+    bills = Bill.objects.select_related('patient')
     
     status_filter = request.GET.get('status')
     if status_filter:
@@ -251,9 +294,8 @@ def bill_list(request):
             Q(bill_number__icontains=search_query)
         )
     
-    paginator = Paginator(bills, 15)
-    page_number = request.GET.get('page')
-    bills_page = paginator.get_page(page_number)
+    paginator = CursorPaginator(bills, 15, estimate_count=True)
+    bills_page = paginator.get_page(request.GET.get('cursor'))
     
     statuses = [choice[0] for choice in Bill.STATUS_CHOICES]
     
@@ -267,7 +309,7 @@ def bill_list(request):
 
 def bill_detail(request, bill_id):
     """View bill details"""
-    bill = get_object_or_404(Bill, id=bill_id)
+    bill = get_object_or_404(Bill.objects.select_related('patient'), id=bill_id)
     bill_items = bill.items.all()
     
     context = {
@@ -280,29 +322,21 @@ def bill_create(request):
     """Create new bill"""
     if request.method == 'POST':
         try:
-            bill = Bill.objects.create(
-                patient_id=request.POST['patient'],
-                total_amount=request.POST['total_amount'],
-                discount_amount=request.POST.get('discount_amount', 0),
-                tax_amount=request.POST.get('tax_amount', 0),
-                due_date=request.POST['due_date'],
-                description=request.POST.get('description', ''),
-            )
-            
             items_data = request.POST.get('items_json')
-            if items_data:
-                items = json.loads(items_data)
-                for item in items:
-                    BillItem.objects.create(
-                        bill=bill,
-                        item_type=item['type'],
-                        description=item['description'],
-                        quantity=item['quantity'],
-                        unit_price=item['unit_price'],
-                    )
+            bill = create_bill({
+                'patient': request.POST['patient'],
+                'total_amount': request.POST.get('total_amount'),
+                'discount_amount': request.POST.get('discount_amount', 0),
+                'tax_amount': request.POST.get('tax_amount', 0),
+                'due_date': request.POST['due_date'],
+                'description': request.POST.get('description', ''),
+                'items': json.loads(items_data) if items_data else [],
+            })
             
             messages.success(request, 'Bill created successfully!')
-            return redirect('bill_detail', bill_id=bill.id)
+            return redirect('hospital:bill_detail', bill_id=bill.id)
+        except ValidationError as e:
+            messages.error(request, f"Error creating bill: {' '.join(e.messages)}")
         except Exception as e:
             messages.error(request, f'Error creating bill: {str(e)}')
     
@@ -315,10 +349,39 @@ def bill_create(request):
     }
     return render(request, 'hospital/bill_form.html', context)
 
+@require_http_methods(["POST"])
+def api_bill_bulk_create(request):
+    """Create many itemized bills in one transaction (charge capture)"""
+    try:
+        payload = json.loads(request.body)
+        bills_data = payload['bills'] if isinstance(payload, dict) else payload
+        if not isinstance(bills_data, list) or not bills_data:
+            raise ValidationError('Expected a non-empty list of bills')
+        bills = create_bills(bills_data)
+    except (ValueError, KeyError) as e:
+        return JsonResponse({'success': False, 'message': f'Invalid JSON payload: {e}'}, status=400)
+    except ValidationError as e:
+        return JsonResponse({'success': False, 'message': ' '.join(e.messages)}, status=400)
+    
+    return JsonResponse({
+        'success': True,
+        'bills': [
+            {
+                'id': bill.id,
+                'bill_number': bill.bill_number,
+                'patient': bill.patient_id,
+                'total_amount': str(bill.total_amount),
+                'discount_amount': str(bill.discount_amount),
+                'tax_amount': str(bill.tax_amount),
+            }
+            for bill in bills
+        ],
+    }, status=201)
+
 # Room Views
 def room_list(request):
     """List rooms with status"""
-    rooms = Room.objects.all()
+    rooms = Room.objects.select_related('department', 'current_patient').annotate(occupied_beds=open_bed_count())
     
     status_filter = request.GET.get('status')
     if status_filter:
@@ -328,11 +391,14 @@ def room_list(request):
     if type_filter:
         rooms = rooms.filter(room_type=type_filter)
     
+    paginator = CursorPaginator(rooms, 25, estimate_count=True)
+    rooms_page = paginator.get_page(request.GET.get('cursor'))
+    
     statuses = [choice[0] for choice in Room.STATUS_CHOICES]
     room_types = [choice[0] for choice in Room.ROOM_TYPE_CHOICES]
     
     context = {
-        'rooms': rooms,
+        'rooms': rooms_page,
         'statuses': statuses,
         'room_types': room_types,
         'status_filter': status_filter,
@@ -340,12 +406,16 @@ def room_list(request):
     }
     return render(request, 'hospital/room_list.html', context)
 
+@cached_page(room_detail_dependencies)
 def room_detail(request, room_id):
     """View room details"""
-    room = get_object_or_404(Room, id=room_id)
+    room = get_object_or_404(Room.objects.select_related('department', 'current_patient'), id=room_id)
+    stays = room.occupancies.select_related('patient')
     
     context = {
         'room': room,
+        'current_stays': stays.filter(end__isnull=True).order_by('bed'),
+        'recent_stays': stays.filter(end__isnull=False)[:20],
     }
     return render(request, 'hospital/room_detail.html', context)
 
@@ -353,7 +423,7 @@ def room_detail(request, room_id):
 def medical_record_list(request, patient_id):
     """List medical records for a patient"""
     patient = get_object_or_404(Patient, id=patient_id)
-    records = patient.medical_records.all()
+    records = patient.medical_records.select_related('doctor')
     
     paginator = Paginator(records, 10)
     page_number = request.GET.get('page')
@@ -381,9 +451,10 @@ def medical_record_create(request, patient_id):
                 prescription=request.POST.get('prescription', ''),
                 follow_up_date=request.POST.get('follow_up_date') or None,
                 notes=request.POST.get('notes', ''),
+                attachments=request.FILES.get('attachments'),
             )
             messages.success(request, 'Medical record created successfully!')
-            return redirect('medical_record_list', patient_id=patient.id)
+            return redirect('hospital:medical_record_list', patient_id=patient.id)
         except Exception as e:
             messages.error(request, f'Error creating medical record: {str(e)}')
     
@@ -395,20 +466,30 @@ def medical_record_create(request, patient_id):
     }
     return render(request, 'hospital/medical_record_form.html', context)
 
+@require_http_methods(['GET', 'HEAD'])
+def medical_record_attachment(request, patient_id, record_id):
+    """Download a medical record's attachment; supports Range and conditional GET"""
+    record = get_object_or_404(MedicalRecord.objects.only('attachments'), id=record_id, patient_id=patient_id)
+    if not record.attachments:
+        raise Http404('This record has no attachment')
+    return serve_file(request, record.attachments.name, storage=record.attachments.storage)
+
 # Department Views
+@cached_page(department_list_dependencies)
 def department_list(request):
     """List all departments"""
-    departments = Department.objects.filter(is_active=True)
+    departments = Department.objects.filter(is_active=True).select_related('head_doctor')
     
     context = {
         'departments': departments,
     }
     return render(request, 'hospital/department_list.html', context)
 
+@cached_page(department_detail_dependencies)
 def department_detail(request, department_id):
     """View department details"""
-    department = get_object_or_404(Department, id=department_id)
-    rooms = department.rooms.all()
+    department = get_object_or_404(Department.objects.select_related('head_doctor'), id=department_id)
+    rooms = department.rooms.select_related('current_patient')
     
     context = {
         'department': department,
@@ -419,7 +500,7 @@ def department_detail(request, department_id):
 # Report Views
 def report_list(request):
     """List all reports"""
-    reports = Report.objects.all()
+    reports = Report.objects.select_related('generated_by')
     
     type_filter = request.GET.get('report_type')
     if type_filter:
@@ -434,24 +515,30 @@ def report_list(request):
     }
     return render(request, 'hospital/report_list.html', context)
 
+@require_http_methods(['GET', 'HEAD'])
+def report_attachment(request, report_id):
+    """Download a report's file; supports Range and conditional GET"""
+    report = get_object_or_404(Report.objects.only('file_attachment'), id=report_id)
+    if not report.file_attachment:
+        raise Http404('This report has no file')
+    return serve_file(request, report.file_attachment.name, storage=report.file_attachment.storage)
+
 def generate_revenue_report(request):
     """Generate revenue report"""
     if request.method == 'POST':
         start_date = request.POST['start_date']
         end_date = request.POST['end_date']
         
-        bills = Bill.objects.filter(
-            bill_date__range=[start_date, end_date],
-            status='paid'
-        )
-        
-        total_revenue = bills.aggregate(Sum('total_amount'))['total_amount__sum'] or 0
-        total_bills = bills.count()
+        # A few rollup rows per day instead of every paid bill in the range
+        revenue = revenue_summary(start_date, end_date)
+        total_revenue = revenue['total_revenue']
+        total_bills = revenue['total_bills']
         
         report = Report.objects.create(
             title=f'Revenue Report ({start_date} to {end_date})',
             report_type='revenue',
             summary=f'Total Revenue: ${total_revenue}, Total Bills: {total_bills}',
+            detailed_content=summary_json(revenue),
             generated_by=request.user if request.user.is_authenticated else None,
             report_date=timezone.now().date(),
             period_start=start_date,
@@ -459,17 +546,30 @@ def generate_revenue_report(request):
         )
         
         messages.success(request, 'Revenue report generated successfully!')
-        return redirect('report_list')
+        return redirect('hospital:report_list')
     
     return render(request, 'hospital/generate_report.html', {'report_type': 'revenue'})
 
 # API Views for AJAX requests
-def api_patient_search(request):
+async def api_patient_search(request):
     """API endpoint for patient search (AJAX)"""
     query = request.GET.get('q', '')
-    patients = Patient.objects.filter(
-        name__icontains=query
-    )[:10]
+    if query.strip():
+        # Served from this process's prefix index unless its copy is stale or loading
+        matches = await sync_to_async(autocomplete_index.search)(query, limit=10)
+        if matches is not None:
+            return JsonResponse({'results': [
+                {'id': patient_id, 'name': name, 'phone': phone, 'age': age}
+                for patient_id, name, phone, age in matches
+            ]})
+        # A raw FTS5 query; the async ORM has no raw cursor
+        ids = await sync_to_async(top_patient_ids)(query, limit=10)
+        patients = sorted(
+            [patient async for patient in Patient.objects.filter(id__in=ids)],
+            key=lambda patient: ids.index(patient.id),
+        )
+    else:
+        patients = [patient async for patient in Patient.objects.all()[:10]]
     
     results = []
     for patient in patients:
@@ -482,30 +582,142 @@ def api_patient_search(request):
     
     return JsonResponse({'results': results})
 
-def api_doctor_availability(request):
-    """Check doctor availability for appointment scheduling"""
-    doctor_id = request.GET.get('doctor_id')
-    date = request.GET.get('date')
-    
-    if not doctor_id or not date:
+# Slots are booked from this answer, so it must not lag
+@read_from_primary
+async def api_doctor_availability(request):
+    """Free appointment slots for one or many doctors over a date range.
+    
+    Takes doctor_id (one id or a comma separated list) and/or specialty,
+    date or start_date/end_date, and duration in minutes. With first=1 only
+    the earliest free slot across all the doctors is returned; without dates
+    it looks at the coming week, e.g. ?specialty=cardiology&first=1.
+    """
+    doctor_param = request.GET.get('doctor_id', '')
+    specialty = request.GET.get('specialty', '')
+    start_date = request.GET.get('start_date') or request.GET.get('date')
+    end_date = request.GET.get('end_date') or start_date
+    if not start_date and request.GET.get('first'):
+        # "First free slot this week"
+        start_date = timezone.localdate().isoformat()
+        end_date = (timezone.localdate() + timedelta(days=6)).isoformat()
+    
+    if not (doctor_param or specialty) or not start_date:
         return JsonResponse({'error': 'Missing parameters'})
     
-    appointments = Appointment.objects.filter(
-        doctor_id=doctor_id,
-        appointment_date=date,
-        status='scheduled'
-    ).values_list('appointment_time', flat=True)
-    
-    available_slots = []
-    start_time = datetime.strptime('09:00', '%H:%M').time()
-    end_time = datetime.strptime('17:00', '%H:%M').time()
-    
-    current_time = datetime.combine(datetime.today(), start_time)
-    end_datetime = datetime.combine(datetime.today(), end_time)
-    
-    while current_time <= end_datetime:
-        if current_time.time() not in appointments:
-            available_slots.append(current_time.strftime('%H:%M'))
-        current_time += timedelta(minutes=30)
-    
-    return JsonResponse({'available_slots': available_slots})
+    try:
+        doctor_ids = [int(value) for value in doctor_param.split(',') if value.strip()]
+        start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
+        end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
+        duration = int(request.GET.get('duration') or 0) or None
+        if duration is not None and duration < 0:
+            raise ValueError('duration must be positive')
+    except ValueError as e:
+        return JsonResponse({'error': f'Invalid parameters: {e}'}, status=400)
+    
+    doctors = [doctor async for doctor in active_doctors(specialty, doctor_ids).values_list('id', 'name')]
+    now = timezone.localtime().replace(tzinfo=None)
+    try:
+        if request.GET.get('first'):
+            found = await afirst_free_slot([doctor_id for doctor_id, _ in doctors], start_date, end_date, duration, now)
+            if found is None:
+                return JsonResponse({'first_available': None})
+            day, start, doctor_id = found
+            return JsonResponse({'first_available': {
+                'doctor_id': doctor_id,
+                'doctor_name': dict(doctors)[doctor_id],
+                'date': day.isoformat(),
+                'time': start.strftime('%H:%M'),
+            }})
+        availability = await adoctor_availability([doctor_id for doctor_id, _ in doctors], start_date, end_date, duration, now)
+    except ValidationError as e:
+        return JsonResponse({'error': ' '.join(e.messages)}, status=400)
+    
+    results = [
+        {
+            'id': doctor_id,
+            'name': name,
+            'days': {
+                day.isoformat(): [slot.strftime('%H:%M') for slot in slots]
+                for day, slots in availability[doctor_id].items()
+            },
+        }
+        for doctor_id, name in doctors
+    ]
+    response = {'doctors': results}
+    if len(doctor_ids) == 1 and start_date == end_date:
+        # The single doctor, single day shape the booking form reads
+        response['available_slots'] = results[0]['days'][start_date.isoformat()] if results else []
+    return JsonResponse(response)
+
+def api_bed_board(request):
+    """Beds, occupied and available beds per floor and per department"""
+    return JsonResponse(bed_board())
+
+def _parse_moment(value):
+    """Aware datetime from an ISO date or datetime string (a date is its midnight)"""
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f'{value!r} is not a date or datetime')
+        moment = datetime.combine(day, datetime.min.time())
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+def api_room_occupancy(request):
+    """Historical occupancy.
+    
+    ?at=<datetime> lists the beds occupied at that instant; ?date=<date> or
+    ?start=...&end=... gives occupied against available bed-hours over the
+    day or range, overall and per floor.
+    """
+    try:
+        if request.GET.get('at'):
+            at = _parse_moment(request.GET['at'])
+        else:
+            start = request.GET.get('start') or request.GET.get('date')
+            if not start:
+                return JsonResponse({'error': 'Missing parameters'})
+            start = _parse_moment(start)
+            end = _parse_moment(request.GET['end']) if request.GET.get('end') else start + timedelta(days=1)
+            if end <= start:
+                raise ValueError('end must be after start')
+    except ValueError as e:
+        return JsonResponse({'error': f'Invalid parameters: {e}'}, status=400)
+    
+    if request.GET.get('at'):
+        return JsonResponse({
+            'at': at.isoformat(),
+            'occupied': [
+                {
+                    'room': stay.room.room_number,
+                    'floor': stay.room.floor,
+                    'bed': stay.bed,
+                    'patient_id': stay.patient_id,
+                    'patient_name': patient_name,
+                    'since': stay.start.isoformat(),
+                }
+                for stay, patient_name in occupants_at(at)
+            ],
+        })
+    return JsonResponse({'start': start.isoformat(), 'end': end.isoformat(), **utilization(start, end)})
+
+def api_live_feed(request):
+    """Server-Sent Events: the dashboard counters, then every change as it commits"""
+    snapshot = dashboard_counters()
+    # Under ASGI a waiting screen costs no thread; under WSGI it holds one
+    events = astream(snapshot) if isinstance(request, ASGIRequest) else stream(snapshot)
+    response = StreamingHttpResponse(events, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Keep nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+def metrics(request):
+    """Per-view request metrics of this process for Prometheus to scrape"""
+    return HttpResponse(metrics_store.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+def api_cache_stats(request):
+    """Hit rate and rebuild time of the cached pages in this process"""
+    return JsonResponse({'caches': all_stats(), 'patient_autocomplete': autocomplete_index.stats()})
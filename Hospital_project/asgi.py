@@ -3,6 +3,18 @@ ASGI config for Hospital_project project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The JSON API views (api_patient_search, api_doctor_availability and
+appointment_update_status) are async and use the async ORM, so under ASGI an
+in-flight call holds no worker thread while it waits. The page views are
+still sync and run in a thread per request. To serve the project this way:
+
+    uvicorn Hospital_project.asgi:application --workers 4 --no-access-log
+
+or the equivalent with daphne or hypercorn. CONN_MAX_AGE is 0 under ASGI
+(HOSPITAL_CONN_MAX_AGE below): sync code runs in per-request threads, so
+persistent connections would pile up rather than be reused. ``manage.py bench_asgi`` compares the
+two deployments on these endpoints.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -12,5 +24,6 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Hospital_project.settings')
+os.environ.setdefault('HOSPITAL_CONN_MAX_AGE', '0')
 
 application = get_asgi_application()
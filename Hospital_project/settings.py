@@ -42,6 +42,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its timings cover every other middleware; served at /metrics
+    'Hospital.metrics.MetricsMiddleware',
+    # Before anything that reads or writes, so every query of the request is routed
+    'Hospital.routers.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -69,6 +73,8 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'Hospital_project.wsgi.application'
+# The JSON API views are async; see asgi.py for serving them under ASGI
+ASGI_APPLICATION = 'Hospital_project.asgi.application'
 
 
 # Database
@@ -78,10 +84,77 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Reuse a connection across requests (asgi.py sets 0, see there)
+        'CONN_MAX_AGE': int(os.environ.get('HOSPITAL_CONN_MAX_AGE', 600)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # IMMEDIATE takes the write lock at BEGIN, so concurrent writers
+            # wait their turn instead of failing with "database is locked"
+            'transaction_mode': os.environ.get('HOSPITAL_SQLITE_TRANSACTION_MODE') or None,
+        },
+        # File backed rather than in-memory, so concurrency tests see real locking
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
+    }
+}
+
+# Read replicas (Hospital.routers): request reads go to these aliases until
+# the request writes, writes always go to default. HOSPITAL_REPLICA_DB names
+# a local SQLite copy kept current with `manage.py sync_replica`.
+DATABASE_ROUTERS = ['Hospital.routers.PrimaryReplicaRouter']
+REPLICA_DATABASES = []
+# How long a client that wrote keeps reading from the primary; at least the
+# replication lag
+REPLICA_PIN_SECONDS = 5
+
+if os.environ.get('HOSPITAL_REPLICA_DB'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.environ['HOSPITAL_REPLICA_DB'],
+        'OPTIONS': dict(DATABASES['default']['OPTIONS']),
+        # Tests read the test database through the replica alias
+        'TEST': {'MIRROR': 'default'},
     }
+    REPLICA_DATABASES = ['replica']
+
+# archive_records moves discharged patients, finished appointments and
+# settled bills older than this into the archive tables (Hospital.archive)
+ARCHIVE_AFTER_MONTHS = 12
+
+
+# SQLite performance profile, applied to every new connection by
+# Hospital.sqlite_profile; an empty dict leaves SQLite's defaults. WAL is
+# stored in the database file and set by migration 0011.
+SQLITE_PRAGMAS = {
+    'synchronous': 'normal',
+    # Milliseconds a connection waits for a lock before "database is locked"
+    'busy_timeout': 5000,
+    # Negative means KiB: 32 MiB of page cache per connection
+    'cache_size': -32768,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'memory',
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Dashboard and page caches are invalidated by version counters stored here;
+# with several worker processes this must be a shared backend such as Redis
+# or Memcached, otherwise each process only sees its own invalidations.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'hospital',
+    }
+}
+
+# Live feed (Hospital.live): with a shared cache above, set this so that a
+# change made by one worker reaches the screens connected to every worker
+LIVE_FEED_SHARED = False
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -123,6 +196,18 @@ BASE_DIR / "staticfiles",
 MEDIA_URL = "media/"
 MEDIA_ROOT = BASE_DIR/ "mediafiles"
 
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    # Medical record and report attachments: stored once per distinct content
+    # (Hospital.storage), served with Range support by Hospital.downloads
+    'attachments': {'BACKEND': 'Hospital.storage.ContentAddressedStorage'},
+}
+# Behind nginx, the internal location that maps to MEDIA_ROOT (e.g.
+# '/protected-media/'): downloads are then handed to it with X-Accel-Redirect
+# and nginx sends the file with sendfile, ranges and all
+ATTACHMENT_ACCEL_REDIRECT = os.environ.get('HOSPITAL_ATTACHMENT_ACCEL_REDIRECT') or None
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -35,9 +35,13 @@ const dummy = {
         totalPatients: 156,
         activePatients: 89,
         totalDoctors: 24,
+        todayAppointments: 0,
+        pendingBills: 0,
+        availableRooms: 0,
         totalRevenue: 125000,
         monthlyGrowth: 12.5
-    }
+    },
+    activity: []
 };
 
 // Enhanced Sidebar Logic with smooth animations
@@ -133,27 +137,48 @@ function renderDashboard() {
     content.innerHTML = `
         <h2><i class="fa fa-chart-line"></i> Dashboard</h2>
         <div class="dashboard-cards">
-            <div class="card" data-count="${dummy.stats.totalPatients}">
+            <div class="card" data-count="${dummy.stats.totalPatients}" data-stat="totalPatients">
                 <i class="fa fa-user-injured"></i>
                 <div>
                     <span class="counter">0</span>
                     <p>Total Patients</p>
                 </div>
             </div>
-            <div class="card" data-count="${dummy.stats.activePatients}">
+            <div class="card" data-count="${dummy.stats.activePatients}" data-stat="activePatients">
                 <i class="fa fa-user-md"></i>
                 <div>
                     <span class="counter">0</span>
                     <p>Active Patients</p>
                 </div>
             </div>
-            <div class="card" data-count="${dummy.stats.totalDoctors}">
+            <div class="card" data-count="${dummy.stats.totalDoctors}" data-stat="totalDoctors">
                 <i class="fa fa-calendar-check"></i>
                 <div>
                     <span class="counter">0</span>
                     <p>Doctors</p>
                 </div>
             </div>
+            <div class="card" data-count="${dummy.stats.todayAppointments}" data-stat="todayAppointments">
+                <i class="fa fa-clock"></i>
+                <div>
+                    <span class="counter">0</span>
+                    <p>Today's Appointments</p>
+                </div>
+            </div>
+            <div class="card" data-count="${dummy.stats.pendingBills}" data-stat="pendingBills">
+                <i class="fa fa-file-invoice-dollar"></i>
+                <div>
+                    <span class="counter">0</span>
+                    <p>Unpaid Bills</p>
+                </div>
+            </div>
+            <div class="card" data-count="${dummy.stats.availableRooms}" data-stat="availableRooms">
+                <i class="fa fa-bed"></i>
+                <div>
+                    <span class="counter">0</span>
+                    <p>Available Rooms</p>
+                </div>
+            </div>
             <div class="card" data-count="${dummy.stats.totalRevenue}">
                 <i class="fa fa-dollar-sign"></i>
                 <div>
@@ -171,6 +196,10 @@ function renderDashboard() {
                 </div>
             </div>
         </div>
+        <div class="dashboard-quick">
+            <h3><i class="fa fa-bolt"></i> Live Activity</h3>
+            <ul id="liveActivity"></ul>
+        </div>
         <div class="dashboard-quick">
             <h3><i class="fa fa-chart-bar"></i> Recent Reports</h3>
             <ul>
@@ -186,6 +215,7 @@ function renderDashboard() {
             </ul>
         </div>
     `;
+    showActivity();
     
     // Animate counters
     animateCounters();
@@ -210,6 +240,88 @@ function animateCounters() {
     });
 }
 
+// Live feed: the server pushes the dashboard counters once, then each change
+// as it happens (see Hospital/live.py); nothing here polls. EventSource
+// reconnects on its own and the server answers with a fresh snapshot. The
+// feed URL comes from the script tag in home.html.
+const LIVE_FEED_URL = document.currentScript && document.currentScript.dataset.liveFeed;
+const STAT_KEYS = {
+    total_patients: 'totalPatients',
+    active_patients: 'activePatients',
+    total_doctors: 'totalDoctors',
+    today_appointments: 'todayAppointments',
+    pending_bills: 'pendingBills',
+    available_rooms: 'availableRooms',
+};
+const MAX_ACTIVITY = 10;
+
+function connectLiveFeed() {
+    if (!window.EventSource || !LIVE_FEED_URL) return;
+    const feed = new EventSource(LIVE_FEED_URL);
+    feed.addEventListener('snapshot', e => applyStats(JSON.parse(e.data)));
+    feed.addEventListener('stats', e => applyStats(JSON.parse(e.data)));
+    feed.addEventListener('appointment', e => {
+        const a = JSON.parse(e.data);
+        const known = dummy.appointments.find(item => item.id === a.id);
+        if (known) known.status = a.status.charAt(0).toUpperCase() + a.status.slice(1);
+        addActivity('fa-calendar-check', `Appointment #${a.id} ${a.action}: ${a.date} ${a.time.slice(0, 5)}, ${a.status.replace('_', ' ')}`);
+    });
+    feed.addEventListener('room', e => {
+        const r = JSON.parse(e.data);
+        addActivity('fa-bed', `Room ${r.room_number} is now ${r.status}`);
+    });
+}
+
+function applyStats(stats) {
+    Object.entries(STAT_KEYS).forEach(([key, name]) => {
+        if (!(key in stats)) return;
+        dummy.stats[name] = stats[key];
+        const card = document.querySelector(`.card[data-stat="${name}"]`);
+        if (card) {
+            card.dataset.count = stats[key];
+            card.querySelector('.counter').textContent = Number(stats[key]).toLocaleString();
+        }
+    });
+}
+
+function activityItem(icon, time, text) {
+    // Event fields come from the server: set them as text, never as markup
+    const item = document.createElement('li');
+    item.className = 'report-item';
+    if (icon) {
+        const i = document.createElement('i');
+        i.className = `fa ${icon}`;
+        item.append(i);
+    }
+    const body = document.createElement('div');
+    if (time) {
+        const b = document.createElement('b');
+        b.textContent = time;
+        body.append(b);
+    }
+    const p = document.createElement('p');
+    p.textContent = text;
+    body.append(p);
+    item.append(body);
+    return item;
+}
+
+function showActivity() {
+    const list = document.getElementById('liveActivity');
+    if (!list) return;
+    list.replaceChildren(...(dummy.activity.length
+        ? dummy.activity.map(item => activityItem(item.icon, item.time, item.text))
+        : [activityItem(null, null, 'Waiting for changes...')]));
+}
+
+function addActivity(icon, text) {
+    dummy.activity.unshift({ icon, text, time: new Date().toLocaleTimeString() });
+    dummy.activity.length = Math.min(dummy.activity.length, MAX_ACTIVITY);
+    showActivity();
+}
+
+connectLiveFeed();
+
 // Enhanced Patients Section
 function renderPatients() {
     content.innerHTML = `